@@ -0,0 +1,158 @@
+import binascii
+import re
+
+from django.conf import settings
+from django.core.files.uploadedfile import TemporaryUploadedFile
+from drf_extra_fields.fields import Base64FieldMixin, Base64ImageField
+from PIL import Image
+from rest_framework.exceptions import ValidationError
+from rest_framework.fields import Field
+
+from recipes.images import (VARIANT_FORMATS, get_variant_widths,
+                            get_variants_field)
+
+BASE64_PREFIX = ';base64,'
+WHITESPACE = re.compile(r'\s')
+
+
+def absolute_urls(request, value):
+    """Делает абсолютными URL в строке или вложенном словаре."""
+    if isinstance(value, dict):
+        return {key: absolute_urls(request, item)
+                for key, item in value.items()}
+    return request.build_absolute_uri(value)
+
+
+class ImageVariantsField(Field):
+    """Ссылки на уменьшенные копии изображения {формат: {ширина: URL}}.
+
+    Пока копии не построены, вместо них отдается оригинал.
+    """
+
+    def __init__(self, image_field, **kwargs):
+        self.image_field = image_field
+        kwargs['source'] = '*'
+        kwargs['read_only'] = True
+        super().__init__(**kwargs)
+
+    def to_representation(self, instance):
+        image = getattr(instance, self.image_field)
+        if not image:
+            return None
+        variants = getattr(instance, get_variants_field(self.image_field))
+        if not variants or variants.get('source') != image.name:
+            variants = {}
+        storage = image.storage
+        result = {
+            extension: {
+                str(width): (
+                    storage.url(variants[extension][str(width)])
+                    if str(width) in variants.get(extension, {})
+                    else image.url
+                )
+                for width in get_variant_widths()
+            }
+            for extension in VARIANT_FORMATS
+        }
+        request = self.context.get('request')
+        if request is not None:
+            return absolute_urls(request, result)
+        return result
+
+
+class StreamingBase64ImageField(Base64ImageField):
+    """Base64ImageField, декодирующий изображение частями во временный файл.
+
+    Размер проверяется по длине строки до декодирования, формат и
+    размеры изображения - по первой декодированной части. Из
+    декодированных данных в памяти одновременно находится только одна
+    часть, а дальше файл проверяет и переносит в хранилище без чтения
+    в память ImageField. Тело запроса и разобранная из JSON строка
+    base64 при этом целиком остаются в памяти до конца запроса.
+    Временный файл закрывает TemporaryFilesMixin сериализатора после
+    save().
+    """
+
+    # Число символов base64 в части, кратно 4.
+    chunk_size = 64 * 1024
+    default_error_messages = {
+        'too_large': 'Размер изображения больше {max_size} байт.',
+        'too_many_pixels': 'Изображение больше {max_pixels} пикселей.',
+    }
+
+    def to_internal_value(self, base64_data):
+        if base64_data in self.EMPTY_VALUES:
+            return None
+        if not isinstance(base64_data, str):
+            return super().to_internal_value(base64_data)
+        start = base64_data.find(BASE64_PREFIX, 0, 256)
+        start = 0 if start == -1 else start + len(BASE64_PREFIX)
+        if WHITESPACE.search(base64_data, start):
+            # Переносы строк сбили бы деление на части по 4 символа.
+            base64_data = WHITESPACE.sub('', base64_data[start:])
+            start = 0
+        size = (len(base64_data) - start) * 3 // 4
+        if size > settings.IMAGE_UPLOAD_MAX_SIZE:
+            self.fail('too_large', max_size=settings.IMAGE_UPLOAD_MAX_SIZE)
+        file = TemporaryUploadedFile(
+            self.get_file_name(None), None, size, None
+        )
+        try:
+            extension = self.write_chunks(file, base64_data, start)
+        except ValidationError:
+            file.close()
+            raise
+        file.flush()
+        file.name = f'{file.name}.{extension}'
+        file.size = file.tell()
+        file.seek(0)
+        return super(Base64FieldMixin, self).to_internal_value(file)
+
+    def write_chunks(self, file, data, start):
+        """Декодирует data в file и возвращает расширение изображения."""
+        extension = None
+        for offset in range(start, len(data), self.chunk_size):
+            try:
+                file.write(binascii.a2b_base64(
+                    data[offset:offset + self.chunk_size]
+                ))
+            except binascii.Error:
+                raise ValidationError(self.INVALID_FILE_MESSAGE)
+            if extension is None:
+                extension = self.check_header(
+                    file, offset + self.chunk_size >= len(data)
+                )
+        if extension is None:
+            raise ValidationError(self.INVALID_FILE_MESSAGE)
+        return extension
+
+    def check_header(self, file, complete):
+        """Проверяет формат и размеры по уже записанному началу файла.
+
+        Если заголовок еще не прочитан целиком, возвращает None.
+        """
+        position = file.tell()
+        file.seek(0)
+        try:
+            image = Image.open(file)
+        except Image.DecompressionBombError:
+            self.fail(
+                'too_many_pixels',
+                max_pixels=settings.IMAGE_UPLOAD_MAX_PIXELS
+            )
+        except (OSError, SyntaxError):
+            if complete:
+                raise ValidationError(self.INVALID_FILE_MESSAGE)
+            return None
+        finally:
+            file.seek(position)
+        extension = 'jpg' if image.format == 'JPEG' else image.format.lower()
+        if extension not in self.ALLOWED_TYPES:
+            raise ValidationError(self.INVALID_TYPE_MESSAGE)
+        width, height = image.size
+        if width * height > settings.IMAGE_UPLOAD_MAX_PIXELS:
+            self.fail(
+                'too_many_pixels',
+                max_pixels=settings.IMAGE_UPLOAD_MAX_PIXELS
+            )
+        return extension
@@ -0,0 +1,121 @@
+import base64
+import io
+from time import perf_counter
+from unittest import mock
+
+from django.core.management import base
+from django.db import connection
+from django.test.runner import DiscoverRunner
+from django.test.utils import (override_settings, setup_test_environment,
+                               teardown_test_environment)
+from PIL import Image
+from rest_framework.test import APIClient
+
+from recipes.generators import SCALES, generate
+from recipes.models import Ingredient, Tag
+from users.models import User
+from .bench_endpoints import BENCH_CACHES
+
+
+def make_image():
+    buffer = io.BytesIO()
+    Image.new('RGB', (64, 64), 'orange').save(buffer, 'PNG')
+    content = base64.b64encode(buffer.getvalue()).decode()
+    return f'data:image/png;base64,{content}'
+
+
+class Command(base.BaseCommand):
+    help = ('Сравнение скорости создания рецептов по одному и через '
+            'POST /api/recipes/bulk/ во временной тестовой базе.')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--scale', choices=sorted(SCALES), default='small',
+            help='Объем сгенерированных данных.'
+        )
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument(
+            '--recipes', type=int, default=300,
+            help='Число рецептов, создаваемых каждым способом.'
+        )
+        parser.add_argument(
+            '--batch-size', type=int, default=100,
+            help='Число рецептов в одном запросе bulk.'
+        )
+
+    def handle(self, *args, **options):
+        setup_test_environment()
+        runner = DiscoverRunner(verbosity=0)
+        old_config = runner.setup_databases()
+        try:
+            # Копии изображений строятся в фоновых потоках и не входят
+            # во время ответа, здесь они не строятся вовсе.
+            with override_settings(CACHES=BENCH_CACHES), mock.patch(
+                'recipes.images.submit'
+            ):
+                generate(SCALES[options['scale']], options['seed'])
+                self.run(options)
+        finally:
+            runner.teardown_databases(old_config)
+            teardown_test_environment()
+
+    def make_recipes(self, count):
+        tags = list(Tag.objects.values_list('pk', flat=True)[:3])
+        ingredients = list(
+            Ingredient.objects.values_list('pk', flat=True)[:8]
+        )
+        image = make_image()
+        return [
+            {
+                'name': f'Рецепт из пачки {i}',
+                'text': f'Описание рецепта из пачки {i}.',
+                'cooking_time': 10,
+                'image': image,
+                'tags': tags,
+                'ingredients': [
+                    {'id': pk, 'amount': 100} for pk in ingredients
+                ],
+            }
+            for i in range(count)
+        ]
+
+    def measure(self, client, requests):
+        # Запросы считаются обработчиком, а не журналом соединения:
+        # журнал хранит только последние 9000.
+        queries = []
+
+        def count(execute, sql, params, many, context):
+            queries.append(None)
+            return execute(sql, params, many, context)
+
+        started = perf_counter()
+        with connection.execute_wrapper(count):
+            for url, data in requests:
+                response = client.post(url, data, format='json')
+                if response.status_code != 201:
+                    raise base.CommandError(
+                        f'{url}: ответ {response.status_code} '
+                        f'{response.content[:500]!r}'
+                    )
+        return perf_counter() - started, len(queries)
+
+    def run(self, options):
+        client = APIClient()
+        client.force_authenticate(User.objects.order_by('pk').first())
+        count, batch_size = options['recipes'], options['batch_size']
+        recipes = self.make_recipes(count)
+        results = {
+            'по одному': self.measure(
+                client, [('/api/recipes/', recipe) for recipe in recipes]
+            ),
+            'bulk': self.measure(client, [
+                ('/api/recipes/bulk/', recipes[i:i + batch_size])
+                for i in range(0, count, batch_size)
+            ]),
+        }
+        for name, (elapsed, queries) in results.items():
+            self.stdout.write(
+                f'{name:<10} {count / elapsed:8.0f} рецептов/с  '
+                f'{elapsed * 1000 / count:6.2f} мс на рецепт  '
+                f'запросов на рецепт {queries / count:.2f}'
+            )
@@ -0,0 +1,226 @@
+import json
+import platform
+from collections import namedtuple
+from time import perf_counter
+
+import django
+from django.core.management import base
+from django.db import connection, reset_queries
+from django.test.runner import DiscoverRunner
+from django.test.utils import (CaptureQueriesContext, override_settings,
+                               setup_test_environment,
+                               teardown_test_environment)
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from recipes.generators import SCALES, generate
+from recipes.models import Recipe, RecipeIngredient, Tag
+from users.models import User
+
+Endpoint = namedtuple('Endpoint', 'name url auth budget')
+
+# Бюджет - наибольшее допустимое число SQL запросов. В URL
+# подставляются {recipe}, {tag}, {author} и {ingredients} (состав
+# {recipe}) из сгенерированных данных. Версии таблиц (DataVersion),
+# включая поколение кэша представлений рецептов, читаются из базы
+# одним запросом на запрос к API.
+ENDPOINTS = (
+    Endpoint('recipes-list-anon', '/api/recipes/', False, 3),
+    Endpoint('recipes-list', '/api/recipes/', True, 3),
+    Endpoint('recipes-list-cursor', '/api/recipes/?cursor=&limit=20',
+             True, 2),
+    Endpoint('recipes-list-filtered',
+             '/api/recipes/?tags={tag}&is_favorited=1', True, 4),
+    Endpoint('recipes-search', '/api/recipes/?search=рецепт', True, 3),
+    Endpoint('what-to-cook',
+             '/api/recipes/what-to-cook/?ingredients={ingredients}',
+             True, 2),
+    Endpoint('recipes-list-sparse', '/api/recipes/?fields=id,name',
+             True, 3),
+    Endpoint('recipe-detail', '/api/recipes/{recipe}/', True, 3),
+    Endpoint('subscriptions', '/api/users/subscriptions/?recipes_limit=3',
+             True, 3),
+    Endpoint('users-list', '/api/users/', True, 2),
+    Endpoint('user-detail', '/api/users/{author}/', True, 1),
+    Endpoint('download-shopping-cart',
+             '/api/recipes/download_shopping_cart/', True, 2),
+    Endpoint('tags-list', '/api/tags/', False, 1),
+    Endpoint('ingredients-search', '/api/ingredients/?name=ингр',
+             False, 1),
+)
+
+# Кэши процесса, чтобы не смешивать данные тестовой базы с общим
+# файловым кэшем.
+BENCH_CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'bench-default',
+    },
+    'recipes': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'bench-recipes',
+    },
+    'shopping-lists': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'bench-shopping-lists',
+    },
+}
+
+
+def percentile(values, percent):
+    """Перцентиль по ближайшему рангу, values отсортированы."""
+    rank = max(1, -(-len(values) * percent // 100))
+    return values[int(rank) - 1]
+
+
+class Command(base.BaseCommand):
+    help = ('Замер задержек и числа SQL запросов основных эндпоинтов на '
+            'синтетических данных во временной тестовой базе.')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--scale', choices=sorted(SCALES), default='small',
+            help='Объем сгенерированных данных.'
+        )
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument(
+            '--iterations', type=int, default=30,
+            help='Число замеров каждого эндпоинта.'
+        )
+        parser.add_argument(
+            '--warmup', type=int, default=3,
+            help='Число прогревочных запросов перед замерами.'
+        )
+        parser.add_argument(
+            '--only', nargs='*', default=None,
+            help='Имена эндпоинтов для замера.'
+        )
+        parser.add_argument(
+            '--output', '-o', help='Файл для результатов в JSON.'
+        )
+        parser.add_argument(
+            '--compare', help='JSON с результатами прошлого запуска.'
+        )
+
+    def handle(self, *args, **options):
+        setup_test_environment()
+        runner = DiscoverRunner(verbosity=0)
+        old_config = runner.setup_databases()
+        try:
+            with override_settings(CACHES=BENCH_CACHES):
+                counts = generate(SCALES[options['scale']], options['seed'])
+                results = self.run_endpoints(options)
+        finally:
+            runner.teardown_databases(old_config)
+            teardown_test_environment()
+        report = {
+            'meta': {
+                'date': timezone.now().isoformat(),
+                'database': connection.vendor,
+                'python': platform.python_version(),
+                'django': django.get_version(),
+                'scale': options['scale'],
+                'seed': options['seed'],
+                'iterations': options['iterations'],
+                'counts': counts,
+            },
+            'results': results,
+        }
+        previous = None
+        if options['compare']:
+            with open(options['compare'], encoding='utf-8') as file:
+                previous = json.load(file)['results']
+        self.print_report(results, previous)
+        if options['output']:
+            with open(options['output'], 'w', encoding='utf-8') as file:
+                json.dump(report, file, ensure_ascii=False, indent=2)
+        over_budget = [
+            f'{name}: {result["queries"]} > {result["budget"]}'
+            for name, result in results.items()
+            if result['queries'] > result['budget']
+        ]
+        if over_budget:
+            raise base.CommandError(
+                'Превышен бюджет запросов: ' + '; '.join(over_budget)
+            )
+
+    def run_endpoints(self, options):
+        user = User.objects.order_by('pk').first()
+        context = {
+            'recipe': Recipe.objects.order_by('pk').values_list(
+                'pk', flat=True
+            ).first(),
+            'tag': Tag.objects.order_by('pk').values_list(
+                'slug', flat=True
+            ).first(),
+            'author': user.subscriptions.values_list(
+                'author_id', flat=True
+            ).first() or user.pk,
+        }
+        context['ingredients'] = ','.join(
+            str(pk) for pk in RecipeIngredient.objects.filter(
+                recipe_id=context['recipe']
+            ).values_list('ingredient_id', flat=True)
+        )
+        anonymous, authorized = APIClient(), APIClient()
+        authorized.force_authenticate(user)
+        results = {}
+        for endpoint in ENDPOINTS:
+            if options['only'] and endpoint.name not in options['only']:
+                continue
+            client = authorized if endpoint.auth else anonymous
+            url = endpoint.url.format(**context)
+            for _ in range(options['warmup']):
+                self.request(client, url)
+            # Клиент очищает журнал запросов в начале запроса, без
+            # очистки здесь CaptureQueriesContext посчитал бы не то.
+            reset_queries()
+            with CaptureQueriesContext(connection) as queries:
+                self.request(client, url)
+            timings = []
+            for _ in range(options['iterations']):
+                start = perf_counter()
+                self.request(client, url)
+                timings.append((perf_counter() - start) * 1000)
+            timings.sort()
+            results[endpoint.name] = {
+                'url': url,
+                'queries': len(queries),
+                'budget': endpoint.budget,
+                'p50_ms': round(percentile(timings, 50), 3),
+                'p90_ms': round(percentile(timings, 90), 3),
+                'p99_ms': round(percentile(timings, 99), 3),
+                'mean_ms': round(sum(timings) / len(timings), 3),
+                'max_ms': round(timings[-1], 3),
+            }
+        return results
+
+    def request(self, client, url):
+        response = client.get(url)
+        if response.status_code != 200:
+            raise base.CommandError(
+                f'{url}: ответ {response.status_code}'
+            )
+        if response.streaming:
+            b''.join(response.streaming_content)
+        return response
+
+    def print_report(self, results, previous=None):
+        for name, result in results.items():
+            line = (
+                f'{name:<24} p50 {result["p50_ms"]:8.2f} мс  '
+                f'p90 {result["p90_ms"]:8.2f} мс  '
+                f'p99 {result["p99_ms"]:8.2f} мс  '
+                f'запросов {result["queries"]}/{result["budget"]}'
+            )
+            if previous and name in previous:
+                before = previous[name]
+                change = (result['p50_ms'] / before['p50_ms'] - 1) * 100
+                line += (
+                    f'  p50 {change:+.0f}%, запросов '
+                    f'{result["queries"] - before["queries"]:+d}'
+                )
+            style = (self.style.SUCCESS
+                     if result['queries'] <= result['budget']
+                     else self.style.ERROR)
+            self.stdout.write(style(line))
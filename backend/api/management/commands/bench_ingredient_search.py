@@ -0,0 +1,49 @@
+from time import perf_counter
+
+from django.core.management import base
+
+from recipes.models import Ingredient
+from api.recipes.indexes import ingredient_index
+
+
+class Command(base.BaseCommand):
+    help = 'Сравнение поиска ингредиентов по индексу в памяти и через ORM.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'queries', nargs='*', default=['а', 'абр', 'мол', 'сок'],
+            help='Строки поиска.'
+        )
+        parser.add_argument(
+            '--repeat', type=int, default=200,
+            help='Число повторов каждого запроса.'
+        )
+        parser.add_argument(
+            '--limit', type=int, default=None,
+            help='Ограничение числа результатов.'
+        )
+
+    def measure(self, func, repeat):
+        start = perf_counter()
+        for _ in range(repeat):
+            result = func()
+        return (perf_counter() - start) / repeat * 1e6, len(result)
+
+    def handle(self, *args, **options):
+        repeat, limit = options['repeat'], options['limit']
+        ingredient_index.ensure_fresh()
+        for query in options['queries']:
+            index_time, index_count = self.measure(
+                lambda: ingredient_index.search(query, limit), repeat
+            )
+            orm_time, orm_count = self.measure(
+                lambda: list(Ingredient.objects.filter(
+                    name__istartswith=query
+                ).values('id', 'name', 'measurement_unit')[:limit]),
+                repeat
+            )
+            self.stdout.write(
+                f'{query!r}: индекс {index_time:.1f} мкс '
+                f'({index_count} шт.), ORM {orm_time:.1f} мкс '
+                f'({orm_count} шт.)'
+            )
@@ -0,0 +1,148 @@
+import random
+import tracemalloc
+from time import perf_counter
+
+from django.core.management import base
+from django.db.models import Count, F, Q
+from django.test.runner import DiscoverRunner
+from django.test.utils import (override_settings, setup_test_environment,
+                               teardown_test_environment)
+
+from recipes.generators import SCALES, generate
+from recipes.models import Ingredient, Recipe, RecipeIngredient
+from api.recipes.indexes import RecipeIngredientIndex
+from .bench_endpoints import BENCH_CACHES, percentile
+
+
+class Command(base.BaseCommand):
+    help = ('Сравнение поиска рецептов по имеющимся ингредиентам через '
+            'индекс в памяти и через SQL на синтетических данных во '
+            'временной тестовой базе.')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--scale', choices=sorted(SCALES), default='large',
+            help='Объем сгенерированных данных.'
+        )
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument(
+            '--queries', type=int, default=50,
+            help='Число наборов ингредиентов.'
+        )
+        parser.add_argument(
+            '--extra', type=int, default=10,
+            help='Сколько случайных ингредиентов добавляется к составу '
+                 'случайного рецепта в каждом наборе.'
+        )
+        parser.add_argument('--max-missing', type=int, default=2)
+
+    def handle(self, *args, **options):
+        setup_test_environment()
+        runner = DiscoverRunner(verbosity=0)
+        old_config = runner.setup_databases()
+        try:
+            with override_settings(CACHES=BENCH_CACHES):
+                started = perf_counter()
+                counts = generate(SCALES[options['scale']], options['seed'])
+                self.stdout.write(
+                    f'Данные: {counts} за {perf_counter() - started:.1f} с'
+                )
+                self.run(options)
+        finally:
+            runner.teardown_databases(old_config)
+            teardown_test_environment()
+
+    def measure(self, func):
+        started = perf_counter()
+        result = func()
+        return (perf_counter() - started) * 1000, result
+
+    def report(self, name, timings):
+        timings.sort()
+        self.stdout.write(
+            f'{name:<10} p50 {percentile(timings, 50):8.2f} мс  '
+            f'p90 {percentile(timings, 90):8.2f} мс  '
+            f'max {timings[-1]:8.2f} мс'
+        )
+
+    def sql_search(self, ingredients, max_missing):
+        return list(Recipe.objects.annotate(
+            total=Count('ingredient_list'),
+            matched=Count('ingredient_list', filter=Q(
+                ingredient_list__ingredient_id__in=ingredients
+            )),
+        ).filter(matched__gt=0).annotate(
+            missing=F('total') - F('matched')
+        ).filter(missing__lte=max_missing).order_by(
+            'missing', '-matched', '-pub_date', '-id'
+        ).values_list('id', 'missing'))
+
+    def run(self, options):
+        rng = random.Random(options['seed'])
+        max_missing = options['max_missing']
+        index = RecipeIngredientIndex()
+        build_time, _ = self.measure(index.ensure_fresh)
+        # Память измеряется отдельным построением: tracemalloc
+        # замедляет его в несколько раз.
+        tracemalloc.start()
+        measured = RecipeIngredientIndex()
+        measured.build()
+        memory = tracemalloc.get_traced_memory()[0]
+        tracemalloc.stop()
+        del measured
+        self.stdout.write(
+            f'Построение индекса: {build_time:.0f} мс, '
+            f'память {memory / 2 ** 20:.1f} МиБ'
+        )
+        recipe_ids = list(Recipe.objects.values_list('pk', flat=True))
+        ingredient_ids = list(Ingredient.objects.values_list('pk', flat=True))
+        index_timings, sql_timings, found = [], [], 0
+        for _ in range(options['queries']):
+            ingredients = set(RecipeIngredient.objects.filter(
+                recipe_id=rng.choice(recipe_ids)
+            ).values_list('ingredient_id', flat=True))
+            ingredients.update(rng.sample(
+                ingredient_ids, min(options['extra'], len(ingredient_ids))
+            ))
+            index_time, result = self.measure(
+                lambda: index.search(ingredients, max_missing)
+            )
+            sql_time, expected = self.measure(
+                lambda: self.sql_search(ingredients, max_missing)
+            )
+            if result != expected:
+                raise base.CommandError(
+                    f'Результаты индекса и SQL расходятся для '
+                    f'{sorted(ingredients)}'
+                )
+            index_timings.append(index_time)
+            sql_timings.append(sql_time)
+            found += len(result)
+        self.stdout.write(
+            f'Наборов: {options["queries"]}, найдено рецептов в среднем: '
+            f'{found / options["queries"]:.1f}'
+        )
+        self.report('индекс', index_timings)
+        self.report('SQL', sql_timings)
+        # Замена одного ингредиента в рецепте; update() не отправляет
+        # сигналов, поэтому индекс обновляется только здесь.
+        update_timings = []
+        for recipe_id in rng.sample(recipe_ids, min(20, len(recipe_ids))):
+            rows = dict(RecipeIngredient.objects.filter(
+                recipe_id=recipe_id
+            ).values_list('ingredient_id', 'pk'))
+            new = rng.choice(ingredient_ids)
+            if new in rows:
+                continue
+            RecipeIngredient.objects.filter(
+                pk=rows[rng.choice(list(rows))]
+            ).update(ingredient_id=new)
+            update_time, _ = self.measure(lambda: index.update([recipe_id]))
+            update_timings.append(update_time)
+        self.report('обновление', update_timings)
+        entries = index._entries
+        index.build()
+        if entries != index._entries:
+            raise base.CommandError(
+                'Индекс после обновлений отличается от построенного заново.'
+            )
@@ -0,0 +1,91 @@
+import glob
+import json
+from collections import Counter, defaultdict
+
+from django.conf import settings
+from django.core.management import base
+
+SORT_KEYS = {
+    'total': lambda group: group['total_ms'],
+    'max': lambda group: group['max_ms'],
+    'mean': lambda group: group['total_ms'] / group['count'],
+    'count': lambda group: group['count'],
+}
+
+
+class Command(base.BaseCommand):
+    help = ('Сводка журнала медленных SQL запросов: худшие отпечатки '
+            'запросов с view и местом вызова.')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--file', default=settings.SLOW_QUERY_LOG,
+            help='Журнал, вместе с ним читаются его архивы .1, .2, ...'
+        )
+        parser.add_argument(
+            '--top', type=int, default=10,
+            help='Число выводимых отпечатков.'
+        )
+        parser.add_argument(
+            '--sort', choices=sorted(SORT_KEYS), default='total',
+            help='Порядок: суммарное, наибольшее или среднее время, '
+                 'число запросов.'
+        )
+
+    def read(self, path):
+        for file_path in sorted(glob.glob(glob.escape(path) + '*')):
+            with open(file_path, encoding='utf-8') as file:
+                for line in file:
+                    try:
+                        yield json.loads(line)
+                    except ValueError:
+                        continue
+
+    def handle(self, *args, **options):
+        groups = defaultdict(lambda: {
+            'count': 0, 'total_ms': 0.0, 'max_ms': 0.0, 'slowest': None,
+            'views': Counter(), 'callers': Counter(),
+        })
+        for entry in self.read(options['file']):
+            group = groups[entry['fingerprint']]
+            group['count'] += 1
+            group['total_ms'] += entry['duration_ms']
+            group['views'][entry.get('view')] += 1
+            group['callers'][entry.get('caller')] += 1
+            if entry['duration_ms'] >= group['max_ms']:
+                group['max_ms'] = entry['duration_ms']
+                group['slowest'] = entry
+        if not groups:
+            self.stdout.write('Медленных запросов нет.')
+            return
+        worst = sorted(
+            groups.items(), key=lambda item: SORT_KEYS[options['sort']](
+                item[1]
+            ), reverse=True
+        )[:options['top']]
+        for key, group in worst:
+            slowest = group['slowest']
+            self.stdout.write(self.style.WARNING(
+                f'{key}: запросов {group["count"]}, '
+                f'всего {group["total_ms"]:.0f} мс, '
+                f'среднее {group["total_ms"] / group["count"]:.1f} мс, '
+                f'максимум {group["max_ms"]:.1f} мс'
+            ))
+            self.stdout.write(f'  {slowest["normalized"]}')
+            for title, counter in (('view', group['views']),
+                                   ('вызов', group['callers'])):
+                self.stdout.write(f'  {title}: ' + ', '.join(
+                    f'{name} ({count})'
+                    for name, count in counter.most_common(3)
+                ))
+            self.stdout.write(f'  параметры: {slowest["params"]}')
+            if 'explain' in slowest:
+                plan = slowest['explain']
+                if not isinstance(plan, list):
+                    plan = json.dumps(plan, ensure_ascii=False,
+                                      indent=2).splitlines()
+                self.stdout.write('  план:' + (
+                    ' (ANALYZE)' if slowest.get('analyze') else ''
+                ))
+                for line in plan:
+                    self.stdout.write(f'    {line}')
@@ -0,0 +1,206 @@
+import json
+import os
+import threading
+import time
+from bisect import bisect_left
+
+from django.conf import settings
+
+PREFIX = 'foodgram'
+DURATION_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5,
+                    10)
+QUERY_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100)
+# Снимок, не обновлявшийся столько интервалов сброса, удаляется, если
+# процесса, который его записал, уже нет.
+STALE_FLUSHES = 3
+SIZE_BUCKETS = (256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304)
+
+# Имя метрики: (тип, описание, границы корзин гистограммы).
+METRICS = {
+    'http_request_duration_seconds': (
+        'histogram', 'Время обработки запроса.', DURATION_BUCKETS),
+    'db_queries_per_request': (
+        'histogram', 'Число SQL запросов за запрос.', QUERY_BUCKETS),
+    'db_duration_seconds': (
+        'histogram', 'Время SQL запросов за запрос.', DURATION_BUCKETS),
+    'http_response_size_bytes': (
+        'histogram', 'Размер ответа.', SIZE_BUCKETS),
+    'http_responses_total': (
+        'counter', 'Ответы по кодам статуса.', None),
+}
+
+
+class MetricsRegistry:
+    """Метрики запросов, собранные в памяти процесса.
+
+    Гистограмма хранится как [счетчики корзин..., сумма, количество]
+    для каждого набора меток. Чтобы метрики всех воркеров gunicorn
+    отдавались одним запросом, процесс раз в flush_interval секунд
+    записывает свой снимок в METRICS_DIR (файл <pid>.json), а при
+    выдаче снимки всех процессов складываются. Снимки завершившихся
+    воркеров удаляются, поэтому после перезапуска воркера его счетчики
+    начинаются с нуля, что Prometheus учитывает как сброс счетчика.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._values = {name: {} for name in METRICS}
+        self._last_flush = 0.0
+
+    @property
+    def directory(self):
+        return getattr(settings, 'METRICS_DIR', None)
+
+    @property
+    def flush_interval(self):
+        return getattr(settings, 'METRICS_FLUSH_INTERVAL', 5)
+
+    def observe(self, name, labels, value):
+        buckets = METRICS[name][2]
+        with self._lock:
+            series = self._values[name].get(labels)
+            if series is None:
+                series = self._values[name][labels] = [0] * (
+                    len(buckets) + 3
+                )
+            # Последняя корзина - +Inf.
+            series[bisect_left(buckets, value)] += 1
+            series[-2] += value
+            series[-1] += 1
+
+    def increment(self, name, labels, value=1):
+        with self._lock:
+            series = self._values[name]
+            series[labels] = series.get(labels, 0) + value
+
+    def snapshot(self):
+        with self._lock:
+            return {
+                name: [
+                    [list(labels), value if isinstance(value, int)
+                     else list(value)]
+                    for labels, value in series.items()
+                ]
+                for name, series in self._values.items()
+            }
+
+    def maybe_flush(self):
+        if self.directory is None:
+            return
+        if time.monotonic() - self._last_flush >= self.flush_interval:
+            self.flush()
+
+    def flush(self):
+        self._last_flush = time.monotonic()
+        os.makedirs(self.directory, exist_ok=True)
+        # pid берется при записи: реестр мог быть создан в мастере
+        # gunicorn до форка воркеров.
+        path = os.path.join(self.directory, f'{os.getpid()}.json')
+        temporary = f'{path}.tmp'
+        with open(temporary, 'w', encoding='utf-8') as file:
+            json.dump(self.snapshot(), file)
+        os.replace(temporary, path)
+
+    def collect(self):
+        """Складывает снимки всех процессов."""
+        if self.directory is None:
+            return self.snapshot_values(self.snapshot())
+        self.flush()
+        total = {name: {} for name in METRICS}
+        stale = time.time() - STALE_FLUSHES * self.flush_interval
+        for file_name in os.listdir(self.directory):
+            if not file_name.endswith('.json'):
+                continue
+            path = os.path.join(self.directory, file_name)
+            try:
+                pid = file_name[:-len('.json')]
+                if os.path.getmtime(path) < stale and not is_running(pid):
+                    os.remove(path)
+                    continue
+                with open(path, encoding='utf-8') as file:
+                    snapshot = json.load(file)
+            except (OSError, ValueError):
+                continue
+            for name, series in self.snapshot_values(snapshot).items():
+                for labels, value in series.items():
+                    if name not in total:
+                        continue
+                    if labels not in total[name]:
+                        total[name][labels] = value
+                    elif isinstance(value, list):
+                        total[name][labels] = [
+                            a + b for a, b in zip(total[name][labels], value)
+                        ]
+                    else:
+                        total[name][labels] += value
+        return total
+
+    @staticmethod
+    def snapshot_values(snapshot):
+        return {
+            name: {tuple(map(tuple, labels)): value
+                   for labels, value in series}
+            for name, series in snapshot.items()
+        }
+
+    def render(self):
+        """Метрики в текстовом формате Prometheus."""
+        lines = []
+        for name, series in self.collect().items():
+            kind, description, buckets = METRICS[name]
+            full_name = f'{PREFIX}_{name}'
+            lines.append(f'# HELP {full_name} {description}')
+            lines.append(f'# TYPE {full_name} {kind}')
+            for labels, value in sorted(series.items()):
+                if kind == 'counter':
+                    lines.append(
+                        f'{full_name}{format_labels(labels)} {value}'
+                    )
+                    continue
+                cumulative = 0
+                for bound, count in zip(buckets + ('+Inf',), value):
+                    cumulative += count
+                    lines.append(
+                        f'{full_name}_bucket'
+                        f'{format_labels(labels + (("le", bound),))} '
+                        f'{cumulative}'
+                    )
+                lines.append(
+                    f'{full_name}_sum{format_labels(labels)} {value[-2]}'
+                )
+                lines.append(
+                    f'{full_name}_count{format_labels(labels)} {value[-1]}'
+                )
+        return '\n'.join(lines) + '\n'
+
+
+def is_running(pid):
+    """Есть ли процесс с таким pid (строка из имени файла снимка)."""
+    try:
+        pid = int(pid)
+    except ValueError:
+        return False
+    if pid <= 0:
+        return False
+    try:
+        os.kill(pid, 0)
+    except PermissionError:
+        return True
+    except OSError:
+        return False
+    return True
+
+
+def escape_label(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace(
+        '\n', '\\n'
+    )
+
+
+def format_labels(labels):
+    return '{' + ','.join(
+        f'{key}="{escape_label(value)}"' for key, value in labels
+    ) + '}'
+
+
+metrics = MetricsRegistry()
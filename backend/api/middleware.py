@@ -0,0 +1,182 @@
+import cProfile
+import os
+import random
+import time
+import uuid
+from contextlib import ExitStack
+
+from django.conf import settings
+from django.db import connections
+from django.utils.crypto import constant_time_compare
+
+from .metrics import metrics
+from .profiling import RequestProfile
+from .slow_queries import SlowQueryLogger
+
+
+class QueryTimer:
+    """Считает SQL запросы и их общее время через execute_wrapper."""
+
+    def __init__(self):
+        self.count = 0
+        self.duration = 0.0
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.duration += time.perf_counter() - started
+            self.count += 1
+
+
+class MetricsMiddleware:
+    """Метрики запросов по эндпоинтам для /api/metrics.
+
+    Эндпоинт - имя маршрута, для ViewSet это basename и действие,
+    например recipes-list или users-subscriptions. Потоковый ответ
+    (например, выгрузка списка покупок) строится, когда сервер читает
+    streaming_content, поэтому его метрики, включая SQL запросы при
+    чтении, записываются после отдачи последней части.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        timer = QueryTimer()
+        started = time.perf_counter()
+        with self.count_queries(timer):
+            response = self.get_response(request)
+        match = request.resolver_match
+        labels = (
+            ('endpoint', match.url_name if match and match.url_name
+             else 'unmatched'),
+            ('method', request.method),
+        )
+        if not response.streaming:
+            self.observe(
+                labels, response, timer, started, len(response.content)
+            )
+        elif not response.is_async:
+            response.streaming_content = self.stream(
+                response, response.streaming_content, labels, timer,
+                started
+            )
+        else:
+            # Асинхронный поток читается вне потока запроса, его
+            # запросы и размер не учитываются.
+            self.observe(labels, response, timer, started)
+        return response
+
+    @staticmethod
+    def count_queries(timer):
+        stack = ExitStack()
+        for connection in connections.all():
+            stack.enter_context(connection.execute_wrapper(timer))
+        return stack
+
+    def stream(self, response, content, labels, timer, started):
+        size = 0
+        try:
+            with self.count_queries(timer):
+                for chunk in content:
+                    size += len(chunk)
+                    yield chunk
+        finally:
+            self.observe(labels, response, timer, started, size)
+
+    def observe(self, labels, response, timer, started, size=None):
+        duration = time.perf_counter() - started
+        metrics.observe('http_request_duration_seconds', labels, duration)
+        metrics.observe('db_queries_per_request', labels, timer.count)
+        metrics.observe('db_duration_seconds', labels, timer.duration)
+        if size is not None:
+            metrics.observe('http_response_size_bytes', labels, size)
+        metrics.increment(
+            'http_responses_total',
+            labels + (('status', str(response.status_code)),)
+        )
+        metrics.maybe_flush()
+
+
+class SlowQueryMiddleware:
+    """Журнал медленных SQL запросов с именем вызвавшего их view.
+
+    Стоит перед MetricsMiddleware, чтобы EXPLAIN после ответа не
+    попадал в метрики запроса.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        loggers = [
+            SlowQueryLogger(connection, request)
+            for connection in connections.all()
+        ]
+        with ExitStack() as stack:
+            for slow_query_logger in loggers:
+                stack.enter_context(
+                    slow_query_logger.connection.execute_wrapper(
+                        slow_query_logger
+                    )
+                )
+            response = self.get_response(request)
+        for slow_query_logger in loggers:
+            slow_query_logger.flush()
+        return response
+
+
+class ProfilingMiddleware:
+    """Профилирование выбранных запросов с заголовком Server-Timing.
+
+    Запрос профилируется, если в заголовке X-Profile передан
+    PROFILE_TOKEN, или случайно с вероятностью PROFILE_SAMPLE_RATE.
+    Фазы DRF замеряет ProfilingMixin view. При заданном PROFILE_DUMP_DIR
+    для каждого такого запроса сохраняется дамп cProfile для pstats.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def is_profiled(self, request):
+        token = settings.PROFILE_TOKEN
+        if token and constant_time_compare(
+            request.META.get('HTTP_X_PROFILE', ''), token
+        ):
+            return True
+        rate = settings.PROFILE_SAMPLE_RATE
+        return rate > 0 and random.random() < rate
+
+    def __call__(self, request):
+        if not self.is_profiled(request):
+            return self.get_response(request)
+        profile = request.profile = RequestProfile()
+        profiler = None
+        if settings.PROFILE_DUMP_DIR:
+            profiler = cProfile.Profile()
+        with ExitStack() as stack:
+            for connection in connections.all():
+                stack.enter_context(connection.execute_wrapper(profile))
+            if profiler is not None:
+                profiler.enable()
+            try:
+                response = self.get_response(request)
+            finally:
+                if profiler is not None:
+                    profiler.disable()
+        response['Server-Timing'] = profile.server_timing()
+        if profiler is not None:
+            self.dump(request, profiler)
+        return response
+
+    def dump(self, request, profiler):
+        match = request.resolver_match
+        name = match.url_name if match and match.url_name else 'unmatched'
+        os.makedirs(settings.PROFILE_DUMP_DIR, exist_ok=True)
+        profiler.dump_stats(os.path.join(
+            settings.PROFILE_DUMP_DIR,
+            f'{time.strftime("%Y%m%dT%H%M%S")}-{name}-'
+            f'{uuid.uuid4().hex[:8]}.prof'
+        ))
@@ -0,0 +1,96 @@
+from django.core.files.uploadedfile import TemporaryUploadedFile
+from rest_framework.exceptions import ValidationError
+from rest_framework.serializers import ListSerializer
+
+FIELDS_PARAM = 'fields'
+OMIT_PARAM = 'omit'
+
+
+def parse_field_names(value):
+    return {name.strip() for name in value.split(',') if name.strip()}
+
+
+def get_selected_fields(request, fields):
+    """Возвращает поля, оставшиеся после ?fields= и ?omit= запроса.
+
+    Выбор полей действует только для GET, чтобы не ломать валидацию
+    при записи. Неизвестные имена полей отклоняются с ошибкой 400.
+    """
+    if request is None or request.method != 'GET':
+        return tuple(fields)
+    only = parse_field_names(request.query_params.get(FIELDS_PARAM, ''))
+    omit = parse_field_names(request.query_params.get(OMIT_PARAM, ''))
+    errors = {
+        param: 'Неизвестные поля: ' + ', '.join(sorted(unknown))
+        for param, unknown in ((FIELDS_PARAM, only.difference(fields)),
+                               (OMIT_PARAM, omit.difference(fields)))
+        if unknown
+    }
+    if errors:
+        raise ValidationError(errors)
+    return tuple(
+        name for name in fields
+        if (not only or name in only) and name not in omit
+    )
+
+
+class SparseFieldsMixin:
+    """Сериализатор, отдающий только запрошенные поля.
+
+    Выбор берется из context['field_selection'] или из параметров
+    запроса и применяется только к сериализатору верхнего уровня,
+    вложенные сериализаторы отдаются целиком. Невыбранные поля
+    удаляются до сериализации, поэтому их методы не вызываются.
+    """
+
+    def get_fields(self):
+        fields = super().get_fields()
+        if not self.is_top_level:
+            return fields
+        selected = self.context.get('field_selection')
+        if selected is None:
+            selected = get_selected_fields(
+                self.context.get('request'), fields
+            )
+        return {
+            name: field for name, field in fields.items()
+            if name in selected
+        }
+
+    @property
+    def is_top_level(self):
+        parent = self.parent
+        return parent is None or (
+            isinstance(parent, ListSerializer) and parent.parent is None
+        )
+
+    @property
+    def is_sparse(self):
+        return len(self.fields) < len(self.Meta.fields)
+
+
+def close_temporary_files(data):
+    """Закрывает временные файлы в validated_data, включая вложенные."""
+    if isinstance(data, TemporaryUploadedFile):
+        data.close()
+    elif isinstance(data, dict):
+        for value in data.values():
+            close_temporary_files(value)
+    elif isinstance(data, (list, tuple)):
+        for value in data:
+            close_temporary_files(value)
+
+
+class TemporaryFilesMixin:
+    """Закрывает временные файлы загруженных изображений после save().
+
+    Хранилище переносит временный файл на место, и закрытие сразу
+    после сохранения освобождает дескриптор, не дожидаясь сборки
+    мусора.
+    """
+
+    def save(self, **kwargs):
+        try:
+            return super().save(**kwargs)
+        finally:
+            close_temporary_files(self.validated_data)
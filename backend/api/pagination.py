@@ -1,5 +1,170 @@
-from rest_framework.pagination import PageNumberPagination
+import base64
+import binascii
+import json
+
+from django.core.exceptions import ValidationError
+from django.db.models import Q
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination, PageNumberPagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param
+
+
+class KeysetPagination(BasePagination):
+    """Пагинация по ключу (значение поля сортировки, id).
+
+    Вместо COUNT(*) и OFFSET следующая страница выбирается условием
+    по последней записи предыдущей, поэтому стоимость не растет
+    с номером страницы.
+    """
+
+    page_size = 6
+    max_page_size = 100
+    page_size_query_param = 'limit'
+    cursor_query_param = 'cursor'
+    invalid_cursor_message = 'Некорректный курсор.'
+    # Последним полем должен быть уникальный ключ.
+    ordering = ('-pub_date', '-id')
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        self.base_url = request.build_absolute_uri()
+        self.page_size = self.get_page_size(request)
+        self.model = queryset.model
+        position, self.reverse = self.decode_cursor(request)
+
+        ordering = self.ordering
+        if self.reverse:
+            ordering = tuple(self._invert(field) for field in ordering)
+        queryset = queryset.order_by(*ordering)
+        if position is not None:
+            queryset = queryset.filter(self._after(ordering, position))
+
+        results = list(queryset[:self.page_size + 1])
+        has_more = len(results) > self.page_size
+        self.page = results[:self.page_size]
+        if self.reverse:
+            self.page.reverse()
+            self.has_next = position is not None
+            self.has_previous = has_more
+        else:
+            self.has_next = has_more
+            self.has_previous = position is not None
+        return self.page
+
+    def get_paginated_response(self, data):
+        return Response({
+            'next': self.get_next_link(),
+            'previous': self.get_previous_link(),
+            'results': data,
+        })
+
+    def get_page_size(self, request):
+        try:
+            page_size = int(request.query_params[self.page_size_query_param])
+        except (KeyError, ValueError):
+            return self.page_size
+        if page_size <= 0:
+            return self.page_size
+        return min(page_size, self.max_page_size)
+
+    def get_next_link(self):
+        if not self.has_next or not self.page:
+            return None
+        return self.encode_cursor(self.page[-1], reverse=False)
+
+    def get_previous_link(self):
+        if not self.has_previous or not self.page:
+            return None
+        return self.encode_cursor(self.page[0], reverse=True)
+
+    def encode_cursor(self, obj, reverse):
+        position = [
+            self._field(name).value_to_string(obj)
+            for name in self._field_names()
+        ]
+        token = base64.urlsafe_b64encode(
+            json.dumps([position, reverse]).encode()
+        ).decode()
+        return replace_query_param(
+            self.base_url, self.cursor_query_param, token
+        )
+
+    def decode_cursor(self, request):
+        token = request.query_params.get(self.cursor_query_param)
+        if not token:
+            return None, False
+        names = self._field_names()
+        try:
+            position, reverse = json.loads(base64.urlsafe_b64decode(token))
+            if len(position) != len(names) or None in position:
+                raise ValueError
+            position = [
+                self._field(name).to_python(value)
+                for name, value in zip(names, position)
+            ]
+        except (TypeError, ValueError, AttributeError, IndexError,
+                ValidationError, binascii.Error):
+            raise NotFound(self.invalid_cursor_message)
+        return position, bool(reverse)
+
+    def _field_names(self):
+        return [field.lstrip('-') for field in self.ordering]
+
+    def _field(self, name):
+        return self.model._meta.get_field(name)
+
+    @staticmethod
+    def _invert(field):
+        return field[1:] if field.startswith('-') else f'-{field}'
+
+    @staticmethod
+    def _after(ordering, position):
+        """Условие «строго после position» для составного ключа."""
+        condition = Q()
+        equal = {}
+        for field, value in zip(ordering, position):
+            name = field.lstrip('-')
+            lookup = 'lt' if field.startswith('-') else 'gt'
+            condition |= Q(**equal, **{f'{name}__{lookup}': value})
+            equal[name] = value
+        return condition
 
 
 class Pagination(PageNumberPagination):
+    """Постраничная пагинация с включаемым режимом курсора.
+
+    По умолчанию работает как раньше (page/count). Если в запросе есть
+    параметр cursor (в том числе пустой для первой страницы),
+    используется KeysetPagination.
+    """
+
     page_size = 6
+    keyset_ordering = KeysetPagination.ordering
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.keyset = None
+        if KeysetPagination.cursor_query_param in request.query_params:
+            self.keyset = KeysetPagination()
+            self.keyset.ordering = self.keyset_ordering
+            self.keyset.page_size = self.get_page_size(request)
+            return self.keyset.paginate_queryset(queryset, request, view)
+        return super().paginate_queryset(queryset, request, view)
+
+    def get_paginated_response(self, data):
+        if self.keyset is not None:
+            return self.keyset.get_paginated_response(data)
+        return super().get_paginated_response(data)
+
+
+class UserPagination(Pagination):
+    keyset_ordering = ('username', 'id')
+
+
+class ListPagination(PageNumberPagination):
+    """Постраничная пагинация готового списка, например ранжированного
+    в памяти, где нет поля для курсора."""
+
+    page_size = Pagination.page_size
+    page_size_query_param = 'limit'
+    max_page_size = KeysetPagination.max_page_size
@@ -1,3 +1,5 @@
+from django.conf import settings
+from django.utils.crypto import constant_time_compare
 from rest_framework.permissions import SAFE_METHODS, BasePermission
 
 
@@ -17,4 +19,16 @@ class IsAuthorOrReadOnly(BasePermission):
         )
 
     def has_object_permission(self, request, view, obj):
-        return obj.author == request.user
+        return obj.author_id == request.user.id
+
+
+class IsStaffOrMetricsToken(BasePermission):
+    """Администратор или заголовок Authorization: Bearer METRICS_TOKEN."""
+
+    def has_permission(self, request, view):
+        if request.user.is_staff:
+            return True
+        token = getattr(settings, 'METRICS_TOKEN', '')
+        return bool(token) and constant_time_compare(
+            request.META.get('HTTP_AUTHORIZATION', ''), f'Bearer {token}'
+        )
@@ -0,0 +1,157 @@
+import time
+from contextlib import contextmanager
+from functools import lru_cache
+
+# Заголовки ответа передаются в latin-1, поэтому описания на английском.
+PHASE_DESCRIPTIONS = {
+    'auth': 'Authentication',
+    'permissions': 'Permission checks',
+    'throttle': 'Throttling',
+    'view': 'View',
+    'serialize': 'Serialization',
+    'render': 'Rendering',
+}
+
+
+class RequestProfile:
+    """Время фаз обработки одного запроса.
+
+    Время SQL запросов собирается execute_wrapper и вычитается из фаз,
+    поэтому фазы, db и неучтенный остаток в сумме дают total.
+    """
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.phases = {}
+        self.db_time = 0.0
+        self.db_count = 0
+        self.view_started = None
+        self.render_started = None
+        # Время фаз внутри view, которое не относится к самому view.
+        self.view_excluded = 0.0
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.db_time += time.perf_counter() - started
+            self.db_count += 1
+
+    def mark(self):
+        return time.perf_counter(), self.db_time
+
+    def add(self, name, since):
+        started, db_time = since
+        duration = time.perf_counter() - started - (self.db_time - db_time)
+        self.phases[name] = self.phases.get(name, 0.0) + duration
+        return duration
+
+    @contextmanager
+    def phase(self, name):
+        since = self.mark()
+        try:
+            yield
+        finally:
+            duration = self.add(name, since)
+            if self.view_started is not None:
+                self.view_excluded += duration
+
+    def server_timing(self):
+        """Значение заголовка Server-Timing в миллисекундах."""
+        if self.render_started is not None:
+            self.add('render', self.render_started)
+        metrics = [
+            f'{name};dur={duration * 1000:.2f};'
+            f'desc="{PHASE_DESCRIPTIONS.get(name, name)}"'
+            for name, duration in self.phases.items()
+        ]
+        metrics.append(
+            f'db;dur={self.db_time * 1000:.2f};'
+            f'desc="SQL queries: {self.db_count}"'
+        )
+        metrics.append(
+            f'total;dur={(time.perf_counter() - self.started) * 1000:.2f}'
+        )
+        return ', '.join(metrics)
+
+
+@lru_cache(maxsize=None)
+def profiled_serializer_class(serializer_class):
+    """Подкласс сериализатора, замеряющий получение data."""
+
+    class ProfiledSerializer(serializer_class):
+
+        @property
+        def data(self):
+            with self.profile.phase('serialize'):
+                return super().data
+
+    ProfiledSerializer.__name__ = serializer_class.__name__
+    ProfiledSerializer.__qualname__ = serializer_class.__qualname__
+    return ProfiledSerializer
+
+
+class ProfilingMixin:
+    """Замер фаз DRF для запросов, выбранных ProfilingMiddleware.
+
+    Без профилирования каждая фаза стоит одной проверки атрибута.
+    """
+
+    def get_serializer(self, *args, **kwargs):
+        serializer = super().get_serializer(*args, **kwargs)
+        profile = getattr(self.request._request, 'profile', None)
+        if profile is not None:
+            # Сериализация выполняется при обращении к data, которое
+            # происходит внутри view, поэтому замеряется это обращение.
+            serializer.__class__ = profiled_serializer_class(
+                type(serializer)
+            )
+            serializer.profile = profile
+        return serializer
+
+    def perform_authentication(self, request):
+        profile = getattr(request._request, 'profile', None)
+        if profile is None:
+            return super().perform_authentication(request)
+        with profile.phase('auth'):
+            return super().perform_authentication(request)
+
+    def check_permissions(self, request):
+        profile = getattr(request._request, 'profile', None)
+        if profile is None:
+            return super().check_permissions(request)
+        with profile.phase('permissions'):
+            return super().check_permissions(request)
+
+    def check_object_permissions(self, request, obj):
+        profile = getattr(request._request, 'profile', None)
+        if profile is None:
+            return super().check_object_permissions(request, obj)
+        with profile.phase('permissions'):
+            return super().check_object_permissions(request, obj)
+
+    def check_throttles(self, request):
+        profile = getattr(request._request, 'profile', None)
+        if profile is None:
+            return super().check_throttles(request)
+        with profile.phase('throttle'):
+            return super().check_throttles(request)
+
+    def initial(self, request, *args, **kwargs):
+        super().initial(request, *args, **kwargs)
+        profile = getattr(request._request, 'profile', None)
+        if profile is not None:
+            profile.view_started = profile.mark()
+
+    def finalize_response(self, request, response, *args, **kwargs):
+        profile = getattr(request._request, 'profile', None)
+        if profile is not None and profile.view_started is not None:
+            profile.add('view', profile.view_started)
+            profile.phases['view'] -= profile.view_excluded
+        response = super().finalize_response(
+            request, response, *args, **kwargs
+        )
+        if profile is not None:
+            profile.render_started = profile.mark()
+        return response
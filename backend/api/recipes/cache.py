@@ -0,0 +1,141 @@
+import threading
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+
+from recipes.models import DataVersion, Ingredient, Tag
+
+
+class RecipeCache:
+    """Кэш не зависящей от пользователя части представления рецепта.
+
+    Ключ состоит из поколения, id рецепта и времени его изменения
+    updated_at. Изменение рецепта, его связей или автора сдвигает
+    updated_at, поэтому следующий запрос в любом процессе не найдет
+    старую запись, а она сама вытесняется по LRU. Поколение составлено
+    из версий таблиц тегов и ингредиентов, поэтому их изменение
+    сбрасывает весь кэш.
+    Ограничение размера и вытеснение по LRU обеспечивает бэкенд
+    (для locmem это MAX_ENTRIES).
+    """
+
+    def __init__(self, alias):
+        self.alias = alias
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+    @property
+    def cache(self):
+        return caches[self.alias]
+
+    @property
+    def timeout(self):
+        return getattr(settings, 'RECIPE_CACHE_TIMEOUT', None)
+
+    def generation(self, request=None):
+        # Версии хранятся в базе и не вытесняются, поэтому поколение
+        # не может вернуться к прежнему значению вместе со старыми
+        # записями.
+        return '.'.join(
+            str(get_model_version(model, request)[0])
+            for model in (Tag, Ingredient)
+        )
+
+    def make_key(self, recipe, generation):
+        return (f'recipe:{generation}:{recipe.pk}:'
+                f'{recipe.updated_at.timestamp():.6f}')
+
+    def get_many(self, recipes, request=None):
+        """Возвращает {id рецепта: представление} для найденных."""
+        generation = self.generation(request)
+        keys = {self.make_key(recipe, generation): recipe.pk
+                for recipe in recipes}
+        found = self.cache.get_many(keys)
+        with self._lock:
+            self.hits += len(found)
+            self.misses += len(keys) - len(found)
+        return {keys[key]: data for key, data in found.items()}
+
+    def get(self, recipe, request=None):
+        return self.get_many([recipe], request).get(recipe.pk)
+
+    def set(self, recipe, data, request=None):
+        self.set_many([(recipe, data)], request)
+
+    def set_many(self, items, request=None):
+        """Сохраняет пары (рецепт, представление)."""
+        generation = self.generation(request)
+        self.cache.set_many(
+            {self.make_key(recipe, generation): data
+             for recipe, data in items},
+            self.timeout
+        )
+
+    def stats(self):
+        return {'hits': self.hits, 'misses': self.misses}
+
+
+recipe_cache = RecipeCache(getattr(settings, 'RECIPE_CACHE_ALIAS', 'default'))
+
+
+def get_versions(request=None):
+    """Возвращает {таблица: (версия, время изменения)} одним запросом.
+
+    С request результат запоминается на запросе, и ETag, Last-Modified
+    и кэш представлений одного запроса читают версии один раз.
+    """
+    request = getattr(request, '_request', request)
+    versions = getattr(request, 'data_versions', None)
+    if versions is None:
+        versions = {
+            key: (version, changed_at)
+            for key, version, changed_at in DataVersion.objects.values_list(
+                'key', 'version', 'changed_at'
+            )
+        }
+        if request is not None:
+            request.data_versions = versions
+    return versions
+
+
+def get_model_version(model, request=None):
+    """Возвращает версию таблицы модели и время ее изменения."""
+    key = model._meta.label_lower
+    versions = get_versions(request)
+    if key not in versions:
+        # Таблица еще не менялась: строка версии создается при первом
+        # чтении, чтобы время изменения не сдвигалось между запросами.
+        DataVersion.objects.bulk_create(
+            [DataVersion(key=key)], ignore_conflicts=True
+        )
+        versions[key] = DataVersion.objects.values_list(
+            'version', 'changed_at'
+        ).get(key=key)
+    return versions[key]
+
+
+def bump_model_version(model):
+    """Увеличивает версию таблицы и возвращает новое значение.
+
+    Версия увеличивается в базе через F('version') + 1: строка версии
+    блокируется до конца транзакции, поэтому одновременные изменения из
+    разных процессов не теряются и каждое получает свою версию, а
+    другие процессы видят новую версию только вместе с изменениями.
+    """
+    key = model._meta.label_lower
+    versions = DataVersion.objects.filter(key=key)
+    with transaction.atomic():
+        if not versions.update(
+            version=F('version') + 1, changed_at=timezone.now()
+        ):
+            DataVersion.objects.bulk_create(
+                [DataVersion(key=key)], ignore_conflicts=True
+            )
+            versions.update(
+                version=F('version') + 1, changed_at=timezone.now()
+            )
+        return versions.values_list('version', flat=True).get()
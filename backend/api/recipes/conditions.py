@@ -0,0 +1,76 @@
+"""Валидаторы условных GET-запросов (ETag и Last-Modified).
+
+Считаются по версиям данных без сериализации ответа, поэтому
+совпадающий If-None-Match или If-Modified-Since получает 304
+до запуска сериализатора.
+"""
+from hashlib import md5
+
+from recipes.models import Ingredient, Recipe, Tag
+from .cache import get_model_version
+from .snapshots import accepts_gzip, is_snapshot_request
+
+
+def make_etag(*parts):
+    return md5(
+        ':'.join(str(part) for part in parts).encode(),
+        usedforsecurity=False
+    ).hexdigest()
+
+
+def get_recipe_state(request, pk):
+    # Запоминаем на запросе, чтобы ETag и Last-Modified
+    # обошлись одним запросом к базе.
+    if not hasattr(request, 'recipe_state'):
+        request.recipe_state = Recipe.objects.filter(
+            pk=pk
+        ).with_user_flags(request.user).values_list(
+            'updated_at', 'is_favorited', 'is_in_shopping_cart',
+            'is_author_subscribed', 'favorites_count', 'cart_count'
+        ).first()
+    return request.recipe_state
+
+
+def recipe_etag(request, pk=None, **kwargs):
+    state = get_recipe_state(request, pk)
+    if state is None:
+        return None
+    updated_at, *flags_and_counters = state
+    return make_etag(
+        'recipe', pk, updated_at.isoformat(), *flags_and_counters,
+        get_model_version(Tag, request)[0],
+        get_model_version(Ingredient, request)[0],
+        request.GET.urlencode()
+    )
+
+
+def recipe_last_modified(request, pk=None, **kwargs):
+    # Флаги пользователя не отражаются на дате изменения,
+    # поэтому для авторизованных остается только ETag.
+    if not request.user.is_anonymous:
+        return None
+    state = get_recipe_state(request, pk)
+    if state is None:
+        return None
+    return max(
+        state[0],
+        get_model_version(Tag, request)[1],
+        get_model_version(Ingredient, request)[1]
+    )
+
+
+def catalog_etag(model, snapshot=None):
+    def etag(request, *args, **kwargs):
+        if snapshot is not None and is_snapshot_request(request):
+            return snapshot.get(accepts_gzip(request), request)[1]
+        return make_etag(
+            model._meta.label_lower, get_model_version(model, request)[0],
+            request.GET.urlencode()
+        )
+    return etag
+
+
+def catalog_last_modified(model):
+    def last_modified(request, *args, **kwargs):
+        return get_model_version(model, request)[1]
+    return last_modified
@@ -1,6 +1,7 @@
 from django.contrib.auth import get_user_model
 from django_filters.rest_framework import FilterSet, filters, CharFilter
 from recipes.models import Ingredient, Recipe, Tag
+from recipes.search import search_recipes
 
 User = get_user_model()
 
@@ -11,8 +12,10 @@ class RecipeFilter(FilterSet):
         field_name='tags__slug',
         to_field_name='slug',
         queryset=Tag.objects.all(),
+        method='filter_tags',
     )
 
+    search = filters.CharFilter(method='filter_search')
     is_favorited = filters.BooleanFilter(method='filter_is_favorited')
     is_in_shopping_cart = filters.BooleanFilter(
         method='filter_is_in_shopping_cart'
@@ -22,6 +25,20 @@ class RecipeFilter(FilterSet):
         model = Recipe
         fields = ('tags', 'author',)
 
+    def filter_tags(self, queryset, name, value):
+        # Без тегов приходит пустой QuerySet, а не пустой список.
+        if not value:
+            return queryset
+        # Любой из тегов, проверяется по Recipe.tag_mask без JOIN.
+        return queryset.with_any_tag(value)
+
+    def filter_search(self, queryset, name, value):
+        # Сначала самые релевантные. В режиме курсора пагинация
+        # сохраняет порядок ленты.
+        return search_recipes(queryset, value).order_by(
+            '-search_rank', '-pub_date', '-id'
+        )
+
     def filter_is_favorited(self, queryset, name, value):
         user = self.request.user
         if value and not user.is_anonymous:
@@ -0,0 +1,248 @@
+import threading
+from array import array
+from bisect import bisect_left, bisect_right, insort
+from collections import Counter, defaultdict
+from itertools import chain
+
+from django.db import transaction
+
+from recipes.models import Ingredient, Recipe, RecipeIngredient
+from .cache import bump_model_version, get_model_version
+
+
+def normalize(value):
+    """Приводит строку к виду для сравнения без учета регистра и «ё»."""
+    return value.strip().casefold().replace('ё', 'е')
+
+
+class IngredientIndex:
+    """Индекс названий ингредиентов в памяти процесса.
+
+    Хранит отсортированные нормализованные названия и отвечает на
+    поиск по префиксу двоичным поиском, не обращаясь к базе.
+    Строится при первом запросе и перестраивается, когда меняется
+    версия таблицы ингредиентов.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._version = None
+        self._entries = ([], [], '', [])
+
+    def build(self):
+        rows = sorted(
+            (normalize(name), pk, name, measurement_unit)
+            for pk, name, measurement_unit in Ingredient.objects.values_list(
+                'id', 'name', 'measurement_unit'
+            )
+        )
+        keys = [row[0] for row in rows]
+        # Для поиска по подстроке ключи склеены в одну строку,
+        # starts хранит смещение каждого ключа в ней.
+        starts, offset = [], 0
+        for key in keys:
+            starts.append(offset)
+            offset += len(key) + 1
+        # Все части заменяются одним присваиванием, чтобы параллельный
+        # поиск не увидел их из разных версий.
+        self._entries = (
+            keys,
+            [
+                {'id': pk, 'name': name,
+                 'measurement_unit': measurement_unit}
+                for _, pk, name, measurement_unit in rows
+            ],
+            '\n'.join(keys),
+            starts,
+        )
+
+    def ensure_fresh(self, request=None):
+        version = get_model_version(Ingredient, request)[0]
+        if version == self._version:
+            return
+        with self._lock:
+            if version != self._version:
+                self.build()
+                self._version = version
+
+    def search(self, query, limit=None, request=None):
+        """Сначала точные совпадения, затем по префиксу, затем по подстроке."""
+        self.ensure_fresh(request)
+        keys, rows, text, starts = self._entries
+        query = normalize(query)
+        start = bisect_left(keys, query)
+        end = bisect_left(keys, query + '\uffff', start)
+        exact = [rows[i] for i in range(start, end) if keys[i] == query]
+        prefix = [rows[i] for i in range(start, end) if keys[i] != query]
+        result = exact + prefix
+        if not query or (limit is not None and len(result) >= limit):
+            return result[:limit]
+        position = text.find(query)
+        while position != -1:
+            i = bisect_right(starts, position) - 1
+            if starts[i] != position:
+                result.append(rows[i])
+                if limit is not None and len(result) >= limit:
+                    break
+            if i + 1 == len(starts):
+                break
+            position = text.find(query, starts[i + 1])
+        return result
+
+
+class RecipeIngredientIndex:
+    """Обратный индекс состава рецептов в памяти процесса.
+
+    Для каждого ингредиента хранит отсортированный массив id рецептов,
+    для каждого рецепта - массив id его ингредиентов и время публикации
+    для сортировки результатов. Совпадения с
+    набором ингредиентов считаются одним проходом Counter по массивам
+    (цикл в C), без запросов к базе. Изменения рецептов применяются
+    к индексу после фиксации транзакции; если версию состава изменил
+    другой процесс, индекс перестраивается при следующем поиске.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._version = None
+        self._entries = ({}, {}, {})
+        self._pending = threading.local()
+
+    def build(self):
+        postings, recipes = defaultdict(list), defaultdict(list)
+        for recipe_id, ingredient_id in RecipeIngredient.objects.order_by(
+            'recipe_id', 'ingredient_id'
+        ).values_list('recipe_id', 'ingredient_id').iterator(
+            chunk_size=10000
+        ):
+            postings[ingredient_id].append(recipe_id)
+            recipes[recipe_id].append(ingredient_id)
+        self._entries = (
+            {key: array('q', value) for key, value in postings.items()},
+            {key: array('q', value) for key, value in recipes.items()},
+            self.load_dates(recipes),
+        )
+
+    @staticmethod
+    def load_dates(recipe_ids):
+        return {
+            recipe_id: pub_date.timestamp()
+            for recipe_id, pub_date in Recipe.objects.filter(
+                id__in=recipe_ids
+            ).values_list('id', 'pub_date').iterator(chunk_size=10000)
+        }
+
+    def ensure_fresh(self, request=None):
+        version = get_model_version(RecipeIngredient, request)[0]
+        if version == self._version:
+            return
+        with self._lock:
+            if version != self._version:
+                self.build()
+                self._version = version
+
+    def schedule_update(self, *recipe_ids):
+        """Обновит рецепты после фиксации текущей транзакции.
+
+        Изменения одной транзакции (например, каскадное удаление
+        ингредиентов рецепта) применяются одним запросом.
+        """
+        pending = self._pending.__dict__.setdefault('ids', set())
+        pending.update(recipe_ids)
+        transaction.on_commit(self.flush)
+
+    def flush(self):
+        recipe_ids = getattr(self._pending, 'ids', None)
+        if recipe_ids:
+            self._pending.ids = set()
+            self.update(recipe_ids)
+
+    def invalidate(self):
+        """Помечает индекс устаревшим во всех процессах."""
+        bump_model_version(RecipeIngredient)
+
+    def update(self, recipe_ids):
+        with self._lock:
+            # Версия увеличивается атомарно в базе, поэтому каждое
+            # изменение получает свой номер и version на единицу больше
+            # версии индекса, только если других изменений не было.
+            # Иначе (индекс еще не построен, отстал от другого процесса
+            # или другой процесс изменил состав одновременно с этим)
+            # индекс будет перестроен целиком при следующем поиске.
+            version = bump_model_version(RecipeIngredient)
+            if self._version is None or version != self._version + 1:
+                return
+            self.apply(recipe_ids)
+            self._version = version
+
+    def apply(self, recipe_ids):
+        postings, recipes, dates = self._entries
+        current = defaultdict(set)
+        for recipe_id, ingredient_id in RecipeIngredient.objects.filter(
+            recipe_id__in=recipe_ids
+        ).values_list('recipe_id', 'ingredient_id'):
+            current[recipe_id].add(ingredient_id)
+        removed, added = defaultdict(list), defaultdict(list)
+        for recipe_id in recipe_ids:
+            old = set(recipes.get(recipe_id, ()))
+            new = current.get(recipe_id, set())
+            for ingredient_id in old - new:
+                removed[ingredient_id].append(recipe_id)
+            for ingredient_id in new - old:
+                added[ingredient_id].append(recipe_id)
+            if new:
+                recipes[recipe_id] = array('q', sorted(new))
+            else:
+                recipes.pop(recipe_id, None)
+                dates.pop(recipe_id, None)
+        dates.update(self.load_dates(current))
+        # Массивы не меняются на месте, а заменяются копиями, чтобы
+        # параллельный поиск не прошел по массиву во время сдвига.
+        for ingredient_id in removed.keys() | added.keys():
+            ids = array('q', postings.get(ingredient_id, ()))
+            for recipe_id in removed[ingredient_id]:
+                position = bisect_left(ids, recipe_id)
+                if position < len(ids) and ids[position] == recipe_id:
+                    del ids[position]
+            for recipe_id in added[ingredient_id]:
+                insort(ids, recipe_id)
+            if ids:
+                postings[ingredient_id] = ids
+            else:
+                postings.pop(ingredient_id, None)
+
+    def search(self, ingredient_ids, max_missing=0, request=None):
+        """Рецепты, которые можно приготовить из ingredient_ids.
+
+        Возвращает пары (id рецепта, число недостающих ингредиентов) для
+        рецептов, где есть хотя бы один из ингредиентов и недостает не
+        больше max_missing: сначала рецепты без недостающих, затем с
+        большим числом совпавших, затем позже опубликованные.
+        """
+        self.ensure_fresh(request)
+        postings, recipes, dates = self._entries
+        counts = Counter(chain.from_iterable(
+            postings.get(ingredient_id, ())
+            for ingredient_id in set(ingredient_ids)
+        ))
+        ranked = []
+        for recipe_id, matched in counts.items():
+            missing = len(recipes.get(recipe_id, ())) - matched
+            if 0 <= missing <= max_missing:
+                ranked.append((
+                    missing, -matched, -dates.get(recipe_id, 0), -recipe_id
+                ))
+        ranked.sort()
+        return [(-recipe_id, missing) for missing, _, _, recipe_id in ranked]
+
+    def missing_ingredients(self, recipe_id, ingredient_ids):
+        """Ингредиенты рецепта, которых нет среди ingredient_ids."""
+        _, recipes, _ = self._entries
+        return [
+            ingredient_id for ingredient_id in recipes.get(recipe_id, ())
+            if ingredient_id not in ingredient_ids
+        ]
+
+
+ingredient_index = IngredientIndex()
+recipe_ingredient_index = RecipeIngredientIndex()
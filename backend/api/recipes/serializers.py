@@ -1,30 +1,71 @@
+from collections import Counter
+
 from django.db import transaction
-from django.db.models import F
+from django.db.models import F, Prefetch, prefetch_related_objects
 
-from rest_framework.serializers import ModelSerializer, SerializerMethodField
+from rest_framework.serializers import (ListSerializer, ModelSerializer,
+                                        SerializerMethodField)
 from rest_framework.exceptions import ValidationError
 from drf_extra_fields.fields import Base64ImageField
 
+from ..fields import (ImageVariantsField, StreamingBase64ImageField,
+                      absolute_urls)
+from ..mixins import SparseFieldsMixin, TemporaryFilesMixin
 from ..users.serializers import (FoodgramUserSerializer,
                                  SubscriptionSerializer as UserSubSerializer)
-from recipes.models import Tag, Recipe, Ingredient, RecipeIngredient
+from recipes.images import schedule_variants
+from recipes.models import (Tag, Recipe, Ingredient, RecipeIngredient,
+                            RecipeTag, ShoppingListItem)
+from recipes.signals import relations_handled
+from users.models import User
+from .cache import recipe_cache
+from .indexes import recipe_ingredient_index
+
+COUNTER_FIELDS = ('favorites_count', 'cart_count')
+BULK_BATCH_SIZE = 1000
+
+# Подгрузка связанных объектов для полей RecipeSerializer.
+RECIPE_PREFETCH = {
+    'tags': Prefetch('tags', queryset=Tag.objects.all()),
+    'ingredients': Prefetch(
+        'ingredient_list',
+        queryset=RecipeIngredient.objects.select_related('ingredient')
+    ),
+}
+
+
+def get_tag_mask(tags):
+    return sum(1 << tag.bit for tag in tags if tag.bit is not None)
+
+
+def parse_ids(values):
+    """id из чисел и строк с числами, остальные значения пропускаются."""
+    ids = set()
+    for value in values:
+        try:
+            ids.add(int(value))
+        except (TypeError, ValueError):
+            continue
+    return ids
 
 
 class CropRecipeSerializer(ModelSerializer):
     image = Base64ImageField()
+    image_variants = ImageVariantsField('image')
 
     class Meta:
         model = Recipe
-        fields = ('id', 'name', 'image', 'cooking_time')
+        fields = ('id', 'name', 'image', 'image_variants', 'cooking_time')
         read_only_fields = ('id', 'name', 'image', 'cooking_time')
 
 
 class SpecialRecipeSerializer(ModelSerializer):
     image = Base64ImageField()
+    image_variants = ImageVariantsField('image')
 
     class Meta:
         model = Recipe
-        fields = ('id', 'name', 'image', 'cooking_time')
+        fields = ('id', 'name', 'image', 'image_variants', 'cooking_time')
         read_only_fields = ('id', 'name', 'image', 'cooking_time')
 
 
@@ -42,11 +83,35 @@ class IngredientSerializer(ModelSerializer):
         read_only_fields = ('id', 'name', 'measurement_unit')
 
 
-class RecipeSerializer(ModelSerializer):
+class RecipeListSerializer(ListSerializer):
+
+    def to_representation(self, data):
+        # Кэш читается одним запросом на страницу, а теги и ингредиенты
+        # подгружаются только для рецептов, которых в кэше нет.
+        recipes = list(data.all() if hasattr(data, 'all') else data)
+        request = self.context.get('request')
+        cached = recipe_cache.get_many(recipes, request)
+        missing = [recipe for recipe in recipes if recipe.pk not in cached]
+        prefetch_related_objects(missing, *self.child.get_prefetch())
+        built = [
+            (recipe, self.child.get_shared_representation(recipe))
+            for recipe in missing
+        ]
+        if self.child.is_cacheable:
+            recipe_cache.set_many(built, request)
+        cached.update((recipe.pk, data) for recipe, data in built)
+        for recipe in recipes:
+            recipe.shared_representation = cached[recipe.pk]
+        return [self.child.to_representation(recipe) for recipe in recipes]
+
+
+class RecipeSerializer(TemporaryFilesMixin, SparseFieldsMixin,
+                       ModelSerializer):
     tags = TagSerializer(read_only=True, many=True)
     author = FoodgramUserSerializer(read_only=True)
     ingredients = SerializerMethodField()
-    image = Base64ImageField()
+    image = StreamingBase64ImageField()
+    image_variants = ImageVariantsField('image')
     is_favorited = SerializerMethodField()
     is_in_shopping_cart = SerializerMethodField()
 
@@ -54,55 +119,173 @@ class RecipeSerializer(ModelSerializer):
         model = Recipe
         fields = ('id', 'tags', 'author', 'ingredients',
                   'is_favorited', 'is_in_shopping_cart',
-                  'name', 'image', 'text', 'cooking_time')
+                  'name', 'image', 'image_variants', 'text',
+                  'cooking_time', 'favorites_count', 'cart_count')
         read_only_fields = ('is_favorited', 'is_in_shopping_cart')
+        list_serializer_class = RecipeListSerializer
+
+    def to_representation(self, instance):
+        if self.context.get('shared'):
+            return super().to_representation(instance)
+        request = self.context.get('request')
+        data = getattr(instance, 'shared_representation', None)
+        if data is None:
+            data = recipe_cache.get(instance, request)
+        if data is None:
+            data = self.get_shared_representation(instance)
+            if self.is_cacheable:
+                recipe_cache.set(instance, data, request)
+        return self.personalize(instance, data)
+
+    @property
+    def is_cacheable(self):
+        # Ответ на запись не кэшируется: рецепт может измениться сразу
+        # после нее, например когда будут готовы копии изображения.
+        request = self.context.get('request')
+        return not self.is_sparse and (
+            request is None or request.method == 'GET'
+        )
+
+    def get_prefetch(self):
+        return [
+            prefetch for field, prefetch in RECIPE_PREFETCH.items()
+            if field in self.fields
+        ]
+
+    def get_shared_representation(self, instance):
+        """Представление без данных пользователя и с относительными URL.
+
+        Для неполного набора полей строится только выбранная часть,
+        такое представление не кэшируется.
+        """
+        prefetch_related_objects([instance], *self.get_prefetch())
+        return dict(RecipeSerializer(instance, context={
+            'shared': True,
+            'field_selection': tuple(self.fields),
+        }).data)
+
+    def personalize(self, instance, data):
+        """Накладывает на общее представление флаги пользователя."""
+        request = self.context.get('request')
+        result = {}
+        for field in self.fields:
+            if field == 'is_favorited':
+                result[field] = self.get_is_favorited(instance)
+            elif field == 'is_in_shopping_cart':
+                result[field] = self.get_is_in_shopping_cart(instance)
+            elif field in COUNTER_FIELDS:
+                # Счетчики меняются чаще рецепта и в кэш не попадают.
+                result[field] = getattr(instance, field)
+            else:
+                result[field] = data[field]
+        if 'author' in result:
+            result['author'] = author = dict(result['author'])
+            if hasattr(instance, 'is_author_subscribed'):
+                author['is_subscribed'] = instance.is_author_subscribed
+            else:
+                author['is_subscribed'] = FoodgramUserSerializer(
+                    context=self.context
+                ).get_is_subscribed(instance.author)
+        if request is not None:
+            for container, field in (
+                (result, 'image'),
+                (result, 'image_variants'),
+                (result.get('author'), 'avatar'),
+                (result.get('author'), 'avatar_variants'),
+            ):
+                if container and container.get(field):
+                    container[field] = absolute_urls(
+                        request, container[field]
+                    )
+        return result
 
     def get_ingredients(self, obj):
-        recipe = obj
-        ingredients = recipe.ingredients.values(
-            'id',
-            'name',
-            'measurement_unit',
-            amount=F('recipe__amount'))
-        return ingredients
+        return [
+            {
+                'id': recipe_ingredient.ingredient.id,
+                'name': recipe_ingredient.ingredient.name,
+                'measurement_unit':
+                    recipe_ingredient.ingredient.measurement_unit,
+                'amount': recipe_ingredient.amount,
+            }
+            for recipe_ingredient in obj.ingredient_list.all()
+        ]
 
     def get_is_favorited(self, obj):
-        user = self.context.get('view').request.user
-        return user.favorites.filter(recipe=obj).exists()
+        if hasattr(obj, 'is_favorited'):
+            return obj.is_favorited
+        request = self.context.get('request')
+        if request is None or request.user.is_anonymous:
+            return False
+        return request.user.favorites.filter(recipe=obj).exists()
 
     def get_is_in_shopping_cart(self, obj):
-        user = self.context.get('view').request.user
-        return user.shopping_cart.filter(recipe=obj).exists()
+        if hasattr(obj, 'is_in_shopping_cart'):
+            return obj.is_in_shopping_cart
+        request = self.context.get('request')
+        if request is None or request.user.is_anonymous:
+            return False
+        return request.user.shopping_cart.filter(recipe=obj).exists()
 
     def validate(self, data):
         tags_ids = self.initial_data.get('tags')
         if not tags_ids:
             raise ValidationError('Необходимо указать хотя бы один тег')
-        tags = Tag.objects.filter(id__in=tags_ids)
+        try:
+            tags_ids = list(dict.fromkeys(int(pk) for pk in tags_ids))
+        except (TypeError, ValueError):
+            raise ValidationError('Теги задаются списком id')
+        tags = self.find_tags(tags_ids)
+        missing = set(tags_ids) - {tag.pk for tag in tags}
+        if missing:
+            raise ValidationError(
+                f'Теги не найдены: {", ".join(map(str, sorted(missing)))}'
+            )
         ingredients = self.initial_data.get('ingredients')
         if not ingredients:
             raise ValidationError('Необходимо указать хотя бы один ингредиент')
         valid_ingredients = {}
         for ingredient in ingredients:
-            valid_ingredients[ingredient['id']] = int(ingredient['amount'])
-            if int(ingredient['amount']) <= 0:
+            try:
+                amount = int(ingredient['amount'])
+                valid_ingredients[int(ingredient['id'])] = amount
+            except (KeyError, TypeError, ValueError):
+                raise ValidationError(
+                    'Ингредиент задается полями id и amount')
+            if amount <= 0:
                 raise ValidationError(
                     'Количество ингредиента должно быть больше нуля')
-        ingredient_objects = (Ingredient.objects.filter(
-            pk__in=valid_ingredients))
+        ingredient_objects = self.find_ingredients(valid_ingredients)
         for ingredient_object in ingredient_objects:
             valid_ingredients[ingredient_object.pk] = (
                 ingredient_object, valid_ingredients[ingredient_object.pk])
+        missing = [str(pk) for pk, value in valid_ingredients.items()
+                   if not isinstance(value, tuple)]
+        if missing:
+            raise ValidationError(
+                f'Ингредиенты не найдены: {", ".join(missing)}'
+            )
         data.update({'tags': tags,
                      'ingredients': valid_ingredients,
                      'author': self.context.get('request').user})
         return data
 
+    def find_tags(self, ids):
+        return list(Tag.objects.filter(id__in=ids))
+
+    def find_ingredients(self, ids):
+        return Ingredient.objects.filter(pk__in=ids)
+
+    @transaction.atomic
     def create(self, validated_data):
         ingredients = validated_data.pop('ingredients')
         tags = validated_data.pop('tags')
-        recipe = Recipe.objects.create(**validated_data)
-        recipe.tags.set(tags)
+        recipe = Recipe.objects.create(
+            **validated_data, tag_mask=get_tag_mask(tags)
+        )
+        RecipeTag.objects.bulk_create(
+            [RecipeTag(recipe=recipe, tag=tag) for tag in tags]
+        )
         RecipeIngredient.objects.bulk_create(
             [RecipeIngredient(
                 ingredient=ingredient_data,
@@ -113,30 +296,179 @@ class RecipeSerializer(ModelSerializer):
 
     @transaction.atomic
     def update(self, instance, validated_data):
+        # Меняются только отличающиеся связи, а рецепт сохраняется один
+        # раз в конце: его post_save обновляет индекс состава, auto_now
+        # сдвигает updated_at (ETag и ключ кэша), маска тегов и списки
+        # покупок считаются здесь, поэтому обработчики строк отключены.
         tags = validated_data.pop('tags')
         ingredients = validated_data.pop('ingredients')
-        instance = super().update(instance, validated_data)
-        instance.tags.clear()
-        instance.tags.set(tags)
-        instance.ingredients.clear()
-        RecipeIngredient.objects.bulk_create(
-            [RecipeIngredient(
-                ingredient=ingredient_data,
-                recipe=instance,
-                amount=amount
-            ) for ingredient_data, amount in ingredients.values()])
+        for field, value in validated_data.items():
+            setattr(instance, field, value)
+        with relations_handled():
+            self.update_tags(instance, tags)
+            amounts = self.update_ingredients(instance, {
+                ingredient_data.pk: amount
+                for ingredient_data, amount in ingredients.values()
+            })
+        ShoppingListItem.objects.add_amounts(
+            instance.shopping_cart.values_list('user_id', flat=True), amounts
+        )
+        instance.tag_mask = get_tag_mask(tags)
         instance.save()
         return instance
 
+    def update_tags(self, instance, tags):
+        current = set(RecipeTag.objects.filter(
+            recipe=instance
+        ).values_list('tag_id', flat=True))
+        new = {tag.pk for tag in tags}
+        if current - new:
+            RecipeTag.objects.filter(
+                recipe=instance, tag_id__in=current - new
+            ).delete()
+        if new - current:
+            RecipeTag.objects.bulk_create(
+                [RecipeTag(recipe=instance, tag_id=pk)
+                 for pk in new - current]
+            )
+
+    def update_ingredients(self, instance, amounts):
+        """Приводит ингредиенты рецепта к amounts ({id: количество}).
+
+        Возвращает изменение количеств для списков покупок.
+        """
+        rows = instance.ingredient_list.values_list(
+            'pk', 'ingredient_id', 'amount'
+        )
+        current = {
+            ingredient_id: (pk, amount) for pk, ingredient_id, amount in rows
+        }
+        removed = [pk for ingredient_id, (pk, _) in current.items()
+                   if ingredient_id not in amounts]
+        if removed:
+            RecipeIngredient.objects.filter(pk__in=removed).delete()
+        # Для новых ингредиентов подставляется то же количество, и они
+        # сюда не попадают.
+        RecipeIngredient.objects.bulk_update([
+            RecipeIngredient(pk=current[ingredient_id][0], amount=amount)
+            for ingredient_id, amount in amounts.items()
+            if current.get(ingredient_id, (None, amount))[1] != amount
+        ], ['amount'])
+        RecipeIngredient.objects.bulk_create([
+            RecipeIngredient(
+                recipe=instance, ingredient_id=ingredient_id, amount=amount
+            )
+            for ingredient_id, amount in amounts.items()
+            if ingredient_id not in current
+        ])
+        changes = {}
+        for ingredient_id in current.keys() | amounts.keys():
+            old_amount = current.get(ingredient_id, (None, 0))[1]
+            changes[ingredient_id] = amounts.get(ingredient_id, 0) - old_amount
+        return changes
+
+
+class RecipeBulkListSerializer(TemporaryFilesMixin, RecipeListSerializer):
+    """Создание нескольких рецептов одной транзакцией.
+
+    Теги и ингредиенты всех рецептов загружаются двумя запросами до
+    проверки, строки вставляются bulk_create. Сигналы post_save при
+    этом не отправляются, поэтому их работа (счетчик рецептов автора,
+    копии изображений, индекс состава) выполняется здесь.
+    """
+
+    def to_internal_value(self, data):
+        tag_ids, ingredient_ids = set(), set()
+        for item in data if isinstance(data, list) else ():
+            if not isinstance(item, dict):
+                continue
+            tags = item.get('tags')
+            if isinstance(tags, list):
+                tag_ids.update(parse_ids(tags))
+            ingredients = item.get('ingredients')
+            if isinstance(ingredients, list):
+                ingredient_ids.update(parse_ids(
+                    ingredient.get('id') for ingredient in ingredients
+                    if isinstance(ingredient, dict)
+                ))
+        self.tags = Tag.objects.in_bulk(tag_ids)
+        self.ingredients = Ingredient.objects.in_bulk(ingredient_ids)
+        return super().to_internal_value(data)
+
+    @transaction.atomic
+    def create(self, validated_data):
+        recipes, relations = [], []
+        for data in validated_data:
+            data = dict(data)
+            tags = data.pop('tags')
+            ingredients = data.pop('ingredients')
+            recipes.append(Recipe(**data, tag_mask=get_tag_mask(tags)))
+            relations.append((tags, ingredients))
+        Recipe.objects.bulk_create(recipes, batch_size=BULK_BATCH_SIZE)
+        RecipeTag.objects.bulk_create([
+            RecipeTag(recipe=recipe, tag=tag)
+            for recipe, (tags, _) in zip(recipes, relations)
+            for tag in tags
+        ], batch_size=BULK_BATCH_SIZE)
+        RecipeIngredient.objects.bulk_create([
+            RecipeIngredient(
+                recipe=recipe, ingredient=ingredient_data, amount=amount
+            )
+            for recipe, (_, ingredients) in zip(recipes, relations)
+            for ingredient_data, amount in ingredients.values()
+        ], batch_size=BULK_BATCH_SIZE)
+        for author_id, added in Counter(
+            recipe.author_id for recipe in recipes
+        ).items():
+            User.objects.filter(pk=author_id).update(
+                recipes_count=F('recipes_count') + added
+            )
+        for recipe in recipes:
+            schedule_variants(recipe, 'image')
+            # Флаги для ответа известны без запросов: новых рецептов нет
+            # в избранном и корзинах, а на себя подписаться нельзя.
+            recipe.is_favorited = recipe.is_in_shopping_cart = False
+            recipe.is_author_subscribed = False
+        recipe_ingredient_index.schedule_update(
+            *(recipe.pk for recipe in recipes)
+        )
+        return recipes
+
+
+class RecipeBulkSerializer(RecipeSerializer):
+    """Рецепт в запросе на создание нескольких рецептов: теги и
+    ингредиенты берутся из загруженных списком."""
+
+    class Meta(RecipeSerializer.Meta):
+        list_serializer_class = RecipeBulkListSerializer
+
+    def to_internal_value(self, data):
+        # Один экземпляр проверяет все элементы списка по очереди.
+        self.initial_data = data
+        return super().to_internal_value(data)
+
+    def find_tags(self, ids):
+        return [self.parent.tags[pk] for pk in ids if pk in self.parent.tags]
+
+    def find_ingredients(self, ids):
+        return [self.parent.ingredients[pk] for pk in ids
+                if pk in self.parent.ingredients]
+
 
 # Override to avoid circular import
 class SubscriptionSerializer(UserSubSerializer):
-    recipes = SpecialRecipeSerializer(many=True, read_only=True)
+    recipes = SerializerMethodField()
 
     def get_recipes(self, obj):
-        request = self.context.get('request')
-        limit = request.GET.get('recipes_limit')
-        queryset = Recipe.objects.filter(author=obj)
-        if limit:
-            queryset = queryset[:int(limit)]
-        return CropRecipeSerializer(queryset, many=True).data
+        # Ограниченный recipes_limit список подгружается вьюсетом
+        # одним запросом для всех авторов страницы.
+        if hasattr(obj, 'limited_recipes'):
+            recipes = obj.limited_recipes
+        else:
+            recipes = obj.recipes.all()
+            limit = self.context.get('request').GET.get('recipes_limit')
+            if limit:
+                recipes = recipes[:int(limit)]
+        return CropRecipeSerializer(
+            recipes, many=True, context=self.context
+        ).data
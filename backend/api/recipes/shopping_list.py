@@ -0,0 +1,128 @@
+"""Выгрузка списка покупок в форматах txt, csv и json.
+
+Строки пишутся в ответ по мере чтения списка покупок, готовый
+файл кэшируется под версией корзины пользователя в отдельном кэше
+SHOPPING_LIST_CACHE_ALIAS с ограниченным числом записей. Версия считается
+одним запросом и меняется при добавлении или удалении рецепта из
+корзины и при изменении рецептов в ней.
+"""
+import csv
+import json
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db.models import Count, F, Max
+from django.http import HttpResponse, StreamingHttpResponse
+
+from recipes.models import Ingredient, ShoppingCart, ShoppingListItem
+from .cache import get_model_version
+
+CHUNK_SIZE = 500
+CONTENT_TYPES = {
+    'txt': 'text/plain; charset=utf-8',
+    'csv': 'text/csv; charset=utf-8',
+    'json': 'application/json',
+}
+
+
+def get_cart_version(user):
+    """Версия корзины или None, если корзина пуста."""
+    cart = ShoppingCart.objects.filter(user=user).aggregate(
+        count=Count('id'),
+        last_id=Max('id'),
+        updated_at=Max('recipe__updated_at'),
+    )
+    if not cart['count']:
+        return None
+    return (
+        f'{cart["count"]}:{cart["last_id"]}:'
+        f'{cart["updated_at"].timestamp()}:'
+        f'{get_model_version(Ingredient)[0]}'
+    )
+
+
+def get_ingredients(user):
+    # Суммы поддерживаются в ShoppingListItem, пересчет по корзине
+    # при выгрузке не нужен.
+    return ShoppingListItem.objects.filter(user=user).values(
+        'amount',
+        name=F('ingredient__name'),
+        measurement_unit=F('ingredient__measurement_unit'),
+    ).order_by(
+        'ingredient__name', 'ingredient__measurement_unit'
+    ).iterator(chunk_size=CHUNK_SIZE)
+
+
+def render_txt(ingredients):
+    yield 'Список покупок.'
+    for ingredient in ingredients:
+        yield (f'\n{ingredient["name"]}'
+               f'({ingredient["measurement_unit"]}):'
+               f'{ingredient["amount"]}')
+
+
+class Echo:
+    def write(self, value):
+        return value
+
+
+def render_csv(ingredients):
+    writer = csv.writer(Echo())
+    yield writer.writerow(('name', 'measurement_unit', 'amount'))
+    for ingredient in ingredients:
+        yield writer.writerow((
+            ingredient['name'],
+            ingredient['measurement_unit'],
+            ingredient['amount'],
+        ))
+
+
+def render_json(ingredients):
+    separator = '['
+    for ingredient in ingredients:
+        yield separator + json.dumps({
+            'name': ingredient['name'],
+            'measurement_unit': ingredient['measurement_unit'],
+            'amount': ingredient['amount'],
+        }, ensure_ascii=False)
+        separator = ','
+    yield '[]' if separator == '[' else ']'
+
+
+RENDERERS = {
+    'txt': render_txt,
+    'csv': render_csv,
+    'json': render_json,
+}
+
+
+def get_cache():
+    return caches[getattr(settings, 'SHOPPING_LIST_CACHE_ALIAS', 'default')]
+
+
+def cache_stream(chunks, key):
+    """Отдает части ответа и сохраняет файл в кэш после последней."""
+    parts = []
+    for chunk in chunks:
+        parts.append(chunk)
+        yield chunk
+    get_cache().set(key, ''.join(parts))
+
+
+def shopping_list_response(user, file_format, version):
+    key = f'shopping-list:{user.pk}:{version}:{file_format}'
+    content = get_cache().get(key)
+    if content is not None:
+        response = HttpResponse(
+            content, content_type=CONTENT_TYPES[file_format]
+        )
+    else:
+        response = StreamingHttpResponse(
+            cache_stream(
+                RENDERERS[file_format](get_ingredients(user)), key
+            ),
+            content_type=CONTENT_TYPES[file_format]
+        )
+    filename = f'{user.username}_shopping_list.{file_format}'
+    response['Content-Disposition'] = f'attachment; filename={filename}'
+    return response
@@ -0,0 +1,65 @@
+import gzip
+import threading
+from hashlib import sha256
+
+from django.http import HttpResponse
+from rest_framework.renderers import JSONRenderer
+
+from .cache import get_model_version
+
+
+class CatalogSnapshot:
+    """Готовый JSON-ответ справочника и его gzip-вариант.
+
+    Пересобирается только при смене версии таблицы модели, которую
+    увеличивают сигналы и команды импорта. ETag равен хэшу
+    содержимого, у сжатого варианта он отличается суффиксом.
+    """
+
+    def __init__(self, queryset, serializer_class):
+        self.queryset = queryset
+        self.serializer_class = serializer_class
+        self._lock = threading.Lock()
+        self._version = None
+        self._entries = None
+
+    def build(self):
+        body = JSONRenderer().render(
+            self.serializer_class(self.queryset.all(), many=True).data
+        )
+        digest = sha256(body).hexdigest()[:32]
+        return {
+            False: (body, f'"{digest}"'),
+            True: (gzip.compress(body, compresslevel=9), f'"{digest}-gz"'),
+        }
+
+    def get(self, compressed=False, request=None):
+        """Возвращает (содержимое, ETag) нужного варианта."""
+        version = get_model_version(self.queryset.model, request)[0]
+        if version != self._version:
+            with self._lock:
+                if version != self._version:
+                    self._entries = self.build()
+                    self._version = version
+        return self._entries[compressed]
+
+
+def is_snapshot_request(request):
+    """Снимок отдается только для JSON-ответа без параметров."""
+    is_json = request.accepted_renderer.format == 'json'
+    return is_json and not request.query_params
+
+
+def snapshot_response(snapshot, request):
+    compressed = accepts_gzip(request)
+    body, etag = snapshot.get(compressed, request)
+    response = HttpResponse(body, content_type='application/json')
+    response['ETag'] = etag
+    response['Vary'] = 'Accept-Encoding'
+    if compressed:
+        response['Content-Encoding'] = 'gzip'
+    return response
+
+
+def accepts_gzip(request):
+    return 'gzip' in request.META.get('HTTP_ACCEPT_ENCODING', '')
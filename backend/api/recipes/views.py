@@ -1,19 +1,42 @@
+from django.conf import settings
 from django.shortcuts import get_object_or_404, redirect
-from django.http import HttpResponse
-from django.db.models import Sum
 from django.urls import reverse
+from django.utils.decorators import method_decorator
+from django.views.decorators.http import condition
 from django_filters.rest_framework import DjangoFilterBackend
 from rest_framework import status
+from rest_framework.exceptions import APIException, ValidationError
 from rest_framework.viewsets import ModelViewSet, ReadOnlyModelViewSet
 from rest_framework.decorators import action
 from rest_framework.response import Response
 from rest_framework.permissions import IsAuthenticated
+from rest_framework.renderers import JSONRenderer
 
 from recipes.models import Tag, Recipe, Ingredient, Favorite, ShoppingCart
 from .serializers import (TagSerializer, RecipeSerializer,
-                          IngredientSerializer, SpecialRecipeSerializer)
+                          IngredientSerializer, SpecialRecipeSerializer,
+                          RecipeBulkSerializer)
 from ..permissions import IsAdminOrReadOnly, IsAuthorOrReadOnly
+from ..mixins import get_selected_fields
+from ..pagination import ListPagination
+from ..profiling import ProfilingMixin
+from ..renderers import CSVRenderer, PlainTextRenderer
 from .filters import NameFilter, RecipeFilter
+from .indexes import ingredient_index, recipe_ingredient_index
+from .shopping_list import get_cart_version, shopping_list_response
+from .snapshots import (CatalogSnapshot, is_snapshot_request,
+                        snapshot_response)
+from .conditions import (catalog_etag, catalog_last_modified, recipe_etag,
+                         recipe_last_modified)
+
+
+# Поля рецепта, которые не загружаются, если их нет в ?fields=.
+DEFERRABLE_RECIPE_FIELDS = ('name', 'text', 'image', 'image_variants',
+                            'cooking_time')
+# Ограничения поиска рецептов по имеющимся ингредиентам.
+MAX_AVAILABLE_INGREDIENTS = 100
+MAX_MISSING_INGREDIENTS = 3
+DEFAULT_MISSING_INGREDIENTS = 2
 
 
 def recipe_redirect(request, pk):
@@ -24,16 +47,72 @@ def recipe_redirect(request, pk):
     )
 
 
-class RecipeViewSet(ModelViewSet):
+class RequestTooLarge(APIException):
+    status_code = status.HTTP_413_REQUEST_ENTITY_TOO_LARGE
+    default_detail = 'Слишком большое тело запроса.'
+    default_code = 'request_too_large'
+
+
+class RecipeViewSet(ProfilingMixin, ModelViewSet):
     queryset = Recipe.objects.all()
     permission_classes = (IsAuthorOrReadOnly | IsAdminOrReadOnly,)
     serializer_class = RecipeSerializer
     filter_backends = (DjangoFilterBackend,)
     filterset_class = RecipeFilter
 
+    def get_queryset(self):
+        # Флаги пользователя считаются подзапросами, чтобы число запросов
+        # не зависело от размера страницы. Теги и ингредиенты подгружает
+        # сериализатор только для рецептов, которых нет в кэше.
+        fields = get_selected_fields(
+            self.request, RecipeSerializer.Meta.fields
+        )
+        queryset = super().get_queryset()
+        if 'author' in fields:
+            queryset = queryset.select_related('author')
+        # Ссылки на копии строятся по имени оригинала.
+        if 'image_variants' in fields:
+            fields += ('image',)
+        deferred = [field for field in DEFERRABLE_RECIPE_FIELDS
+                    if field not in fields]
+        if deferred:
+            queryset = queryset.defer(*deferred)
+        flags = [flag for flag in ('is_favorited', 'is_in_shopping_cart')
+                 if flag in fields]
+        if 'author' in fields:
+            flags.append('is_author_subscribed')
+        return queryset.with_user_flags(self.request.user, flags)
+
+    @method_decorator(condition(etag_func=recipe_etag,
+                                last_modified_func=recipe_last_modified))
+    def retrieve(self, request, *args, **kwargs):
+        return super().retrieve(request, *args, **kwargs)
+
     def perform_create(self, serializer):
         serializer.save(author=self.request.user)
 
+    @action(detail=False,
+            methods=['post'],
+            permission_classes=[IsAuthenticated])
+    def bulk(self, request):
+        # Размер проверяется по заголовку до чтения и разбора тела.
+        content_length = int(request.META.get('CONTENT_LENGTH') or 0)
+        if content_length > settings.RECIPE_BULK_MAX_BODY_SIZE:
+            raise RequestTooLarge(
+                f'Тело запроса больше '
+                f'{settings.RECIPE_BULK_MAX_BODY_SIZE} байт.'
+            )
+        # Все рецепты создаются одной транзакцией или ни один: при
+        # ошибках в ответе список ошибок по позициям запроса.
+        serializer = RecipeBulkSerializer(
+            data=request.data, many=True, allow_empty=False,
+            max_length=settings.RECIPE_BULK_MAX_SIZE,
+            context=self.get_serializer_context()
+        )
+        serializer.is_valid(raise_exception=True)
+        serializer.save(author=request.user)
+        return Response(serializer.data, status=status.HTTP_201_CREATED)
+
     @action(detail=True,
             methods=['post'],
             permission_classes=[IsAuthenticated])
@@ -84,39 +163,123 @@ class RecipeViewSet(ModelViewSet):
 
     @action(detail=False,
             methods=['get'],
-            permission_classes=[IsAuthenticated])
+            url_path='what-to-cook')
+    def what_to_cook(self, request):
+        # ?ingredients=1,2,3 (или повторяющийся параметр) - имеющиеся
+        # ингредиенты, ?max_missing= - сколько их может не хватать.
+        available = self.get_available_ingredients()
+        max_missing = self.get_max_missing()
+        paginator = ListPagination()
+        page = paginator.paginate_queryset(
+            recipe_ingredient_index.search(available, max_missing, request),
+            request, view=self
+        )
+        recipes = self.get_queryset().in_bulk([pk for pk, _ in page])
+        recipes = [recipes[pk] for pk, _ in page if pk in recipes]
+        data = self.get_serializer(recipes, many=True).data
+        for recipe, item in zip(recipes, data):
+            item['missing_ingredients'] = (
+                recipe_ingredient_index.missing_ingredients(
+                    recipe.pk, available
+                )
+            )
+        return paginator.get_paginated_response(data)
+
+    def get_available_ingredients(self):
+        values = ','.join(self.request.query_params.getlist('ingredients'))
+        try:
+            ingredients = {
+                int(value) for value in values.split(',') if value.strip()
+            }
+        except ValueError:
+            raise ValidationError(
+                {'ingredients': 'Ожидаются id ингредиентов через запятую.'}
+            )
+        if not ingredients:
+            raise ValidationError(
+                {'ingredients': 'Необходимо указать хотя бы один ингредиент.'}
+            )
+        if len(ingredients) > MAX_AVAILABLE_INGREDIENTS:
+            raise ValidationError({'ingredients': (
+                f'Можно указать не больше {MAX_AVAILABLE_INGREDIENTS} '
+                f'ингредиентов.'
+            )})
+        return ingredients
+
+    def get_max_missing(self):
+        value = self.request.query_params.get('max_missing')
+        if value is None:
+            return DEFAULT_MISSING_INGREDIENTS
+        try:
+            max_missing = int(value)
+        except ValueError:
+            max_missing = -1
+        if not 0 <= max_missing <= MAX_MISSING_INGREDIENTS:
+            raise ValidationError({'max_missing': (
+                f'Ожидается число от 0 до {MAX_MISSING_INGREDIENTS}.'
+            )})
+        return max_missing
+
+    @action(detail=False,
+            methods=['get'],
+            permission_classes=[IsAuthenticated],
+            renderer_classes=[PlainTextRenderer, CSVRenderer, JSONRenderer])
     def download_shopping_cart(self, request):
-        user = request.user
-        if not user.shopping_cart.exists():
+        # Формат выбирается параметром ?format= (txt, csv, json).
+        version = get_cart_version(request.user)
+        if version is None:
             return Response(status=status.HTTP_400_BAD_REQUEST)
-        ingredients = Ingredient.objects.filter(
-            recipe__recipe__shopping_cart__user=user).values(
-            'name',
-            'measurement_unit').annotate(amount=Sum('recipe__amount'))
-        shopping_list = ['Список покупок.']
-        for ingredient in ingredients:
-            shopping_list += [
-                f'{ingredient["name"]}'
-                f'({ingredient["measurement_unit"]}):'
-                f'{ingredient["amount"]}']
-        filename = f'{user.username}_shopping_list.txt'
-        result_list = '\n'.join(shopping_list)
-        response = HttpResponse(result_list, content_type='text/plain')
-        response['Content-Disposition'] = f'attachment; filename={filename}'
-        return response
-
-
-class TagViewSet(ReadOnlyModelViewSet):
+        return shopping_list_response(
+            request.user, request.accepted_renderer.format, version
+        )
+
+
+class TagViewSet(ProfilingMixin, ReadOnlyModelViewSet):
     queryset = Tag.objects.all()
     serializer_class = TagSerializer
     permission_classes = (IsAdminOrReadOnly,)
     pagination_class = None
 
+    snapshot = CatalogSnapshot(Tag.objects.all(), TagSerializer)
+
+    @method_decorator(condition(etag_func=catalog_etag(Tag, snapshot),
+                                last_modified_func=catalog_last_modified(Tag)))
+    def list(self, request, *args, **kwargs):
+        if is_snapshot_request(request):
+            return snapshot_response(self.snapshot, request)
+        return super().list(request, *args, **kwargs)
+
 
-class IngredientViewSet(ReadOnlyModelViewSet):
+class IngredientViewSet(ProfilingMixin, ReadOnlyModelViewSet):
     queryset = Ingredient.objects.all()
     serializer_class = IngredientSerializer
     permission_classes = (IsAdminOrReadOnly,)
     filter_backends = DjangoFilterBackend,
     filterset_class = NameFilter
     pagination_class = None
+
+    snapshot = CatalogSnapshot(Ingredient.objects.all(), IngredientSerializer)
+
+    @method_decorator(condition(
+        etag_func=catalog_etag(Ingredient, snapshot),
+        last_modified_func=catalog_last_modified(Ingredient)
+    ))
+    def list(self, request, *args, **kwargs):
+        if is_snapshot_request(request):
+            return snapshot_response(self.snapshot, request)
+        # Поиск по названию обслуживается индексом в памяти без запросов
+        # к базе: без учета регистра, сначала совпадения по префиксу,
+        # затем по подстроке.
+        name = request.query_params.get('name')
+        if name is None:
+            return super().list(request, *args, **kwargs)
+        return Response(
+            ingredient_index.search(name, self.get_limit(), request)
+        )
+
+    def get_limit(self):
+        try:
+            limit = int(self.request.query_params['limit'])
+        except (KeyError, ValueError):
+            return None
+        return limit if limit > 0 else None
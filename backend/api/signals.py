@@ -0,0 +1,95 @@
+from django.db.models.signals import m2m_changed, post_delete, post_save
+from django.dispatch import receiver
+from django.utils import timezone
+
+from recipes.models import (Ingredient, Recipe, RecipeIngredient, RecipeTag,
+                            Tag)
+from recipes.signals import are_relations_handled, catalog_changed
+from users.models import User
+from .recipes.cache import bump_model_version
+from .recipes.indexes import recipe_ingredient_index
+
+# Поля пользователя, которые входят в представление автора рецепта.
+AUTHOR_FIELDS = {'email', 'username', 'first_name', 'last_name', 'avatar',
+                 'avatar_variants'}
+
+
+def touch_recipes(*pks):
+    """Сдвигает дату изменения рецептов, чтобы обновились ETag и ключи
+    кэша представлений."""
+    Recipe.objects.filter(pk__in=pks).update(updated_at=timezone.now())
+
+
+@receiver(post_save, sender=RecipeIngredient)
+@receiver(post_delete, sender=RecipeIngredient)
+@receiver(post_save, sender=RecipeTag)
+@receiver(post_delete, sender=RecipeTag)
+def invalidate_recipe_relation(sender, instance, **kwargs):
+    if are_relations_handled():
+        return
+    touch_recipes(instance.recipe_id)
+
+
+@receiver(m2m_changed, sender=RecipeIngredient)
+@receiver(m2m_changed, sender=RecipeTag)
+def invalidate_recipe_m2m(sender, instance, action, reverse, pk_set,
+                          **kwargs):
+    if not action.startswith('post_'):
+        return
+    if not reverse:
+        touch_recipes(instance.pk)
+    elif pk_set:
+        touch_recipes(*pk_set)
+    else:
+        bump_model_version(type(instance))
+
+
+# Состав рецепта при создании и изменении через API записывается
+# bulk_create без post_save, поэтому индекс обновляется и по полному
+# сохранению самого рецепта, которое завершает запись.
+@receiver(post_save, sender=Recipe)
+def update_ingredient_index(sender, instance, update_fields, **kwargs):
+    if update_fields is None:
+        recipe_ingredient_index.schedule_update(instance.pk)
+
+
+@receiver(post_delete, sender=Recipe)
+def remove_from_ingredient_index(sender, instance, **kwargs):
+    recipe_ingredient_index.schedule_update(instance.pk)
+
+
+@receiver(post_save, sender=RecipeIngredient)
+@receiver(post_delete, sender=RecipeIngredient)
+def update_ingredient_index_relation(sender, instance, **kwargs):
+    if are_relations_handled():
+        return
+    recipe_ingredient_index.schedule_update(instance.recipe_id)
+
+
+@receiver(m2m_changed, sender=RecipeIngredient)
+def update_ingredient_index_m2m(sender, instance, action, reverse, pk_set,
+                                **kwargs):
+    if not action.startswith('post_'):
+        return
+    if not reverse:
+        recipe_ingredient_index.schedule_update(instance.pk)
+    elif pk_set:
+        recipe_ingredient_index.schedule_update(*pk_set)
+    else:
+        recipe_ingredient_index.invalidate()
+
+
+@receiver(post_save, sender=Tag)
+@receiver(post_delete, sender=Tag)
+@receiver(post_save, sender=Ingredient)
+@receiver(post_delete, sender=Ingredient)
+@receiver(catalog_changed)
+def invalidate_catalog(sender, **kwargs):
+    bump_model_version(sender)
+
+
+@receiver(post_save, sender=User)
+def invalidate_author(sender, instance, created, update_fields, **kwargs):
+    if created or (update_fields and not AUTHOR_FIELDS & set(update_fields)):
+        return
+    touch_recipes(*instance.recipes.values_list('pk', flat=True))
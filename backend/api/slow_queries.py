@@ -0,0 +1,193 @@
+import hashlib
+import json
+import logging
+import os
+import random
+import re
+import threading
+import time
+import traceback
+from logging.handlers import RotatingFileHandler
+
+from django.conf import settings
+from django.db import DatabaseError, transaction
+from django.utils import timezone
+
+MAX_PARAMS_LENGTH = 2000
+MAX_ENTRIES_PER_REQUEST = 50
+SKIPPED_MODULES = ('middleware.py', 'slow_queries.py')
+
+# Литералы, списки IN и VALUES заменяются на ?, чтобы запросы,
+# отличающиеся только значениями, попадали в один отпечаток.
+FINGERPRINT_PATTERNS = (
+    (re.compile(r"'(?:[^']|'')*'"), '?'),
+    (re.compile(r'\b\d+(?:\.\d+)?\b'), '?'),
+    (re.compile(r'%s'), '?'),
+    (re.compile(r'\(\s*\?(?:\s*,\s*\?)*\s*\)'), '(?+)'),
+    (re.compile(r'(?:\(\?\+\)\s*,\s*)+\(\?\+\)'), '(?+)'),
+    (re.compile(r'\s+'), ' '),
+)
+EXPLAIN_PREFIXES = {
+    'postgresql': ('EXPLAIN (FORMAT JSON) ',
+                   'EXPLAIN (ANALYZE, BUFFERS, FORMAT JSON) '),
+    'sqlite': ('EXPLAIN QUERY PLAN ', None),
+}
+
+logger = logging.getLogger(__name__)
+_journal = None
+_journal_lock = threading.Lock()
+
+
+def fingerprint(sql):
+    """Нормализованный текст запроса и его короткий хэш."""
+    normalized = sql
+    for pattern, replacement in FINGERPRINT_PATTERNS:
+        normalized = pattern.sub(replacement, normalized)
+    normalized = normalized.strip()
+    return (
+        hashlib.sha1(normalized.encode()).hexdigest()[:16], normalized
+    )
+
+
+def get_journal():
+    """Логгер с ротацией файла SLOW_QUERY_LOG, создается при первой
+    записи."""
+    global _journal
+    with _journal_lock:
+        if _journal is None:
+            path = settings.SLOW_QUERY_LOG
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            handler = RotatingFileHandler(
+                path, maxBytes=settings.SLOW_QUERY_LOG_MAX_BYTES,
+                backupCount=settings.SLOW_QUERY_LOG_BACKUPS,
+                encoding='utf-8'
+            )
+            handler.setFormatter(logging.Formatter('%(message)s'))
+            _journal = logging.getLogger(f'{__name__}.journal')
+            _journal.addHandler(handler)
+            _journal.setLevel(logging.INFO)
+            _journal.propagate = False
+        return _journal
+
+
+def find_caller():
+    """Ближайший к запросу кадр стека из кода проекта без middleware."""
+    root = str(settings.BASE_DIR)
+    for frame in reversed(traceback.extract_stack()[:-4]):
+        filename = frame.filename
+        if not filename.startswith(root) or 'site-packages' in filename:
+            continue
+        if filename.endswith(SKIPPED_MODULES):
+            continue
+        return (f'{os.path.relpath(filename, root)}:'
+                f'{frame.lineno} in {frame.name}')
+    return None
+
+
+def is_read_only(sql):
+    """Запрос без изменения данных по тексту: SELECT или WITH без
+    FOR UPDATE и INSERT, UPDATE, DELETE.
+
+    Вызовы функций с побочными эффектами (nextval, пользовательские
+    функции) по тексту не распознаются.
+    """
+    statement = sql.lstrip().upper()
+    if not statement.startswith(('SELECT', 'WITH')):
+        return False
+    if 'FOR UPDATE' in statement:
+        return False
+    return not re.search(r'\b(INSERT|UPDATE|DELETE)\b', statement)
+
+
+class SlowQueryLogger:
+    """execute_wrapper, собирающий запросы дольше SLOW_QUERY_MS.
+
+    Запрос попадает в журнал с вероятностью SLOW_QUERY_SAMPLE_RATE.
+    Записи копятся до вызова flush, который выполняет EXPLAIN уже после
+    обработки запроса, чтобы не вклиниваться между выполнением запроса
+    и чтением его результатов. При SLOW_QUERY_EXPLAIN = 'plan' к записи
+    добавляется план, при 'analyze' для читающих запросов в PostgreSQL -
+    EXPLAIN ANALYZE, то есть запрос выполняется повторно в транзакции,
+    которая затем откатывается.
+    """
+
+    def __init__(self, connection, request=None):
+        self.connection = connection
+        self.request = request
+        self.entries = []
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        result = execute(sql, params, many, context)
+        duration = (time.perf_counter() - started) * 1000
+        if duration >= settings.SLOW_QUERY_MS and self.is_sampled():
+            self.entries.append(self.make_entry(sql, params, many, duration))
+        return result
+
+    def is_sampled(self):
+        if len(self.entries) >= MAX_ENTRIES_PER_REQUEST:
+            return False
+        return random.random() < settings.SLOW_QUERY_SAMPLE_RATE
+
+    def view_name(self):
+        match = getattr(self.request, 'resolver_match', None)
+        if match is None:
+            return None
+        return match.view_name
+
+    def make_entry(self, sql, params, many, duration):
+        key, normalized = fingerprint(sql)
+        return {
+            'time': timezone.now().isoformat(),
+            'database': self.connection.alias,
+            'fingerprint': key,
+            'normalized': normalized,
+            'sql': sql,
+            'params': params,
+            'many': many,
+            'duration_ms': round(duration, 3),
+            'view': self.view_name(),
+            'method': getattr(self.request, 'method', None),
+            'path': getattr(self.request, 'path', None),
+            'caller': find_caller(),
+        }
+
+    def flush(self):
+        entries, self.entries = self.entries, []
+        for entry in entries:
+            try:
+                if settings.SLOW_QUERY_EXPLAIN and not entry['many']:
+                    entry.update(self.explain(entry['sql'], entry['params']))
+                entry['params'] = json.dumps(
+                    entry['params'], default=str, ensure_ascii=False
+                )[:MAX_PARAMS_LENGTH]
+                get_journal().info(
+                    json.dumps(entry, ensure_ascii=False, default=str)
+                )
+            except Exception:
+                logger.exception('Не удалось записать медленный запрос')
+
+    def explain(self, sql, params):
+        plan_prefix, analyze_prefix = EXPLAIN_PREFIXES.get(
+            self.connection.vendor, ('EXPLAIN ', None)
+        )
+        analyze = settings.SLOW_QUERY_EXPLAIN == 'analyze'
+        if analyze_prefix is None or not is_read_only(sql):
+            analyze = False
+        try:
+            with transaction.atomic(using=self.connection.alias):
+                with self.connection.cursor() as cursor:
+                    cursor.execute(
+                        (analyze_prefix if analyze else plan_prefix) + sql,
+                        params
+                    )
+                    rows = cursor.fetchall()
+                # Изменения, сделанные функциями в запросе, не остаются.
+                transaction.set_rollback(True, using=self.connection.alias)
+        except DatabaseError as e:
+            return {'explain_error': str(e)}
+        if self.connection.vendor == 'postgresql':
+            plan = rows[0][0]
+        else:
+            plan = [' '.join(map(str, row)) for row in rows]
+        return {'explain': plan, 'analyze': analyze}
@@ -0,0 +1,112 @@
+import base64
+import io
+import os
+import shutil
+import tempfile
+
+from django.conf import settings
+from django.core.cache import caches
+from django.test import TestCase, override_settings
+from PIL import Image
+from rest_framework.test import APIClient
+
+from recipes.models import Ingredient, Recipe, RecipeIngredient, Tag
+from users.models import User
+
+
+def get_test_caches(directory):
+    """Настроенные кэши, файловые - во временном каталоге теста."""
+    caches = {}
+    for alias, config in settings.CACHES.items():
+        config = dict(config)
+        if config['BACKEND'].endswith('FileBasedCache'):
+            config['LOCATION'] = os.path.join(directory, alias)
+        else:
+            config['LOCATION'] = f'test-{alias}'
+        caches[alias] = config
+    return caches
+
+
+def make_image(width=4, height=4, image_format='PNG'):
+    """Изображение в виде data URI, как его присылает фронтенд."""
+    buffer = io.BytesIO()
+    Image.new('RGB', (width, height), 'orange').save(buffer, image_format)
+    data = base64.b64encode(buffer.getvalue()).decode()
+    return f'data:image/{image_format.lower()};base64,{data}'
+
+
+class APITestCase(TestCase):
+    """Пользователи, теги и ингредиенты, изолированные кэши и MEDIA_ROOT.
+
+    Кэши те же, что в настройках, файловые хранятся во временном
+    каталоге, поэтому тесты проверяют поведение настроенных бэкендов.
+
+    Копии изображений ставятся в очередь через on_commit, который в
+    TestCase не выполняется, поэтому изображения не обрабатываются.
+    """
+
+    @classmethod
+    def setUpClass(cls):
+        cls.media_root = tempfile.mkdtemp()
+        cls.settings_override = override_settings(
+            CACHES=get_test_caches(os.path.join(cls.media_root, 'cache')),
+            MEDIA_ROOT=cls.media_root, IMAGE_WORKERS=0
+        )
+        cls.settings_override.enable()
+        super().setUpClass()
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        cls.settings_override.disable()
+        shutil.rmtree(cls.media_root, ignore_errors=True)
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create_user(
+            email='author@example.com', username='author',
+            first_name='Автор', last_name='Рецептов', password='password'
+        )
+        cls.reader = User.objects.create_user(
+            email='reader@example.com', username='reader',
+            first_name='Читатель', last_name='Рецептов', password='password'
+        )
+        cls.tags = [
+            Tag.objects.create(name=f'Тег {i}', slug=f'tag{i}')
+            for i in range(3)
+        ]
+        cls.ingredients = [
+            Ingredient.objects.create(
+                name=f'Ингредиент {i}', measurement_unit='г'
+            )
+            for i in range(6)
+        ]
+
+    def setUp(self):
+        for cache in caches.all():
+            cache.clear()
+        self.anonymous = APIClient()
+        self.client_author = APIClient()
+        self.client_author.force_authenticate(self.author)
+        self.client_reader = APIClient()
+        self.client_reader.force_authenticate(self.reader)
+
+    @classmethod
+    def create_recipe(cls, name='Рецепт', author=None, tags=None,
+                      ingredients=None):
+        """Рецепт через ORM; ingredients - пары (ингредиент, количество)."""
+        recipe = Recipe.objects.create(
+            author=author or cls.author, name=name,
+            text=f'Описание: {name}', cooking_time=10,
+            image='recipes/test.png'
+        )
+        recipe.tags.set(tags or cls.tags[:2])
+        RecipeIngredient.objects.bulk_create(
+            RecipeIngredient(recipe=recipe, ingredient=ingredient,
+                             amount=amount)
+            for ingredient, amount in (
+                ingredients or [(cls.ingredients[0], 100),
+                                (cls.ingredients[1], 2)]
+            )
+        )
+        return recipe
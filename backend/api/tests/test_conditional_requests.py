@@ -0,0 +1,125 @@
+import json
+
+from django.conf import settings
+from django.core.cache import caches
+
+from recipes.models import Tag
+from .base import APITestCase
+
+
+class RecipeConditionalRequestsTest(APITestCase):
+    """ETag и Last-Modified рецепта меняются вместе с данными ответа."""
+
+    def setUp(self):
+        super().setUp()
+        self.recipe = self.create_recipe()
+        self.url = f'/api/recipes/{self.recipe.pk}/'
+
+    def get(self, client, **headers):
+        return client.get(self.url, headers=headers)
+
+    def assert_not_modified(self, client, etag):
+        response = self.get(client, if_none_match=etag)
+        self.assertEqual(response.status_code, 304)
+
+    def assert_modified(self, client, etag):
+        response = self.get(client, if_none_match=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+        return response
+
+    def test_not_modified(self):
+        for client in (self.anonymous, self.client_reader):
+            with self.subTest(client=client):
+                etag = self.get(client)['ETag']
+                self.assert_not_modified(client, etag)
+
+    def test_if_modified_since(self):
+        last_modified = self.get(self.anonymous)['Last-Modified']
+        response = self.get(
+            self.anonymous, if_modified_since=last_modified
+        )
+        self.assertEqual(response.status_code, 304)
+
+    def test_tag_rename_changes_etag(self):
+        etag = self.get(self.anonymous)['ETag']
+        tag = self.tags[0]
+        tag.name = 'Переименованный'
+        tag.save()
+        response = self.assert_modified(self.anonymous, etag)
+        self.assertIn(
+            'Переименованный', [item['name'] for item in response.data['tags']]
+        )
+
+    def test_ingredient_rename_changes_etag(self):
+        etag = self.get(self.anonymous)['ETag']
+        ingredient = self.ingredients[0]
+        ingredient.name = 'Переименованный'
+        ingredient.save()
+        response = self.assert_modified(self.anonymous, etag)
+        self.assertIn(
+            'Переименованный',
+            [item['name'] for item in response.data['ingredients']]
+        )
+
+    def test_user_flags_change_etag(self):
+        etag = self.get(self.client_reader)['ETag']
+        self.reader.favorites.create(recipe=self.recipe)
+        response = self.assert_modified(self.client_reader, etag)
+        self.assertTrue(response.data['is_favorited'])
+
+    def test_recipe_update_changes_etag(self):
+        etag = self.get(self.anonymous)['ETag']
+        response = self.client_author.patch(self.url, {
+            'name': 'Новое название', 'text': self.recipe.text,
+            'cooking_time': self.recipe.cooking_time,
+            'tags': [self.tags[0].pk],
+            'ingredients': [{'id': self.ingredients[0].pk, 'amount': 1}],
+        }, format='json')
+        self.assertEqual(response.status_code, 200, response.data)
+        response = self.assert_modified(self.anonymous, etag)
+        self.assertEqual(response.data['name'], 'Новое название')
+
+    def test_tag_rename_after_cache_clear(self):
+        self.anonymous.get('/api/recipes/')
+        tag = self.tags[0]
+        tag.name = 'Переименованный'
+        tag.save()
+        # Вытеснение записей кэша не возвращает старое поколение.
+        for alias in settings.CACHES:
+            caches[alias].clear()
+        self.anonymous.get('/api/recipes/')
+        response = self.anonymous.get('/api/recipes/')
+        self.assertIn(
+            'Переименованный',
+            [item['name'] for item in response.data['results'][0]['tags']]
+        )
+
+
+class CatalogConditionalRequestsTest(APITestCase):
+    """Снимок справочника отдает 304 и пересобирается после записи."""
+
+    url = '/api/tags/'
+
+    def test_not_modified(self):
+        for encoding in ('', 'gzip'):
+            with self.subTest(encoding=encoding):
+                etag = self.anonymous.get(
+                    self.url, headers={'accept_encoding': encoding}
+                )['ETag']
+                response = self.anonymous.get(self.url, headers={
+                    'accept_encoding': encoding, 'if_none_match': etag
+                })
+                self.assertEqual(response.status_code, 304)
+
+    def test_create_changes_snapshot(self):
+        etag = self.anonymous.get(self.url)['ETag']
+        Tag.objects.create(name='Новый', slug='new')
+        response = self.anonymous.get(
+            self.url, headers={'if_none_match': etag}
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+        self.assertIn('new', [tag['slug'] for tag in json.loads(
+            response.content
+        )])
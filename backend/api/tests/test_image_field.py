@@ -0,0 +1,96 @@
+import base64
+import io
+import os
+import tracemalloc
+from unittest import mock
+
+from django.core.files.uploadedfile import TemporaryUploadedFile
+from django.test import override_settings
+from PIL import Image
+
+from api.fields import StreamingBase64ImageField
+from .base import APITestCase, make_image
+
+MIB = 1024 * 1024
+
+
+def make_noise_image(width, height):
+    """PNG из случайных пикселей, который почти не сжимается."""
+    buffer = io.BytesIO()
+    Image.frombytes(
+        'RGB', (width, height), os.urandom(width * height * 3)
+    ).save(buffer, 'PNG', compress_level=0)
+    return buffer.getvalue()
+
+
+class StreamingBase64ImageFieldTest(APITestCase):
+
+    def test_large_image_decoded_in_chunks(self):
+        # Пик памяти при декодировании много меньше размера изображения.
+        content = make_noise_image(1600, 1200)
+        self.assertGreater(len(content), 5 * MIB)
+        data = f'data:image/png;base64,{base64.b64encode(content).decode()}'
+        field = StreamingBase64ImageField()
+        # Первый вызов импортирует модули Pillow, их память не считается.
+        field.to_internal_value(make_image()).close()
+        tracemalloc.start()
+        try:
+            file = field.to_internal_value(data)
+            _, peak = tracemalloc.get_traced_memory()
+        finally:
+            tracemalloc.stop()
+        self.assertLess(peak, MIB)
+        self.assertEqual(file.size, len(content))
+        self.assertTrue(file.name.endswith('.png'))
+        file.seek(0)
+        self.assertEqual(file.read(), content)
+        file.close()
+
+    def recipe_payload(self, image):
+        return {
+            'name': 'Рецепт', 'text': 'Описание', 'cooking_time': 10,
+            'image': image,
+            'tags': [self.tags[0].pk],
+            'ingredients': [{'id': self.ingredients[0].pk, 'amount': 1}],
+        }
+
+    def post_image(self, image):
+        return self.client_author.post(
+            '/api/recipes/', self.recipe_payload(image), format='json'
+        )
+
+    def test_valid_image_accepted(self):
+        close = TemporaryUploadedFile.close
+        with mock.patch.object(
+            TemporaryUploadedFile, 'close', autospec=True, side_effect=close
+        ) as closed:
+            response = self.post_image(make_image())
+        self.assertEqual(response.status_code, 201, response.data)
+        # Временный файл закрыт после сохранения, а не сборщиком мусора.
+        closed.assert_called_once()
+
+    def test_invalid_image_rejected(self):
+        for name, image in (
+            ('not image', 'data:image/png;base64,{}'.format(
+                base64.b64encode(b'not an image' * 10).decode()
+            )),
+            ('truncated', make_image(64, 64)[:120]),
+            ('bad base64', 'data:image/png;base64,!!!!'),
+            ('not string', 42),
+        ):
+            with self.subTest(name):
+                response = self.post_image(image)
+                self.assertEqual(response.status_code, 400)
+                self.assertIn('image', response.data)
+
+    @override_settings(IMAGE_UPLOAD_MAX_SIZE=1024)
+    def test_too_large_image_rejected(self):
+        response = self.post_image(make_image(256, 256, 'BMP'))
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('image', response.data)
+
+    @override_settings(IMAGE_UPLOAD_MAX_PIXELS=100)
+    def test_too_many_pixels_rejected(self):
+        response = self.post_image(make_image(20, 20))
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('image', response.data)
@@ -0,0 +1,71 @@
+import io
+import json
+import os
+import tempfile
+from unittest import mock
+
+from django.core.management import CommandError, call_command
+
+from recipes.importers import read_json_array
+from recipes.models import MAX_TAGS, TOO_MANY_TAGS, Tag
+from .base import APITestCase
+
+
+class ReadJsonArrayTest(APITestCase):
+
+    def test_values_split_between_chunks(self):
+        items = [12345, 678.5, -9, {'name': 'соль', 'amount': 10},
+                 'строка', True, None, [1, 2], 1e10]
+        text = json.dumps(items)
+        for chunk_size in range(1, 8):
+            with self.subTest(chunk_size=chunk_size), mock.patch(
+                'recipes.importers.READ_CHUNK_SIZE', chunk_size
+            ):
+                self.assertEqual(
+                    list(read_json_array(io.StringIO(text))), items
+                )
+
+    def test_unclosed_array(self):
+        with mock.patch('recipes.importers.READ_CHUNK_SIZE', 3):
+            with self.assertRaises(ValueError):
+                list(read_json_array(io.StringIO('[1, 2, 345')))
+
+
+class ImportTagsTest(APITestCase):
+
+    def import_tags(self, tags):
+        file = tempfile.NamedTemporaryFile(
+            'w', suffix='.json', encoding='utf-8', delete=False
+        )
+        self.addCleanup(os.remove, file.name)
+        with file:
+            json.dump(tags, file, ensure_ascii=False)
+        stdout, stderr = io.StringIO(), io.StringIO()
+        call_command('import_tags', file.name, stdout=stdout, stderr=stderr)
+        return stdout.getvalue(), stderr.getvalue()
+
+    def test_name_taken_by_other_tag_skipped(self):
+        stdout, stderr = self.import_tags([
+            {'name': 'Тег 0', 'slug': 'other'},
+            {'name': 'Новый', 'slug': 'new'},
+            {'name': 'Новый', 'slug': 'duplicate'},
+            {'name': 'Переименованный', 'slug': 'tag1'},
+        ])
+        self.assertIn('пропущено 2', stdout)
+        self.assertIn('Тег 0', stderr)
+        self.assertIn('duplicate', stderr)
+        self.assertEqual(
+            dict(Tag.objects.values_list('slug', 'name')),
+            {'tag0': 'Тег 0', 'tag1': 'Переименованный', 'tag2': 'Тег 2',
+             'new': 'Новый'}
+        )
+        self.assertIsNotNone(Tag.objects.get(slug='new').bit)
+
+    def test_too_many_tags_rolls_back(self):
+        tags = [
+            {'name': f'Новый {i}', 'slug': f'new{i}'}
+            for i in range(MAX_TAGS - Tag.objects.count() + 1)
+        ]
+        with self.assertRaisesMessage(CommandError, TOO_MANY_TAGS):
+            self.import_tags(tags)
+        self.assertFalse(Tag.objects.filter(slug__startswith='new').exists())
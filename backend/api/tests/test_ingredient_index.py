@@ -0,0 +1,74 @@
+from datetime import timedelta
+
+from django.utils import timezone
+
+from api.recipes.cache import bump_model_version
+from api.recipes.indexes import RecipeIngredientIndex
+from recipes.models import Recipe, RecipeIngredient
+from .base import APITestCase
+
+
+class RecipeIngredientIndexTest(APITestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.index = RecipeIngredientIndex()
+        first, second = self.ingredients[:2]
+        self.new = self.create_recipe('Новый', ingredients=[(first, 1)])
+        # Загруженный позже рецепт со старой датой публикации.
+        self.old = self.create_recipe('Старый', ingredients=[(first, 1)])
+        Recipe.objects.filter(pk=self.old.pk).update(
+            pub_date=timezone.now() - timedelta(days=30)
+        )
+        self.partial = self.create_recipe(
+            'Неполный', ingredients=[(first, 1), (second, 1)]
+        )
+
+    def search(self, max_missing=1):
+        return self.index.search({self.ingredients[0].pk}, max_missing)
+
+    def test_ties_ordered_by_pub_date(self):
+        self.assertEqual(self.search(), [
+            (self.new.pk, 0), (self.old.pk, 0), (self.partial.pk, 1),
+        ])
+
+    def test_update_applies_changes(self):
+        self.search()
+        RecipeIngredient.objects.filter(recipe=self.partial).exclude(
+            ingredient=self.ingredients[0]
+        ).delete()
+        self.index.update([self.partial.pk])
+        entries = self.index._entries
+        self.assertEqual(self.search(0), [
+            (self.partial.pk, 0), (self.new.pk, 0), (self.old.pk, 0),
+        ])
+        # Поиск не перестраивал индекс.
+        self.assertIs(self.index._entries, entries)
+
+    def test_concurrent_change_rebuilds(self):
+        self.search()
+        RecipeIngredient.objects.filter(recipe=self.partial).delete()
+        # Другой процесс изменил состав между обновлениями этого.
+        bump_model_version(RecipeIngredient)
+        self.index.update([self.new.pk])
+        entries = self.index._entries
+        self.assertEqual(self.search(), [
+            (self.new.pk, 0), (self.old.pk, 0),
+        ])
+        self.assertIsNot(self.index._entries, entries)
+
+    def test_update_in_other_process_rebuilds(self):
+        other = RecipeIngredientIndex()
+        self.search()
+        other.search({self.ingredients[0].pk})
+        RecipeIngredient.objects.filter(recipe=self.partial).delete()
+        other.update([self.partial.pk])
+        RecipeIngredient.objects.filter(recipe=self.old).delete()
+        # Версия второго обновления на две больше версии этого индекса.
+        self.index.update([self.old.pk])
+        entries = self.index._entries
+        self.assertEqual(self.search(), [(self.new.pk, 0)])
+        self.assertIsNot(self.index._entries, entries)
+        self.assertEqual(
+            other.search({self.ingredients[0].pk}, 1), [(self.new.pk, 0)]
+        )
@@ -0,0 +1,70 @@
+import io
+import json
+import os
+import tempfile
+from datetime import datetime, timezone
+
+from django.core.management import call_command
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+
+from recipes.models import Recipe
+from .base import APITestCase
+
+PUB_DATE = datetime(2020, 5, 17, 12, 30, tzinfo=timezone.utc)
+
+
+class LoadRecipesTest(APITestCase):
+
+    def load(self, recipes):
+        file = tempfile.NamedTemporaryFile(
+            'w', suffix='.ndjson', encoding='utf-8', delete=False
+        )
+        self.addCleanup(os.remove, file.name)
+        with file:
+            for recipe in recipes:
+                file.write(json.dumps(recipe, ensure_ascii=False) + '\n')
+        call_command('load_recipes', file.name, stdout=io.StringIO())
+
+    def recipe(self, name, pub_date=None):
+        return {
+            'name': name, 'text': 'Описание', 'cooking_time': 5,
+            'image': 'recipes/test.png', 'author': self.author.username,
+            'pub_date': pub_date,
+            'tags': [self.tags[0].slug],
+            'ingredients': [{
+                'name': self.ingredients[0].name,
+                'measurement_unit': self.ingredients[0].measurement_unit,
+                'amount': 3,
+            }],
+        }
+
+    def test_pub_date_kept(self):
+        with CaptureQueriesContext(connection) as queries:
+            self.load([
+                self.recipe('Старый', PUB_DATE.isoformat()),
+                self.recipe('Без даты'),
+            ])
+        # Дата записывается в INSERT, рецепты не перезаписываются.
+        self.assertFalse([
+            query for query in queries
+            if query['sql'].startswith('UPDATE "recipes_recipe"')
+        ])
+        self.assertEqual(Recipe.objects.get(name='Старый').pub_date, PUB_DATE)
+        self.assertGreater(
+            Recipe.objects.get(name='Без даты').pub_date, PUB_DATE
+        )
+        self.assertTrue(Recipe._meta.get_field('pub_date').auto_now_add)
+        # Рецепты, созданные после загрузки, получают текущую дату.
+        self.assertGreater(self.create_recipe().pub_date, PUB_DATE)
+        self.author.refresh_from_db()
+        self.assertEqual(self.author.recipes_count, 3)
+
+    def test_repeated_tag(self):
+        recipe = self.recipe('С повтором')
+        recipe['tags'] = [self.tags[0].slug, self.tags[0].slug]
+        self.load([recipe])
+        self.assertEqual(
+            list(Recipe.objects.get(name='С повтором').tags.all()),
+            [self.tags[0]]
+        )
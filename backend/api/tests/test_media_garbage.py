@@ -0,0 +1,105 @@
+import io
+import os
+import time
+from unittest import mock
+
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.core.management import call_command
+
+from recipes.management.commands.collect_media_garbage import (
+    QUARANTINE_SUFFIX, Command)
+from recipes.models import Recipe
+from .base import APITestCase
+
+DAY = 24 * 60 * 60
+
+
+class MediaGarbageTest(APITestCase):
+
+    def save(self, content):
+        """Сохраняет файл и делает его старше порога сборки мусора."""
+        name = default_storage.save('recipes/image.png', ContentFile(content))
+        old = time.time() - DAY
+        os.utime(default_storage.path(name), (old, old))
+        return name
+
+    def collect(self):
+        call_command('collect_media_garbage', stdout=io.StringIO())
+
+    def test_same_content_saved_once(self):
+        name = self.save(b'content')
+        self.assertEqual(
+            default_storage.save('recipes/other.png', ContentFile(b'content')),
+            name
+        )
+        # Повторная загрузка защищает файл от удаления до сохранения
+        # объекта.
+        self.collect()
+        self.assertTrue(default_storage.exists(name))
+
+    def test_unreferenced_removed(self):
+        kept = self.save(b'kept')
+        removed = self.save(b'removed')
+        Recipe.objects.filter(pk=self.create_recipe().pk).update(image=kept)
+        self.collect()
+        self.assertTrue(default_storage.exists(kept))
+        self.assertFalse(default_storage.exists(removed))
+
+    def test_referenced_after_listing_kept(self):
+        image = self.save(b'image')
+        variant = self.save(b'variant')
+        Recipe.objects.filter(pk=self.create_recipe().pk).update(
+            image=image,
+            image_variants={'source': image, 'webp': {'320': variant}}
+        )
+        # Ссылки появились после того, как команда собрала их список.
+        with mock.patch.object(Command, 'get_referenced', return_value=set()):
+            self.collect()
+        self.assertTrue(default_storage.exists(image))
+        self.assertTrue(default_storage.exists(variant))
+
+    def rename_then(self, action):
+        """os.rename команды, после которого выполняется action."""
+        rename = os.rename
+
+        def wrapper(source, target):
+            rename(source, target)
+            action()
+        return mock.patch(
+            'recipes.management.commands.collect_media_garbage.os.rename',
+            side_effect=wrapper
+        )
+
+    def test_referenced_during_removal_kept(self):
+        image = self.save(b'image')
+        recipe = self.create_recipe()
+
+        def attach():
+            Recipe.objects.filter(pk=recipe.pk).update(image=image)
+        # Объект сохранен между проверкой ссылок и удалением.
+        with self.rename_then(attach):
+            self.collect()
+        self.assertTrue(default_storage.exists(image))
+        self.assertFalse(default_storage.exists(image + QUARANTINE_SUFFIX))
+
+    def test_uploaded_during_removal_kept(self):
+        image = self.save(b'image')
+
+        def upload():
+            default_storage.save('recipes/again.png', ContentFile(b'image'))
+        with self.rename_then(upload):
+            self.collect()
+        self.assertTrue(default_storage.exists(image))
+        self.assertFalse(default_storage.exists(image + QUARANTINE_SUFFIX))
+
+    def test_interrupted_run_restored(self):
+        image = self.save(b'image')
+        Recipe.objects.filter(pk=self.create_recipe().pk).update(image=image)
+        os.rename(
+            default_storage.path(image),
+            default_storage.path(image + QUARANTINE_SUFFIX)
+        )
+        self.collect()
+        self.assertTrue(default_storage.exists(image))
+        self.assertFalse(default_storage.exists(image + QUARANTINE_SUFFIX))
@@ -0,0 +1,104 @@
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+from django.db import connection
+from django.test import SimpleTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+
+from api.metrics import STALE_FLUSHES, MetricsRegistry, metrics
+from recipes.models import ShoppingCart
+from .base import APITestCase
+
+LABELS = (('endpoint', 'recipes-list'), ('status', '200'))
+
+
+def finished_pid():
+    process = subprocess.Popen([sys.executable, '-c', ''])
+    process.wait()
+    return process.pid
+
+
+class MetricsFilesTest(SimpleTestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory, ignore_errors=True)
+        override = override_settings(
+            METRICS_DIR=self.directory, METRICS_FLUSH_INTERVAL=5
+        )
+        override.enable()
+        self.addCleanup(override.disable)
+
+    def write_snapshot(self, file_name, count, age=0):
+        path = os.path.join(self.directory, file_name)
+        with open(path, 'w', encoding='utf-8') as file:
+            json.dump({'http_responses_total': [
+                [[list(label) for label in LABELS], count]
+            ]}, file)
+        modified = time.time() - age
+        os.utime(path, (modified, modified))
+        return path
+
+    def test_one_file_per_process(self):
+        registry = MetricsRegistry()
+        registry.increment('http_responses_total', LABELS)
+        registry.flush()
+        registry.flush()
+        self.assertEqual(os.listdir(self.directory), [f'{os.getpid()}.json'])
+        self.assertEqual(
+            registry.collect()['http_responses_total'], {LABELS: 1}
+        )
+
+    def test_stale_snapshots_of_finished_processes_removed(self):
+        stale_age = STALE_FLUSHES * 5 + 60
+        dead = finished_pid()
+        removed = self.write_snapshot(f'{dead}.json', 10, stale_age)
+        old_format = self.write_snapshot(f'{dead}-abc.json', 10, stale_age)
+        recent = self.write_snapshot(f'{finished_pid()}.json', 100)
+        idle = self.write_snapshot(f'{os.getppid()}.json', 1000, stale_age)
+        registry = MetricsRegistry()
+        registry.increment('http_responses_total', LABELS)
+        self.assertEqual(
+            registry.collect()['http_responses_total'], {LABELS: 1101}
+        )
+        self.assertFalse(os.path.exists(removed))
+        self.assertFalse(os.path.exists(old_format))
+        self.assertTrue(os.path.exists(recent))
+        self.assertTrue(os.path.exists(idle))
+
+
+class StreamingMetricsTest(APITestCase):
+    LABELS = (('endpoint', 'recipes-download-shopping-cart'),
+              ('method', 'GET'))
+
+    def series(self, name):
+        return list(metrics._values[name].get(self.LABELS, [0, 0]))
+
+    def test_queries_while_streaming_counted(self):
+        ShoppingCart.objects.create(
+            user=self.reader, recipe=self.create_recipe()
+        )
+        queries_before = self.series('db_queries_per_request')
+        sizes_before = self.series('http_response_size_bytes')
+        response = self.client_reader.get(
+            '/api/recipes/download_shopping_cart/'
+        )
+        self.assertTrue(response.streaming)
+        self.assertEqual(
+            self.series('db_queries_per_request'), queries_before
+        )
+        with CaptureQueriesContext(connection) as streamed:
+            content = b''.join(response.streaming_content)
+        self.assertTrue(streamed)
+        queries = self.series('db_queries_per_request')
+        self.assertEqual(queries[-1], queries_before[-1] + 1)
+        self.assertGreaterEqual(
+            queries[-2] - queries_before[-2], len(streamed)
+        )
+        sizes = self.series('http_response_size_bytes')
+        self.assertEqual(sizes[-2] - sizes_before[-2], len(content))
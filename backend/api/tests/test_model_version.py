@@ -0,0 +1,53 @@
+import threading
+from unittest import skipIf
+
+from django.db import connection
+from django.test import TransactionTestCase
+
+from api.recipes.cache import bump_model_version, get_model_version
+from recipes.models import Tag
+from .base import APITestCase
+
+
+class ModelVersionTest(APITestCase):
+
+    def test_bump(self):
+        version, changed_at = get_model_version(Tag)
+        self.assertEqual(get_model_version(Tag), (version, changed_at))
+        self.assertEqual(bump_model_version(Tag), version + 1)
+        new_version, new_changed_at = get_model_version(Tag)
+        self.assertEqual(new_version, version + 1)
+        self.assertGreaterEqual(new_changed_at, changed_at)
+
+    def test_tag_change_bumps_version(self):
+        version = get_model_version(Tag)[0]
+        Tag.objects.create(name='Новый', slug='new')
+        self.assertEqual(get_model_version(Tag)[0], version + 1)
+
+
+# Общая in-memory база SQLite не ждет снятия блокировки, а сразу
+# отвечает «database table is locked».
+@skipIf(connection.vendor == 'sqlite', 'нужна база с блокировками строк')
+class ConcurrentModelVersionTest(TransactionTestCase):
+    """Одновременные увеличения версии из разных соединений с базой."""
+
+    def test_concurrent_bumps_are_not_lost(self):
+        versions, errors = [], []
+
+        def bump():
+            try:
+                for _ in range(50):
+                    versions.append(bump_model_version(Tag))
+            except Exception as error:
+                errors.append(error)
+            finally:
+                connection.close()
+
+        threads = [threading.Thread(target=bump) for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(errors, [])
+        self.assertEqual(sorted(versions), list(range(1, 401)))
+        self.assertEqual(get_model_version(Tag)[0], 400)
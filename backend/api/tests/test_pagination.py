@@ -0,0 +1,52 @@
+import base64
+import json
+
+from .base import APITestCase
+
+
+def make_cursor(value):
+    return base64.urlsafe_b64encode(json.dumps(value).encode()).decode()
+
+
+class CursorPaginationTest(APITestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.recipes = [
+            self.create_recipe(f'Рецепт {i}') for i in range(8)
+        ]
+
+    def test_cursor_pages(self):
+        response = self.anonymous.get('/api/recipes/?cursor=')
+        self.assertEqual(response.status_code, 200)
+        first = [item['id'] for item in response.data['results']]
+        self.assertEqual(len(first), 6)
+        response = self.anonymous.get(response.data['next'])
+        second = [item['id'] for item in response.data['results']]
+        self.assertEqual(
+            sorted(first + second),
+            sorted(recipe.pk for recipe in self.recipes)
+        )
+        self.assertIsNone(response.data['next'])
+        response = self.anonymous.get(response.data['previous'])
+        self.assertEqual(
+            [item['id'] for item in response.data['results']], first
+        )
+
+    def test_invalid_cursor(self):
+        for cursor in (
+            'not base64!',
+            base64.urlsafe_b64encode(b'not json').decode(),
+            make_cursor([['x', 'y'], False]),
+            make_cursor([[None, None], False]),
+            make_cursor([['2024-01-01T00:00:00'], False]),
+            make_cursor([5, False]),
+            make_cursor({'a': 1}),
+            make_cursor([]),
+            make_cursor('cursor'),
+        ):
+            with self.subTest(cursor=cursor):
+                response = self.anonymous.get(
+                    '/api/recipes/', {'cursor': cursor}
+                )
+                self.assertEqual(response.status_code, 404)
@@ -0,0 +1,52 @@
+from unittest import mock
+
+from django.db import connection
+from django.test import override_settings
+
+from api.profiling import RequestProfile
+from .base import APITestCase
+
+TOKEN = 'secret'
+
+
+@override_settings(PROFILE_TOKEN=TOKEN, PROFILE_SAMPLE_RATE=0,
+                   PROFILE_DUMP_DIR='')
+class ProfilingTest(APITestCase):
+    """Заголовок Server-Timing для профилируемых запросов."""
+
+    def setUp(self):
+        super().setUp()
+        self.create_recipe()
+
+    def get(self, **headers):
+        response = self.anonymous.get('/api/recipes/', headers=headers)
+        self.assertEqual(response.status_code, 200)
+        return response
+
+    def test_server_timing(self):
+        response = self.get(x_profile=TOKEN)
+        metrics = {
+            metric.split(';')[0]: metric
+            for metric in response['Server-Timing'].split(', ')
+        }
+        for name in ('auth', 'permissions', 'throttle', 'view',
+                     'serialize', 'render', 'db', 'total'):
+            self.assertIn(name, metrics)
+        self.assertIn('SQL queries:', metrics['db'])
+
+    def test_disabled(self):
+        with mock.patch.object(
+            connection, 'execute_wrapper', wraps=connection.execute_wrapper
+        ) as execute_wrapper:
+            for headers in ({}, {'x_profile': 'wrong'}):
+                with self.subTest(headers=headers):
+                    response = self.get(**headers)
+                    self.assertNotIn('Server-Timing', response)
+                    self.assertFalse(
+                        hasattr(response.wsgi_request, 'profile')
+                    )
+        # Обертки других middleware остаются, обертки профиля нет.
+        self.assertFalse([
+            call for call in execute_wrapper.call_args_list
+            if isinstance(call.args[0], RequestProfile)
+        ])
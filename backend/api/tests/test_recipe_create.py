@@ -0,0 +1,78 @@
+from unittest import mock
+
+from django.test import override_settings
+from rest_framework.parsers import JSONParser
+
+from recipes.models import Recipe
+from .base import APITestCase, make_image
+
+
+class RecipeCreateTest(APITestCase):
+    """Создание рецептов по одному и списком."""
+
+    def payload(self, name='Рецепт', tags=None, ingredients=None):
+        return {
+            'name': name, 'text': 'Описание', 'cooking_time': 10,
+            'image': make_image(),
+            'tags': tags or [self.tags[0].pk],
+            'ingredients': ingredients or [
+                {'id': self.ingredients[0].pk, 'amount': 1}
+            ],
+        }
+
+    def post(self, data, bulk=False):
+        url = '/api/recipes/bulk/' if bulk else '/api/recipes/'
+        return self.client_author.post(url, data, format='json')
+
+    def test_string_ids_accepted(self):
+        payload = self.payload(
+            tags=[str(self.tags[0].pk)],
+            ingredients=[{'id': str(self.ingredients[2].pk), 'amount': '3'}]
+        )
+        for bulk, data in ((False, payload), (True, [payload, payload])):
+            with self.subTest(bulk=bulk):
+                response = self.post(data, bulk)
+                self.assertEqual(response.status_code, 201, response.data)
+                items = response.data if bulk else [response.data]
+                for item in items:
+                    self.assertEqual(
+                        [tag['id'] for tag in item['tags']],
+                        [self.tags[0].pk]
+                    )
+                    self.assertEqual(
+                        [(ingredient['id'], ingredient['amount'])
+                         for ingredient in item['ingredients']],
+                        [(self.ingredients[2].pk, 3)]
+                    )
+
+    def test_invalid_ids_rejected(self):
+        for name, payload in (
+            ('bad tag', self.payload(tags=['abc'])),
+            ('missing tag', self.payload(tags=[10 ** 6])),
+            ('bad ingredient', self.payload(
+                ingredients=[{'id': 'abc', 'amount': 1}]
+            )),
+            ('missing ingredient', self.payload(
+                ingredients=[{'id': str(10 ** 6), 'amount': 1}]
+            )),
+            ('no amount', self.payload(
+                ingredients=[{'id': self.ingredients[0].pk}]
+            )),
+            ('zero amount', self.payload(
+                ingredients=[{'id': self.ingredients[0].pk, 'amount': 0}]
+            )),
+        ):
+            for bulk, data in ((False, payload), (True, [payload])):
+                with self.subTest(name, bulk=bulk):
+                    response = self.post(data, bulk)
+                    self.assertEqual(response.status_code, 400)
+        self.assertFalse(Recipe.objects.exists())
+
+    @override_settings(RECIPE_BULK_MAX_BODY_SIZE=100)
+    def test_bulk_body_too_large(self):
+        with mock.patch.object(JSONParser, 'parse') as parse:
+            response = self.post([self.payload()] * 3, bulk=True)
+        self.assertEqual(response.status_code, 413)
+        # Тело отклонено до разбора JSON.
+        parse.assert_not_called()
+        self.assertFalse(Recipe.objects.exists())
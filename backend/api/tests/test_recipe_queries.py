@@ -0,0 +1,81 @@
+from django.core.cache import caches
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+
+from .base import APITestCase
+
+
+class RecipeQueriesTest(APITestCase):
+    """Число запросов к базе на чтение рецептов не зависит от размера
+    страницы."""
+
+    def setUp(self):
+        super().setUp()
+        self.recipes = [
+            self.create_recipe(f'Рецепт {i}') for i in range(6)
+        ]
+        self.reader.favorites.create(recipe=self.recipes[0])
+        self.reader.shopping_cart.create(recipe=self.recipes[1])
+        self.reader.subscriptions.create(author=self.author)
+
+    def count_queries(self, client, url):
+        with CaptureQueriesContext(connection) as queries:
+            response = client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return len(queries), response
+
+    def test_list_anonymous(self):
+        # Страница, счетчик, версии справочников (поколение кэша
+        # представлений) и подгрузка тегов и ингредиентов.
+        with self.assertNumQueries(5):
+            response = self.anonymous.get('/api/recipes/')
+        self.assertEqual(len(response.data['results']), 6)
+        self.assertFalse(response.data['results'][0]['is_favorited'])
+
+    def test_list_authenticated(self):
+        with self.assertNumQueries(5):
+            response = self.client_reader.get('/api/recipes/')
+        results = {item['id']: item for item in response.data['results']}
+        self.assertTrue(results[self.recipes[0].pk]['is_favorited'])
+        self.assertTrue(results[self.recipes[1].pk]['is_in_shopping_cart'])
+        self.assertTrue(
+            results[self.recipes[0].pk]['author']['is_subscribed']
+        )
+
+    def test_detail_anonymous(self):
+        # Условный запрос (ETag и версии справочников), рецепт, теги и
+        # ингредиенты.
+        with self.assertNumQueries(5):
+            response = self.anonymous.get(
+                f'/api/recipes/{self.recipes[0].pk}/'
+            )
+        self.assertEqual(len(response.data['ingredients']), 2)
+
+    def test_detail_authenticated(self):
+        with self.assertNumQueries(5):
+            response = self.client_reader.get(
+                f'/api/recipes/{self.recipes[0].pk}/'
+            )
+        self.assertTrue(response.data['is_favorited'])
+        self.assertTrue(response.data['author']['is_subscribed'])
+
+    def test_list_queries_do_not_depend_on_page_size(self):
+        full, response = self.count_queries(
+            self.client_reader, '/api/recipes/'
+        )
+        self.assertEqual(len(response.data['results']), 6)
+        for recipe in self.recipes[1:]:
+            recipe.delete()
+        for cache in caches.all():
+            cache.clear()
+        single, response = self.count_queries(
+            self.client_reader, '/api/recipes/'
+        )
+        self.assertEqual(len(response.data['results']), 1)
+        self.assertEqual(single, full)
+
+    def test_cached_list_skips_prefetch(self):
+        self.count_queries(self.anonymous, '/api/recipes/')
+        # Теги и ингредиенты берутся из кэша представлений.
+        with self.assertNumQueries(3):
+            self.anonymous.get('/api/recipes/')
@@ -0,0 +1,103 @@
+import re
+
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+
+from recipes.models import RecipeIngredient, ShoppingListItem
+from .base import APITestCase
+
+WRITE = re.compile(
+    r'^(INSERT(?: OR IGNORE)? INTO|UPDATE|DELETE FROM) "(\w+)"',
+    re.IGNORECASE
+)
+
+
+class RecipeUpdateWritesTest(APITestCase):
+    """Изменение рецепта записывает только отличающиеся связи."""
+
+    def setUp(self):
+        super().setUp()
+        self.recipe = self.create_recipe(
+            tags=self.tags[:2],
+            ingredients=[(self.ingredients[0], 100),
+                         (self.ingredients[1], 2)]
+        )
+        self.reader.shopping_cart.create(recipe=self.recipe)
+
+    def payload(self, tags=(0, 1), ingredients=((0, 100), (1, 2))):
+        return {
+            'name': self.recipe.name,
+            'text': self.recipe.text,
+            'cooking_time': self.recipe.cooking_time,
+            'tags': [self.tags[i].pk for i in tags],
+            'ingredients': [
+                {'id': self.ingredients[i].pk, 'amount': amount}
+                for i, amount in ingredients
+            ],
+        }
+
+    def update(self, payload):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client_author.patch(
+                f'/api/recipes/{self.recipe.pk}/', payload, format='json'
+            )
+        self.assertEqual(response.status_code, 200, response.data)
+        writes = []
+        for query in queries:
+            match = WRITE.match(query['sql'])
+            if match:
+                writes.append((match[1].split()[0].upper(), match[2]))
+        return writes
+
+    def test_no_change_saves_only_recipe(self):
+        self.assertEqual(
+            self.update(self.payload()),
+            [('UPDATE', 'recipes_recipe')]
+        )
+
+    def test_tag_change(self):
+        writes = self.update(self.payload(tags=(1, 2)))
+        self.assertEqual(writes, [
+            ('DELETE', 'recipes_recipetag'),
+            ('INSERT', 'recipes_recipetag'),
+            ('UPDATE', 'recipes_recipe'),
+        ])
+        self.recipe.refresh_from_db()
+        self.assertEqual(
+            set(self.recipe.tags.all()), set(self.tags[1:])
+        )
+        self.assertEqual(
+            self.recipe.tag_mask,
+            sum(1 << tag.bit for tag in self.tags[1:])
+        )
+
+    def test_amount_change(self):
+        writes = self.update(self.payload(ingredients=((0, 150), (1, 2))))
+        self.assertEqual(writes, [
+            ('UPDATE', 'recipes_recipeingredient'),
+            ('INSERT', 'recipes_shoppinglistitem'),
+            ('UPDATE', 'recipes_shoppinglistitem'),
+            ('DELETE', 'recipes_shoppinglistitem'),
+            ('UPDATE', 'recipes_recipe'),
+        ])
+        self.assertEqual(
+            RecipeIngredient.objects.get(
+                recipe=self.recipe, ingredient=self.ingredients[0]
+            ).amount,
+            150
+        )
+        self.assertEqual(
+            ShoppingListItem.objects.get(
+                user=self.reader, ingredient=self.ingredients[0]
+            ).amount,
+            150
+        )
+
+    def test_ingredient_replaced(self):
+        self.update(self.payload(ingredients=((0, 100), (2, 5))))
+        self.assertEqual(
+            dict(ShoppingListItem.objects.filter(
+                user=self.reader
+            ).values_list('ingredient', 'amount')),
+            {self.ingredients[0].pk: 100, self.ingredients[2].pk: 5}
+        )
@@ -0,0 +1,95 @@
+from unittest import skipUnless
+
+from django.db import connection
+
+from recipes.models import Recipe
+from recipes.search import FTS_TABLE, TABLE, search_recipes
+from .base import APITestCase
+
+
+class RecipeSearchTest(APITestCase):
+    """Поиск ?search= по названию и описанию рецепта."""
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        cls.in_name = cls.create_recipe('Борщ')
+        cls.in_text = cls.create_recipe('Суп', tags=[cls.tags[2]])
+        Recipe.objects.filter(pk=cls.in_text.pk).update(
+            text='Похож на борщ'
+        )
+        cls.other = cls.create_recipe('Каша')
+
+    def search(self, **params):
+        response = self.client_reader.get('/api/recipes/', params)
+        self.assertEqual(response.status_code, 200)
+        return [item['id'] for item in response.data['results']]
+
+    def test_name_ranked_above_text(self):
+        # Рецепт с совпадением только в описании опубликован позже.
+        self.assertEqual(
+            self.search(search='борщ'), [self.in_name.pk, self.in_text.pk]
+        )
+
+    def test_all_words_required(self):
+        self.assertEqual(
+            self.search(search='похож борщ'), [self.in_text.pk]
+        )
+
+    def test_with_filters(self):
+        self.assertEqual(
+            self.search(search='борщ', tags=self.tags[2].slug),
+            [self.in_text.pk]
+        )
+        self.reader.favorites.create(recipe=self.in_name)
+        self.assertEqual(
+            self.search(search='борщ', is_favorited=1), [self.in_name.pk]
+        )
+
+    def test_index_follows_update_and_delete(self):
+        Recipe.objects.filter(pk=self.in_name.pk).update(
+            name='Солянка', text='Солянка'
+        )
+        self.assertEqual(self.search(search='борщ'), [self.in_text.pk])
+        self.assertEqual(self.search(search='солянка'), [self.in_name.pk])
+        self.in_text.delete()
+        self.assertEqual(self.search(search='борщ'), [])
+
+    @skipUnless(connection.vendor == 'sqlite', 'индекс FTS5 есть в SQLite')
+    def test_fts_triggers(self):
+        def indexed(word):
+            with connection.cursor() as cursor:
+                cursor.execute(
+                    f'SELECT rowid FROM {FTS_TABLE} '
+                    f'WHERE {FTS_TABLE} MATCH %s', [f'"{word}"*']
+                )
+                return {pk for pk, in cursor.fetchall()}
+
+        self.assertEqual(indexed('похож'), {self.in_text.pk})
+        Recipe.objects.filter(pk=self.in_text.pk).update(text='Другой')
+        self.assertEqual(indexed('похож'), set())
+        self.assertEqual(indexed('другой'), {self.in_text.pk})
+        self.in_text.delete()
+        self.assertEqual(indexed('другой'), set())
+
+    @skipUnless(connection.vendor == 'postgresql',
+                'столбец tsvector есть в PostgreSQL')
+    def test_search_vector_trigger(self):
+        def vector(recipe):
+            with connection.cursor() as cursor:
+                cursor.execute(
+                    f'SELECT search_vector::text FROM {TABLE} '
+                    f'WHERE id = %s', [recipe.pk]
+                )
+                return cursor.fetchone()[0]
+
+        created = Recipe.objects.bulk_create([Recipe(
+            author=self.author, name='Плов', text='Рис',
+            cooking_time=10, image='recipes/test.png'
+        )])[0]
+        self.assertIn('плов', vector(created))
+        Recipe.objects.filter(pk=created.pk).update(name='Гуляш')
+        self.assertNotIn('плов', vector(created))
+        self.assertEqual(
+            list(search_recipes(Recipe.objects.all(), 'гуляш')), [created]
+        )
@@ -0,0 +1,143 @@
+import csv
+import io
+import json
+from collections import Counter
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+
+from recipes.models import ShoppingCart
+from .base import APITestCase
+
+URL = '/api/recipes/download_shopping_cart/'
+RECIPES_COUNT = 300
+
+
+class ShoppingListDownloadTest(APITestCase):
+    """Выгрузка списка покупок для корзины из сотен рецептов."""
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        cls.expected = Counter()
+        cls.recipes = []
+        for i in range(RECIPES_COUNT):
+            first = cls.ingredients[i % 6]
+            second = cls.ingredients[(i + 1) % 6]
+            recipe = cls.create_recipe(
+                f'Рецепт {i}', ingredients=[(first, i + 1), (second, 1)]
+            )
+            cls.recipes.append(recipe)
+            ShoppingCart.objects.create(user=cls.reader, recipe=recipe)
+            cls.expected[first.name] += i + 1
+            cls.expected[second.name] += 1
+
+    def download(self, file_format):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client_reader.get(URL, {'format': file_format})
+            self.assertEqual(response.status_code, 200)
+            content = b''.join(
+                response.streaming_content if response.streaming
+                else [response.content]
+            ).decode()
+        return content, len(queries)
+
+    def parse(self, file_format, content):
+        """Список покупок в виде {название: количество}."""
+        if file_format == 'txt':
+            lines = content.split('\n')
+            self.assertEqual(lines[0], 'Список покупок.')
+            return {
+                name: int(amount)
+                for name, amount in (
+                    line.replace('(г)', '').split(':') for line in lines[1:]
+                )
+            }
+        if file_format == 'csv':
+            rows = list(csv.DictReader(io.StringIO(content)))
+            self.assertTrue(all(
+                row['measurement_unit'] == 'г' for row in rows
+            ))
+            return {row['name']: int(row['amount']) for row in rows}
+        return {item['name']: item['amount'] for item in json.loads(content)}
+
+    def test_formats(self):
+        for file_format in ('txt', 'csv', 'json'):
+            with self.subTest(file_format):
+                content, _ = self.download(file_format)
+                self.assertEqual(
+                    self.parse(file_format, content), self.expected
+                )
+
+    def test_queries_do_not_depend_on_cart_size(self):
+        # Версия корзины, версия ингредиентов и сам список.
+        _, queries = self.download('json')
+        self.assertEqual(queries, 3)
+        # Из кэша: только версии.
+        cached, queries = self.download('json')
+        self.assertEqual(queries, 2)
+        self.assertEqual(self.parse('json', cached), self.expected)
+
+    def test_separate_cache(self):
+        self.download('json')
+        caches[settings.SHOPPING_LIST_CACHE_ALIAS].clear()
+        # Файл хранится только в своем кэше и собирается заново.
+        content, queries = self.download('json')
+        self.assertEqual(queries, 3)
+        self.assertEqual(self.parse('json', content), self.expected)
+
+    def test_cart_change_invalidates(self):
+        first = self.ingredients[0].name
+        self.download('txt')
+        self.client_reader.delete(
+            f'/api/recipes/{self.recipes[0].pk}/shopping_cart/'
+        )
+        content, _ = self.download('txt')
+        self.assertEqual(
+            self.parse('txt', content)[first], self.expected[first] - 1
+        )
+        self.client_reader.post(
+            f'/api/recipes/{self.recipes[0].pk}/shopping_cart/'
+        )
+        content, _ = self.download('txt')
+        self.assertEqual(self.parse('txt', content), self.expected)
+
+    def test_recipe_change_invalidates(self):
+        recipe = self.recipes[0]
+        first, second = self.ingredients[0], self.ingredients[1]
+        self.download('csv')
+        response = self.client_author.patch(
+            f'/api/recipes/{recipe.pk}/',
+            {
+                'name': recipe.name, 'text': recipe.text,
+                'cooking_time': recipe.cooking_time,
+                'tags': [tag.pk for tag in self.tags[:2]],
+                'ingredients': [{'id': first.pk, 'amount': 1001},
+                                {'id': second.pk, 'amount': 1}],
+            },
+            format='json'
+        )
+        self.assertEqual(response.status_code, 200, response.data)
+        content, _ = self.download('csv')
+        self.assertEqual(
+            self.parse('csv', content)[first.name],
+            self.expected[first.name] + 1000
+        )
+
+    def test_ingredient_rename_invalidates(self):
+        ingredient = self.ingredients[0]
+        self.download('json')
+        ingredient.name = 'Переименованный'
+        ingredient.save()
+        content, _ = self.download('json')
+        parsed = self.parse('json', content)
+        self.assertNotIn('Ингредиент 0', parsed)
+        self.assertEqual(
+            parsed['Переименованный'], self.expected['Ингредиент 0']
+        )
+
+    def test_empty_cart(self):
+        response = self.client_author.get(URL, {'format': 'txt'})
+        self.assertEqual(response.status_code, 400)
@@ -0,0 +1,74 @@
+from recipes.models import RecipeIngredient, ShoppingListItem
+from .base import APITestCase
+
+
+class ShoppingListItemsTest(APITestCase):
+    """Суммы списка покупок следуют за изменением строк состава."""
+
+    def setUp(self):
+        super().setUp()
+        self.recipe = self.create_recipe()
+        self.other = self.create_recipe(
+            ingredients=[(self.ingredients[0], 10)]
+        )
+        for recipe in (self.recipe, self.other):
+            self.reader.shopping_cart.create(recipe=recipe)
+
+    def shopping_list(self, user=None):
+        return {
+            self.ingredients.index(item.ingredient): item.amount
+            for item in ShoppingListItem.objects.filter(
+                user=user or self.reader
+            ).select_related('ingredient')
+        }
+
+    def row(self, ingredient):
+        return RecipeIngredient.objects.get(
+            recipe=self.recipe, ingredient=ingredient
+        )
+
+    def test_cart(self):
+        self.assertEqual(self.shopping_list(), {0: 110, 1: 2})
+        self.reader.shopping_cart.filter(recipe=self.recipe).delete()
+        self.assertEqual(self.shopping_list(), {0: 10})
+
+    def test_amount_changed(self):
+        row = self.row(self.ingredients[0])
+        row.amount = 50
+        row.save()
+        self.assertEqual(self.shopping_list(), {0: 60, 1: 2})
+        self.assertEqual(self.shopping_list(self.author), {})
+
+    def test_ingredient_changed(self):
+        row = self.row(self.ingredients[1])
+        row.ingredient = self.ingredients[2]
+        row.save()
+        self.assertEqual(self.shopping_list(), {0: 110, 2: 2})
+
+    def test_row_added(self):
+        RecipeIngredient.objects.create(
+            recipe=self.recipe, ingredient=self.ingredients[3], amount=7
+        )
+        self.assertEqual(self.shopping_list(), {0: 110, 1: 2, 3: 7})
+
+    def test_rows_deleted(self):
+        self.row(self.ingredients[1]).delete()
+        self.assertEqual(self.shopping_list(), {0: 110})
+        RecipeIngredient.objects.filter(recipe=self.recipe).delete()
+        self.assertEqual(self.shopping_list(), {0: 10})
+
+    def test_recipe_deleted(self):
+        # Каскадное удаление строк не вычитает их второй раз.
+        self.recipe.delete()
+        self.assertEqual(self.shopping_list(), {0: 10})
+
+    def test_existing_row_not_duplicated(self):
+        # Строка, которую успела вставить другая транзакция.
+        ShoppingListItem.objects.create(
+            user=self.author, ingredient=self.ingredients[4], amount=1
+        )
+        ShoppingListItem.objects.add_amounts(
+            [self.author.pk, self.reader.pk], {self.ingredients[4].pk: 3}
+        )
+        self.assertEqual(self.shopping_list(self.author), {4: 4})
+        self.assertEqual(self.shopping_list()[4], 3)
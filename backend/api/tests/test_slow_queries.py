@@ -0,0 +1,104 @@
+import io
+import json
+import os
+import tempfile
+from unittest import mock
+
+from django.core.management import call_command
+from django.db import connection
+from django.test import override_settings
+
+from api.slow_queries import SlowQueryLogger, fingerprint, is_read_only
+from .base import APITestCase
+
+
+class FingerprintTest(APITestCase):
+
+    def test_in_lists_of_any_length(self):
+        first = fingerprint('SELECT * FROM t WHERE id IN (1, 2, 3)')
+        second = fingerprint('SELECT * FROM t WHERE id IN (%s)')
+        self.assertEqual(first, second)
+        self.assertEqual(first[1], 'SELECT * FROM t WHERE id IN (?+)')
+
+    def test_multi_row_values(self):
+        single = fingerprint("INSERT INTO t (a, b) VALUES (1, 'x')")
+        many = fingerprint(
+            "INSERT INTO t (a, b) VALUES (1, 'x'), (2, 'it''s'),\n(3, 'z')"
+        )
+        self.assertEqual(single, many)
+        self.assertEqual(many[1], 'INSERT INTO t (a, b) VALUES (?+)')
+
+    def test_different_queries(self):
+        self.assertNotEqual(
+            fingerprint('SELECT a FROM t WHERE id = 1')[0],
+            fingerprint('SELECT b FROM t WHERE id = 1')[0]
+        )
+
+
+class ExplainTest(APITestCase):
+
+    def test_is_read_only(self):
+        for sql, expected in (
+            ('SELECT * FROM t', True),
+            ('  with x AS (SELECT 1) SELECT * FROM x', True),
+            ('SELECT * FROM t FOR UPDATE', False),
+            ('WITH x AS (DELETE FROM t RETURNING id) SELECT * FROM x', False),
+            ('UPDATE t SET a = 1', False),
+        ):
+            with self.subTest(sql=sql):
+                self.assertIs(is_read_only(sql), expected)
+
+    def explain(self, sql):
+        fake = mock.MagicMock(alias=connection.alias, vendor='postgresql')
+        cursor = fake.cursor.return_value.__enter__.return_value
+        cursor.fetchall.return_value = [[{'Plan': {}}]]
+        result = SlowQueryLogger(fake).explain(sql, [])
+        return result['analyze'], cursor.execute.call_args.args[0]
+
+    @override_settings(SLOW_QUERY_EXPLAIN='analyze')
+    def test_analyze_only_read_only(self):
+        analyze, sql = self.explain('SELECT * FROM t')
+        self.assertTrue(analyze)
+        self.assertTrue(sql.startswith('EXPLAIN (ANALYZE'))
+        analyze, sql = self.explain('UPDATE t SET a = 1')
+        self.assertFalse(analyze)
+        self.assertTrue(sql.startswith('EXPLAIN (FORMAT JSON) UPDATE'))
+
+    @override_settings(SLOW_QUERY_EXPLAIN='plan')
+    def test_plan_without_analyze(self):
+        analyze, sql = self.explain('SELECT * FROM t')
+        self.assertFalse(analyze)
+        self.assertTrue(sql.startswith('EXPLAIN (FORMAT JSON) SELECT'))
+
+
+class SlowQueriesCommandTest(APITestCase):
+
+    def setUp(self):
+        super().setUp()
+        directory = tempfile.mkdtemp(dir=self.media_root)
+        self.path = os.path.join(directory, 'slow.jsonl')
+        # often: много быстрых, rare: один самый долгий.
+        entries = [('often', 10)] * 5 + [('rare', 30), ('middle', 20)]
+        with open(self.path, 'w', encoding='utf-8') as file:
+            for key, duration in entries:
+                file.write(json.dumps({
+                    'fingerprint': key, 'normalized': f'SELECT {key}',
+                    'duration_ms': duration, 'params': '[]',
+                    'view': 'recipes-list', 'caller': None,
+                }) + '\n')
+            file.write('не JSON\n')
+
+    def order(self, sort):
+        stdout = io.StringIO()
+        call_command('slow_queries', file=self.path, sort=sort,
+                     stdout=stdout)
+        return [
+            line.split(':')[0] for line in stdout.getvalue().splitlines()
+            if not line.startswith(' ')
+        ]
+
+    def test_sort(self):
+        self.assertEqual(self.order('total'), ['often', 'rare', 'middle'])
+        self.assertEqual(self.order('count'), ['often', 'rare', 'middle'])
+        self.assertEqual(self.order('max'), ['rare', 'middle', 'often'])
+        self.assertEqual(self.order('mean'), ['rare', 'middle', 'often'])
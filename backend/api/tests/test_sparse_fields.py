@@ -0,0 +1,56 @@
+import json
+
+from .base import APITestCase
+
+
+class SparseFieldsTest(APITestCase):
+    """?fields= и ?omit= сокращают ответ и число запросов."""
+
+    def setUp(self):
+        super().setUp()
+        for i in range(6):
+            self.create_recipe(f'Рецепт {i}')
+
+    def get(self, url, queries):
+        with self.assertNumQueries(queries):
+            response = self.client_reader.get(url)
+        self.assertEqual(response.status_code, 200)
+        return response
+
+    def test_fields_reduce_queries_and_payload(self):
+        full = self.get('/api/recipes/', 5)
+        sparse = self.get('/api/recipes/?fields=id,name', 3)
+        self.assertEqual(
+            [set(item) for item in sparse.data['results']],
+            [{'id', 'name'}] * 6
+        )
+        self.assertLess(len(sparse.content), len(full.content) / 4)
+
+    def test_omit_skips_relations(self):
+        response = self.get('/api/recipes/?omit=tags,ingredients', 3)
+        item = response.data['results'][0]
+        self.assertNotIn('tags', item)
+        self.assertNotIn('ingredients', item)
+        self.assertIn('author', item)
+
+    def test_unknown_field_rejected(self):
+        for param in ('fields', 'omit'):
+            with self.subTest(param=param):
+                response = self.client_reader.get(
+                    f'/api/recipes/?{param}=id,bogus'
+                )
+                self.assertEqual(response.status_code, 400)
+                self.assertIn('bogus', json.dumps(
+                    response.data, ensure_ascii=False
+                ))
+
+    def test_unknown_field_rejected_on_detail(self):
+        recipe = self.create_recipe()
+        response = self.client_reader.get(
+            f'/api/recipes/{recipe.pk}/?fields=bogus'
+        )
+        self.assertEqual(response.status_code, 400)
+
+    def test_unknown_user_field_rejected(self):
+        response = self.client_reader.get('/api/users/?fields=bogus')
+        self.assertEqual(response.status_code, 400)
@@ -0,0 +1,68 @@
+from importlib import import_module
+
+from django.apps import apps
+from django.db import connection
+from django.db.models import F
+
+from recipes.models import Recipe, Tag, expected_tag_mask
+from .base import APITestCase
+
+tag_mask_migration = import_module('recipes.migrations.0012_tag_mask')
+
+
+class TagFilterTest(APITestCase):
+    """Фильтр по маске тегов совпадает с прежним фильтром через JOIN."""
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        cls.tag_without_bit = Tag.objects.create(
+            name='Без бита', slug='no-bit'
+        )
+        # Как после bulk_create: бит еще не назначен.
+        Tag.objects.filter(pk=cls.tag_without_bit.pk).update(bit=None)
+        cls.tag_without_bit.refresh_from_db()
+        first, second, third = cls.tags
+        for tags in ([first], [first, second], [second, third],
+                     [cls.tag_without_bit], [first, cls.tag_without_bit],
+                     []):
+            cls.create_recipe(
+                'Рецепт ' + ','.join(tag.slug for tag in tags), tags=tags
+            )
+
+    def filter_by_join(self, slugs):
+        return list(Recipe.objects.filter(
+            tags__slug__in=slugs
+        ).distinct().order_by('-pub_date').values_list('id', flat=True))
+
+    def filter_by_api(self, slugs):
+        response = self.anonymous.get(
+            '/api/recipes/', {'tags': slugs, 'limit': 100}
+        )
+        self.assertEqual(response.status_code, 200)
+        return [item['id'] for item in response.data['results']]
+
+    def test_same_as_join(self):
+        first, second, third = (tag.slug for tag in self.tags)
+        for slugs in ([first], [first, second], [first, second, third],
+                      ['no-bit'], [third, 'no-bit']):
+            with self.subTest(slugs=slugs):
+                found = self.filter_by_api(slugs)
+                self.assertEqual(len(found), len(set(found)))
+                self.assertEqual(found, self.filter_by_join(slugs))
+
+    def test_tag_without_bit(self):
+        recipes = Recipe.objects.with_any_tag([self.tag_without_bit])
+        self.assertEqual(recipes.count(), 2)
+
+    def test_migration_fills_masks(self):
+        Tag.objects.update(bit=None)
+        Recipe.objects.update(tag_mask=0)
+        tag_mask_migration.fill_tag_masks(
+            apps, connection.schema_editor()
+        )
+        self.assertFalse(Tag.objects.filter(bit=None).exists())
+        self.assertFalse(Recipe.objects.alias(
+            expected=expected_tag_mask()
+        ).exclude(tag_mask=F('expected')).exists())
+        self.test_same_as_join()
@@ -3,6 +3,7 @@ from rest_framework.routers import DefaultRouter
 
 from .recipes.views import TagViewSet, RecipeViewSet, IngredientViewSet
 from .users.views import FoodgramUserViewSet
+from .views import MetricsView
 
 
 app_name = 'api'
@@ -15,6 +16,7 @@ router.register('users', FoodgramUserViewSet, basename='users')
 
 
 urlpatterns = [
+    path('metrics', MetricsView.as_view(), name='metrics'),
     # Если ввести версионирование, то запросы с фронтенда будут идти не туда
     path('', include(router.urls), name='api-root'),
     re_path('', include('djoser.urls')),
@@ -1,24 +1,29 @@
 from rest_framework.serializers import ModelSerializer, SerializerMethodField
 from rest_framework.exceptions import ValidationError
-from drf_extra_fields.fields import Base64ImageField
 
 from users.models import User
+from ..fields import ImageVariantsField, StreamingBase64ImageField
+from ..mixins import SparseFieldsMixin, TemporaryFilesMixin
 
 
-class FoodgramUserSerializer(ModelSerializer):
+class FoodgramUserSerializer(SparseFieldsMixin, ModelSerializer):
     is_subscribed = SerializerMethodField()
+    avatar_variants = ImageVariantsField('avatar')
 
     class Meta:
         model = User
         fields = ('email', 'id', 'username', 'first_name',
-                  'last_name', 'is_subscribed', 'password', 'avatar')
+                  'last_name', 'is_subscribed', 'password', 'avatar',
+                  'avatar_variants')
         read_only_fields = ('is_subscribed',)
         extra_kwargs = {'password': {'write_only': True}}
 
     def get_is_subscribed(self, obj):
-        user = self.context.get('request').user
-        if not user.is_anonymous:
-            return user.subscriptions.filter(author=obj).exists()
+        if hasattr(obj, 'is_subscribed'):
+            return obj.is_subscribed
+        request = self.context.get('request')
+        if request is not None and not request.user.is_anonymous:
+            return request.user.subscriptions.filter(author=obj).exists()
         return False
 
 
@@ -32,21 +37,22 @@ class FoodgramCreateUserSerializer(ModelSerializer):
         return User.objects.create_user(**validated_data)
 
 
-class UserAvatarSerializer(ModelSerializer):
-    avatar = Base64ImageField(required=True)
+class UserAvatarSerializer(TemporaryFilesMixin, ModelSerializer):
+    avatar = StreamingBase64ImageField(required=True)
+    avatar_variants = ImageVariantsField('avatar')
 
     class Meta:
         model = User
-        fields = ('avatar',)
+        fields = ('avatar', 'avatar_variants')
 
 
 class SubscriptionSerializer(FoodgramUserSerializer):
-    recipes_count = SerializerMethodField()
 
     class Meta:
         model = User
         fields = ('email', 'id', 'username', 'first_name', 'last_name',
-                  'is_subscribed', 'recipes', 'recipes_count', 'avatar')
+                  'is_subscribed', 'recipes', 'recipes_count',
+                  'subscribers_count', 'avatar', 'avatar_variants')
 
     def validate(self, data):
         author = self.instance
@@ -60,6 +66,3 @@ class SubscriptionSerializer(FoodgramUserSerializer):
                 'Нельзя подписаться на самого себя'
             )
         return data
-
-    def get_recipes_count(self, obj):
-        return obj.recipes.count()
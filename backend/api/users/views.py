@@ -1,3 +1,5 @@
+from django.db.models import Exists, F, OuterRef, Prefetch, Value, Window
+from django.db.models.functions import RowNumber
 from django.shortcuts import get_object_or_404
 from rest_framework import status, serializers
 from rest_framework.decorators import action
@@ -6,19 +8,36 @@ from rest_framework.permissions import IsAuthenticated
 from djoser.views import UserViewSet
 from djoser.permissions import CurrentUserOrAdmin
 
+from recipes.models import Recipe
 from users.models import User, Subscription
 from .serializers import (FoodgramUserSerializer,
                           FoodgramCreateUserSerializer,
                           UserAvatarSerializer)
+from ..mixins import get_selected_fields
+from ..pagination import UserPagination
+from ..profiling import ProfilingMixin
 from ..recipes.serializers import SubscriptionSerializer
 
 
-class FoodgramUserViewSet(UserViewSet):
+class FoodgramUserViewSet(ProfilingMixin, UserViewSet):
+    pagination_class = UserPagination
+
     def get_serializer_class(self):
         if self.request.method == 'GET':
             return FoodgramUserSerializer
         return FoodgramCreateUserSerializer
 
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        if self.action not in ('list', 'retrieve'):
+            return queryset
+        user = self.request.user
+        if user.is_anonymous:
+            return queryset.annotate(is_subscribed=Value(False))
+        return queryset.annotate(is_subscribed=Exists(
+            Subscription.objects.filter(user=user, author=OuterRef('pk'))
+        ))
+
     def get_permissions(self):
         if self.action == 'me':
             self.permission_classes = (IsAuthenticated,)
@@ -38,17 +57,54 @@ class FoodgramUserViewSet(UserViewSet):
     @me_avatar.mapping.delete
     def delete_avatar(self, request):
         user = request.user
-        user.avatar.delete()
+        # Файл может принадлежать и другим пользователям, его удалит
+        # collect_media_garbage.
+        user.avatar = None
+        user.save(update_fields=['avatar'])
         return Response(status=status.HTTP_204_NO_CONTENT)
 
+    def get_recipes_limit(self):
+        try:
+            limit = int(self.request.query_params['recipes_limit'])
+        except (KeyError, ValueError):
+            return None
+        return limit if limit >= 0 else None
+
+    def annotate_subscriptions(self, queryset):
+        """Готовит авторов к SubscriptionSerializer за постоянное число
+        запросов: recipes_limit последних рецептов всех авторов
+        выбирается одним запросом с ROW_NUMBER() OVER (PARTITION BY
+        author).
+        """
+        fields = get_selected_fields(
+            self.request, SubscriptionSerializer.Meta.fields
+        )
+        queryset = queryset.annotate(is_subscribed=Value(True))
+        if 'recipes' in fields:
+            recipes = Recipe.objects.only(
+                'id', 'author_id', 'name', 'image', 'image_variants',
+                'cooking_time'
+            )
+            limit = self.get_recipes_limit()
+            if limit is not None:
+                recipes = recipes.annotate(row_number=Window(
+                    RowNumber(),
+                    partition_by=F('author'),
+                    order_by=(F('pub_date').desc(), F('id').desc())
+                )).filter(row_number__lte=limit)
+            queryset = queryset.prefetch_related(Prefetch(
+                'recipes', queryset=recipes, to_attr='limited_recipes'
+            ))
+        return queryset
+
     @action(
         ['get'], detail=False,
         permission_classes=[IsAuthenticated]
     )
     def subscriptions(self, request):
-        subscribers = User.objects.filter(
+        subscribers = self.annotate_subscriptions(User.objects.filter(
             subscribers__user=request.user
-        )
+        ))
         pages = self.paginate_queryset(subscribers)
         serializer = SubscriptionSerializer(
             pages,
@@ -74,6 +130,9 @@ class FoodgramUserViewSet(UserViewSet):
             raise serializers.ValidationError(
                 {'subscribe': f'Вы уже подписаны на "{author}"'}
             )
+        author = self.annotate_subscriptions(
+            User.objects.filter(pk=author.pk)
+        ).get()
         subscribing_data = SubscriptionSerializer(
             author, context={'request': request}
         ).data
@@ -0,0 +1,19 @@
+from rest_framework.response import Response
+from rest_framework.views import APIView
+
+from .metrics import metrics
+from .permissions import IsStaffOrMetricsToken
+from .renderers import PlainTextRenderer
+
+
+class MetricsView(APIView):
+    """Метрики всех воркеров в текстовом формате Prometheus."""
+
+    permission_classes = (IsStaffOrMetricsToken,)
+    renderer_classes = (PlainTextRenderer,)
+
+    def get(self, request):
+        return Response(
+            metrics.render(),
+            content_type='text/plain; version=0.0.4; charset=utf-8'
+        )
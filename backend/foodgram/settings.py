@@ -36,6 +36,9 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'api.middleware.SlowQueryMiddleware',
+    'api.middleware.ProfilingMiddleware',
+    'api.middleware.MetricsMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -84,6 +87,43 @@ DATABASES = {
     }
 }
 
+# В кэшах хранятся только данные, которые можно потерять при
+# вытеснении: версии таблиц, по которым они сбрасываются, хранятся в
+# базе (recipes.DataVersion).
+CACHE_LOCATION = os.getenv('CACHE_LOCATION', os.path.join(BASE_DIR, 'cache'))
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': CACHE_LOCATION,
+    },
+    # Выгрузки списков покупок отдельно от кэша по умолчанию: большие
+    # файлы вытесняют только друг друга.
+    'shopping-lists': {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': os.path.join(CACHE_LOCATION, 'shopping-lists'),
+        'TIMEOUT': int(
+            os.getenv('SHOPPING_LIST_CACHE_TIMEOUT', 60 * 60 * 24)
+        ),
+        'OPTIONS': {
+            'MAX_ENTRIES': int(
+                os.getenv('SHOPPING_LIST_CACHE_MAX_ENTRIES', 200)
+            ),
+        },
+    },
+    'recipes': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'recipes',
+        'OPTIONS': {
+            'MAX_ENTRIES': int(os.getenv('RECIPE_CACHE_MAX_ENTRIES', 5000)),
+        },
+    },
+}
+
+RECIPE_CACHE_ALIAS = 'recipes'
+SHOPPING_LIST_CACHE_ALIAS = 'shopping-lists'
+RECIPE_CACHE_TIMEOUT = int(os.getenv('RECIPE_CACHE_TIMEOUT', 60 * 60))
+
 
 AUTH_PASSWORD_VALIDATORS = [
     {
@@ -118,6 +158,69 @@ STATIC_ROOT = os.path.join(BASE_DIR, 'static')
 MEDIA_URL = '/media/'
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
 
+# Загруженные файлы называются по хэшу содержимого и не удаляются
+# при замене, неиспользуемые удаляет collect_media_garbage.
+STORAGES = {
+    'default': {
+        'BACKEND': 'recipes.storage.ContentHashStorage',
+    },
+    'staticfiles': {
+        'BACKEND': 'django.contrib.staticfiles.storage.StaticFilesStorage',
+    },
+}
+
+# Уменьшенные копии изображений строятся в фоновых потоках процесса.
+# При IMAGE_WORKERS=0 они строятся сразу после сохранения.
+IMAGE_VARIANT_WIDTHS = (320, 640)
+IMAGE_WORKERS = int(os.getenv('IMAGE_WORKERS', 2))
+
+# Ограничения на загружаемые изображения, размер как в nginx.
+IMAGE_UPLOAD_MAX_SIZE = 10 * 1024 * 1024
+IMAGE_UPLOAD_MAX_PIXELS = 40_000_000
+
+# Наибольшее число рецептов в POST /api/recipes/bulk/ и размер тела
+# такого запроса: изображение рецепта обычно меньше
+# RECIPE_BULK_IMAGE_SIZE, в base64 оно на треть больше, и еще до 16 КиБ
+# на текст. Тело больше RECIPE_BULK_MAX_BODY_SIZE отклоняется до
+# разбора JSON, в nginx для /api/recipes/bulk/ задан тот же предел.
+RECIPE_BULK_MAX_SIZE = int(os.getenv('RECIPE_BULK_MAX_SIZE', 100))
+RECIPE_BULK_IMAGE_SIZE = int(os.getenv('RECIPE_BULK_IMAGE_SIZE', 256 * 1024))
+RECIPE_BULK_MAX_BODY_SIZE = RECIPE_BULK_MAX_SIZE * (
+    RECIPE_BULK_IMAGE_SIZE * 4 // 3 + 16 * 1024
+)
+
+# Метрики каждого процесса сбрасываются в METRICS_DIR не чаще раза в
+# METRICS_FLUSH_INTERVAL секунд и складываются при запросе /api/metrics.
+# Доступ - администраторам или с заголовком Bearer METRICS_TOKEN.
+METRICS_DIR = os.getenv('METRICS_DIR', os.path.join(BASE_DIR, 'metrics'))
+METRICS_FLUSH_INTERVAL = int(os.getenv('METRICS_FLUSH_INTERVAL', 5))
+METRICS_TOKEN = os.getenv('METRICS_TOKEN', '')
+
+# Запросы дольше SLOW_QUERY_MS миллисекунд пишутся в SLOW_QUERY_LOG
+# (JSONL с ротацией) с вероятностью SLOW_QUERY_SAMPLE_RATE, 0 отключает
+# журнал. SLOW_QUERY_EXPLAIN: '' - без плана, 'plan' - EXPLAIN,
+# 'analyze' - EXPLAIN ANALYZE для читающих запросов. Сводку выводит
+# команда slow_queries. При 'analyze' запрос выполняется еще раз: он
+# откатывается, но функции с внешними эффектами (nextval, функции с
+# записью в другие системы) срабатывают повторно, поэтому этот режим
+# включают только на время разбора.
+SLOW_QUERY_MS = float(os.getenv('SLOW_QUERY_MS', 500))
+SLOW_QUERY_SAMPLE_RATE = float(os.getenv('SLOW_QUERY_SAMPLE_RATE', 1))
+SLOW_QUERY_EXPLAIN = os.getenv('SLOW_QUERY_EXPLAIN', 'plan')
+SLOW_QUERY_LOG = os.getenv(
+    'SLOW_QUERY_LOG', os.path.join(BASE_DIR, 'logs', 'slow_queries.jsonl')
+)
+SLOW_QUERY_LOG_MAX_BYTES = 10 * 1024 * 1024
+SLOW_QUERY_LOG_BACKUPS = 5
+
+# Профилирование запросов: по заголовку X-Profile с PROFILE_TOKEN или
+# случайно с вероятностью PROFILE_SAMPLE_RATE. Время фаз отдается в
+# заголовке Server-Timing, дампы cProfile пишутся в PROFILE_DUMP_DIR,
+# если он задан.
+PROFILE_TOKEN = os.getenv('PROFILE_TOKEN', '')
+PROFILE_SAMPLE_RATE = float(os.getenv('PROFILE_SAMPLE_RATE', 0))
+PROFILE_DUMP_DIR = os.getenv('PROFILE_DUMP_DIR', '')
+
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
 AUTH_USER_MODEL = 'users.User'
@@ -142,6 +245,6 @@ REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': [
         'rest_framework.authentication.TokenAuthentication'
     ],
-    'DEFAULT_PAGINATION_CLASS': 'rest_framework.pagination.PageNumberPagination',
+    'DEFAULT_PAGINATION_CLASS': 'api.pagination.Pagination',
     'PAGE_SIZE': 6,
 }
@@ -1,15 +1,23 @@
 from django.contrib import admin
 
 from .models import (Recipe, Ingredient, Tag, RecipeIngredient, RecipeTag,
-                     Favorite, ShoppingCart)
+                     Favorite, ShoppingCart, ShoppingListItem)
+from .search import search_recipes
 
 
 class RecipeAdmin(admin.ModelAdmin):
-    list_display = ('name', 'author')
+    list_display = ('name', 'author', 'favorites_count', 'cart_count')
+    readonly_fields = ('favorites_count', 'cart_count')
     list_display_links = ('name',)
-    search_fields = ('name', 'author')
+    search_fields = ('name', 'text')
     list_filter = ('author', 'name', 'tags__name')
 
+    def get_search_results(self, request, queryset, search_term):
+        # Название и описание ищутся по полнотекстовому индексу.
+        if not search_term:
+            return queryset, False
+        return search_recipes(queryset, search_term), False
+
 
 class IngredientAdmin(admin.ModelAdmin):
     list_display = ('name', 'measurement_unit')
@@ -25,3 +33,4 @@ admin.site.register(RecipeIngredient)
 admin.site.register(RecipeTag)
 admin.site.register(Favorite)
 admin.site.register(ShoppingCart)
+admin.site.register(ShoppingListItem)
@@ -0,0 +1,111 @@
+import io
+import random
+
+from django.core.management import call_command
+
+from users.models import Subscription, User
+from .models import (MAX_TAGS, TOO_MANY_TAGS, Favorite, Ingredient, Recipe,
+                     RecipeIngredient, RecipeTag, ShoppingCart, Tag)
+from .signals import catalog_changed
+
+# favorites, carts и subscriptions - число записей на пользователя.
+SCALES = {
+    'small': {
+        'users': 50, 'tags': 10, 'ingredients': 500, 'recipes': 500,
+        'favorites': 10, 'carts': 5, 'subscriptions': 5,
+    },
+    'medium': {
+        'users': 500, 'tags': 20, 'ingredients': 2000, 'recipes': 10000,
+        'favorites': 30, 'carts': 10, 'subscriptions': 20,
+    },
+    'large': {
+        'users': 5000, 'tags': 30, 'ingredients': 2000, 'recipes': 100000,
+        'favorites': 50, 'carts': 15, 'subscriptions': 50,
+    },
+}
+INGREDIENTS_PER_RECIPE = 8
+MAX_TAGS_PER_RECIPE = 3
+BATCH_SIZE = 1000
+
+
+def generate(counts, seed=0):
+    """Заполняет пустую базу одинаковыми при одном seed данными.
+
+    Объекты создаются через bulk_create, поэтому после вставки
+    пересчитываются маски тегов, счетчики и списки покупок, а
+    справочники помечаются измененными.
+    """
+    if counts['tags'] > MAX_TAGS:
+        raise ValueError(TOO_MANY_TAGS)
+    rng = random.Random(seed)
+    users = User.objects.bulk_create([
+        User(
+            username=f'user{i}', email=f'user{i}@example.com',
+            first_name=f'Имя{i}', last_name=f'Фамилия{i}',
+            password='!'
+        )
+        for i in range(counts['users'])
+    ], batch_size=BATCH_SIZE)
+    tags = Tag.objects.bulk_create([
+        Tag(name=f'тег {i}', slug=f'tag{i}', bit=i)
+        for i in range(counts['tags'])
+    ])
+    ingredients = Ingredient.objects.bulk_create([
+        Ingredient(
+            name=f'ингредиент {i}',
+            measurement_unit=rng.choice(('г', 'мл', 'шт.'))
+        )
+        for i in range(counts['ingredients'])
+    ], batch_size=BATCH_SIZE)
+    recipes = Recipe.objects.bulk_create([
+        Recipe(
+            author=rng.choice(users), name=f'Рецепт {i}',
+            text=f'Описание рецепта {i}.', image='recipes/generated.png',
+            cooking_time=rng.randint(1, 180)
+        )
+        for i in range(counts['recipes'])
+    ], batch_size=BATCH_SIZE)
+    RecipeTag.objects.bulk_create([
+        RecipeTag(recipe=recipe, tag=tag)
+        for recipe in recipes
+        for tag in rng.sample(tags, rng.randint(
+            1, min(MAX_TAGS_PER_RECIPE, len(tags))
+        ))
+    ], batch_size=BATCH_SIZE)
+    Recipe.objects.update_tag_masks()
+    RecipeIngredient.objects.bulk_create([
+        RecipeIngredient(
+            recipe=recipe, ingredient=ingredient,
+            amount=rng.randint(1, 500)
+        )
+        for recipe in recipes
+        for ingredient in rng.sample(
+            ingredients, min(INGREDIENTS_PER_RECIPE, len(ingredients))
+        )
+    ], batch_size=BATCH_SIZE)
+    for model, key in ((Favorite, 'favorites'), (ShoppingCart, 'carts')):
+        model.objects.bulk_create([
+            model(user=user, recipe=recipe)
+            for user in users
+            for recipe in rng.sample(
+                recipes, min(counts[key], len(recipes))
+            )
+        ], batch_size=BATCH_SIZE)
+    # Индексы авторов без самого пользователя: i-й пропускается.
+    Subscription.objects.bulk_create([
+        Subscription(user=user, author=users[j + (j >= i)])
+        for i, user in enumerate(users)
+        for j in rng.sample(
+            range(len(users) - 1),
+            min(counts['subscriptions'], len(users) - 1)
+        )
+    ], batch_size=BATCH_SIZE)
+    call_command('recount', stdout=io.StringIO())
+    call_command('rebuild_shopping_lists', stdout=io.StringIO())
+    catalog_changed.send(sender=Tag)
+    catalog_changed.send(sender=Ingredient)
+    catalog_changed.send(sender=RecipeIngredient)
+    return {
+        'users': len(users), 'tags': len(tags),
+        'ingredients': len(ingredients), 'recipes': len(recipes),
+    }
@@ -0,0 +1,149 @@
+import io
+import logging
+import posixpath
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.db import connections, transaction
+from PIL import Image, ImageOps
+
+logger = logging.getLogger(__name__)
+
+# Расширение файла копии и формат Pillow.
+VARIANT_FORMATS = {'webp': 'WEBP', 'jpeg': 'JPEG'}
+VARIANT_QUALITY = 80
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def get_variant_widths():
+    return tuple(getattr(settings, 'IMAGE_VARIANT_WIDTHS', (320, 640)))
+
+
+def get_variants_field(field):
+    return f'{field}_variants'
+
+
+def variant_name(name, width, extension):
+    """recipes/x.png -> recipes/variants/x-320.webp"""
+    directory, filename = posixpath.split(name)
+    stem = posixpath.splitext(filename)[0]
+    return posixpath.join(
+        directory, 'variants', f'{stem}-{width}.{extension}'
+    )
+
+
+def encode(image, image_format):
+    if image_format == 'JPEG' and image.mode not in ('RGB', 'L'):
+        # В JPEG нет прозрачности, она заливается белым.
+        background = Image.new('RGB', image.size, 'white')
+        rgba = image.convert('RGBA')
+        background.paste(rgba, mask=rgba.getchannel('A'))
+        image = background
+    elif image_format == 'WEBP' and image.mode not in ('RGB', 'RGBA'):
+        image = image.convert('RGBA')
+    buffer = io.BytesIO()
+    image.save(buffer, image_format, quality=VARIANT_QUALITY, optimize=True)
+    return buffer.getvalue()
+
+
+def make_variants(storage, name):
+    """Сохраняет копии изображения нужных ширин во всех форматах.
+
+    Изображения уже нужной ширины не увеличиваются. Возвращает словарь
+    {'source': name, формат: {ширина: имя файла}}.
+    """
+    with storage.open(name) as file:
+        image = ImageOps.exif_transpose(Image.open(file))
+        image.load()
+    variants = {'source': name}
+    for width in get_variant_widths():
+        resized = image
+        if image.width > width:
+            resized = image.resize(
+                (width, max(1, round(image.height * width / image.width))),
+                Image.LANCZOS
+            )
+        for extension, image_format in VARIANT_FORMATS.items():
+            variants.setdefault(extension, {})[str(width)] = storage.save(
+                variant_name(name, width, extension),
+                ContentFile(encode(resized, image_format))
+            )
+    return variants
+
+
+def process_image(model, pk, field, name):
+    """Строит копии изображения field объекта и сохраняет их список.
+
+    Если изображение успели заменить, результат отбрасывается: для
+    нового файла уже поставлена своя задача.
+    """
+    try:
+        instance = model.objects.filter(pk=pk).only('pk', field).first()
+        if instance is None or getattr(instance, field).name != name:
+            return
+        variants = make_variants(getattr(instance, field).storage, name)
+        with transaction.atomic():
+            instance = model.objects.select_for_update().filter(
+                pk=pk, **{field: name}
+            ).first()
+            if instance is None:
+                return
+            setattr(instance, get_variants_field(field), variants)
+            # auto_now поля сохраняются, чтобы сменились ETag.
+            instance.save(update_fields=[get_variants_field(field)] + [
+                model_field.name for model_field in model._meta.fields
+                if getattr(model_field, 'auto_now', False)
+            ])
+    except Exception:
+        logger.exception(
+            'Не удалось обработать изображение %s (%s %s)',
+            name, model._meta.label, pk
+        )
+
+
+def process_in_worker(*args):
+    try:
+        process_image(*args)
+    finally:
+        # У каждого потока свое соединение с базой.
+        connections.close_all()
+
+
+def get_executor():
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(
+                max_workers=settings.IMAGE_WORKERS,
+                thread_name_prefix='images'
+            )
+        return _executor
+
+
+def submit(model, pk, field, name):
+    if not getattr(settings, 'IMAGE_WORKERS', 0):
+        process_image(model, pk, field, name)
+        return None
+    return get_executor().submit(
+        process_in_worker, model, pk, field, name
+    )
+
+
+def needs_variants(instance, field):
+    image = getattr(instance, field)
+    variants = getattr(instance, get_variants_field(field)) or {}
+    return bool(image) and variants.get('source') != image.name
+
+
+def schedule_variants(instance, field):
+    """Ставит обработку изображения в очередь после коммита."""
+    if needs_variants(instance, field):
+        transaction.on_commit(partial(
+            submit, type(instance), instance.pk, field,
+            getattr(instance, field).name
+        ))
@@ -0,0 +1,320 @@
+import csv
+import io
+import json
+import os
+import re
+import time
+from itertools import islice
+
+from django.core.management import base
+from django.db import connection, transaction
+
+from .signals import catalog_changed
+
+READ_CHUNK_SIZE = 64 * 1024
+# Пробелы и запятые между элементами JSON массива.
+SEPARATOR = re.compile(r'[\s,]*')
+# Символы, которые могут идти сразу после элемента JSON массива.
+DELIMITER = re.compile(r'[\s,\]]')
+FORMATS = {
+    '.json': 'json',
+    '.csv': 'csv',
+    '.ndjson': 'ndjson',
+    '.jsonl': 'ndjson',
+}
+
+
+def read_json_array(file):
+    """Лениво читает элементы JSON массива верхнего уровня."""
+    decoder = json.JSONDecoder()
+    buffer = ''
+    for chunk in iter(lambda: file.read(READ_CHUNK_SIZE), ''):
+        buffer += chunk
+        if buffer.strip():
+            break
+    buffer = buffer.lstrip()
+    if not buffer.startswith('['):
+        raise ValueError('ожидается JSON массив')
+    position, eof = 1, False
+    while True:
+        position = SEPARATOR.match(buffer, position).end()
+        if buffer.startswith(']', position):
+            return
+        if position < len(buffer):
+            try:
+                item, end = decoder.raw_decode(buffer, position)
+            except ValueError:
+                pass
+            else:
+                # Число на границе части могло быть обрезано ("678." из
+                # "678.5"), поэтому элемент принимается, только если за
+                # ним идет разделитель или файл прочитан.
+                if eof or DELIMITER.match(buffer, end):
+                    position = end
+                    yield item
+                    continue
+        # Элемент не поместился в буфер целиком, дочитываем файл.
+        if eof:
+            raise ValueError('JSON массив не закрыт или поврежден')
+        chunk = file.read(READ_CHUNK_SIZE)
+        eof = not chunk
+        buffer, position = buffer[position:] + chunk, 0
+
+
+def read_ndjson(file):
+    for line in file:
+        if line.strip():
+            yield json.loads(line)
+
+
+def read_csv(file, fields):
+    """Читает строки CSV.
+
+    Если первая строка - заголовок с именами полей, порядок столбцов
+    берется из него, иначе столбцы идут в порядке fields.
+    """
+    reader = csv.reader(file, skipinitialspace=True)
+    for row in reader:
+        row = [value.strip() for value in row]
+        if reader.line_num == 1 and set(row) == set(fields):
+            fields = row
+            continue
+        if row:
+            yield dict(zip(fields, row))
+
+
+READERS = {
+    'json': lambda file, fields: read_json_array(file),
+    'ndjson': lambda file, fields: read_ndjson(file),
+    'csv': read_csv,
+}
+
+
+def batched(iterable, size):
+    iterator = iter(iterable)
+    while True:
+        batch = list(islice(iterator, size))
+        if not batch:
+            return
+        yield batch
+
+
+class CatalogImporter:
+    """Вставка или обновление строк справочника пачками.
+
+    Строка, совпадающая с существующей по unique_fields, обновляет
+    update_fields (или пропускается, если их нет), поэтому повторный
+    импорт ничего не дублирует. Строки, у которых значение одного из
+    other_unique_fields уже занято другой записью, не импортируются и
+    возвращаются как пропущенные. В PostgreSQL пачка загружается COPY во
+    временную таблицу и переносится одним INSERT ... ON CONFLICT,
+    в остальных базах - через bulk_create с обработкой конфликтов.
+    """
+
+    def __init__(self, model, unique_fields, update_fields=(),
+                 other_unique_fields=()):
+        self.model = model
+        self.unique_fields = tuple(unique_fields)
+        self.update_fields = tuple(update_fields)
+        self.other_unique_fields = tuple(other_unique_fields)
+        self.fields = self.unique_fields + self.update_fields
+
+    def clean(self, item):
+        try:
+            return {field: str(item[field]) for field in self.fields}
+        except (KeyError, TypeError):
+            raise ValueError(
+                f'в строке {item!r} нет полей {", ".join(self.fields)}'
+            )
+
+    def run(self, items, batch_size):
+        """Импортирует items.
+
+        Возвращает число импортированных строк и список пропущенных
+        пар (строка, причина).
+        """
+        rows, skipped = 0, []
+        use_copy = connection.vendor == 'postgresql'
+        with transaction.atomic():
+            if use_copy:
+                self.create_staging()
+            for batch in batched(map(self.clean, items), batch_size):
+                batch = self.skip_conflicts(batch, skipped)
+                if not batch:
+                    continue
+                if use_copy:
+                    self.copy_batch(batch)
+                else:
+                    self.bulk_create_batch(batch)
+                rows += len(batch)
+            self.finish()
+        return rows, skipped
+
+    def finish(self):
+        """Вызывается в транзакции импорта после последней пачки.
+
+        Ошибка здесь откатывает весь импорт.
+        """
+
+    def skip_conflicts(self, batch, skipped):
+        """Убирает строки, нарушающие other_unique_fields.
+
+        Значение считается занятым, если оно есть у записи с другим
+        ключом в базе или у одной из предыдущих строк пачки.
+        """
+        if not self.other_unique_fields:
+            return batch
+        owners = {}
+        for field in self.other_unique_fields:
+            owners[field] = {
+                str(value): tuple(map(str, key))
+                for value, *key in self.model.objects.filter(**{
+                    f'{field}__in': {row[field] for row in batch}
+                }).values_list(field, *self.unique_fields)
+            }
+        kept = []
+        for row in batch:
+            key = tuple(row[field] for field in self.unique_fields)
+            taken = [
+                field for field in self.other_unique_fields
+                if owners[field].get(row[field], key) != key
+            ]
+            if taken:
+                skipped.append((row, ', '.join(
+                    f'{self.model._meta.get_field(field).verbose_name} '
+                    f'«{row[field]}» уже у другой записи'
+                    for field in taken
+                )))
+                continue
+            for field in self.other_unique_fields:
+                owners[field][row[field]] = key
+            kept.append(row)
+        return kept
+
+    def bulk_create_batch(self, batch):
+        options = {'ignore_conflicts': True}
+        if self.update_fields:
+            options = {
+                'update_conflicts': True,
+                'unique_fields': self.unique_fields,
+                'update_fields': self.update_fields,
+            }
+        self.model.objects.bulk_create(
+            [self.model(**row) for row in batch], **options
+        )
+
+    @property
+    def table(self):
+        return connection.ops.quote_name(self.model._meta.db_table)
+
+    @property
+    def staging_table(self):
+        return connection.ops.quote_name(
+            f'{self.model._meta.db_table}_import'
+        )
+
+    def columns(self, fields):
+        return ', '.join(
+            connection.ops.quote_name(self.model._meta.get_field(field).column)
+            for field in fields
+        )
+
+    def create_staging(self):
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'CREATE TEMPORARY TABLE {self.staging_table} '
+                f'ON COMMIT DROP AS SELECT {self.columns(self.fields)} '
+                f'FROM {self.table} WITH NO DATA'
+            )
+
+    def copy_batch(self, batch):
+        buffer = io.StringIO()
+        # В кавычках пустая строка не превращается в NULL.
+        writer = csv.writer(buffer, quoting=csv.QUOTE_ALL)
+        for row in batch:
+            writer.writerow([row[field] for field in self.fields])
+        buffer.seek(0)
+        columns = self.columns(self.fields)
+        unique = self.columns(self.unique_fields)
+        if self.update_fields:
+            conflict = 'DO UPDATE SET ' + ', '.join(
+                f'{column} = EXCLUDED.{column}'
+                for column in map(
+                    connection.ops.quote_name,
+                    (self.model._meta.get_field(field).column
+                     for field in self.update_fields)
+                )
+            )
+        else:
+            conflict = 'DO NOTHING'
+        with connection.cursor() as cursor:
+            cursor.copy_expert(
+                f'COPY {self.staging_table} ({columns}) '
+                f'FROM STDIN WITH (FORMAT csv)',
+                buffer
+            )
+            # DISTINCT ON: ON CONFLICT DO UPDATE не может изменить
+            # строку дважды, а в файле возможны повторы.
+            cursor.execute(
+                f'INSERT INTO {self.table} ({columns}) '
+                f'SELECT DISTINCT ON ({unique}) {columns} '
+                f'FROM {self.staging_table} '
+                f'ON CONFLICT ({unique}) {conflict}'
+            )
+            cursor.execute(f'TRUNCATE {self.staging_table}')
+
+
+class ImportCommand(base.BaseCommand):
+    """Основа команд импорта справочников из JSON, NDJSON и CSV."""
+
+    importer = None
+    verbose_name_plural = None
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'file_path',
+            help='Путь к файлу: JSON массив, NDJSON (.ndjson, .jsonl) '
+                 'или CSV.'
+        )
+        parser.add_argument(
+            '--format', choices=sorted(READERS),
+            help='Формат файла, по умолчанию - по расширению.'
+        )
+        parser.add_argument(
+            '--batch-size', type=int, default=1000,
+            help='Число строк в одной пачке.'
+        )
+
+    def handle(self, *args, **options):
+        file_path = options['file_path']
+        file_format = options['format'] or FORMATS.get(
+            os.path.splitext(file_path)[1].lower()
+        )
+        if file_format is None:
+            raise base.CommandError(
+                f'Не удалось определить формат {file_path}, '
+                f'укажите --format.'
+            )
+        model = self.importer.model
+        count_before = model.objects.count()
+        started = time.perf_counter()
+        try:
+            with open(file_path, 'r', encoding='utf-8', newline='') as file:
+                rows, skipped = self.importer.run(
+                    READERS[file_format](file, self.importer.fields),
+                    options['batch_size']
+                )
+        except Exception as e:
+            raise base.CommandError(
+                f'Ошибка при импорте {self.verbose_name_plural}: {e}'
+            )
+        elapsed = time.perf_counter() - started
+        catalog_changed.send(sender=model)
+        for row, reason in skipped:
+            self.stderr.write(f'Пропущена строка {row}: {reason}')
+        self.stdout.write(self.style.SUCCESS(
+            f'Импортировано из {file_path}: строк {rows}, '
+            f'новых {model.objects.count() - count_before}, '
+            f'пропущено {len(skipped)}, '
+            f'{elapsed:.2f} с ({rows / max(elapsed, 1e-6):.0f} строк/с)'
+        ))
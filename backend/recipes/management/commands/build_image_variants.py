@@ -0,0 +1,31 @@
+from django.core.management import base
+
+from recipes.images import get_variants_field, needs_variants, process_image
+from recipes.models import Recipe
+from users.models import User
+
+
+class Command(base.BaseCommand):
+    help = ('Построение уменьшенных копий изображений рецептов '
+            'и аватаров, для которых их еще нет.')
+
+    images = (
+        (Recipe, 'image'),
+        (User, 'avatar'),
+    )
+
+    def handle(self, *args, **options):
+        for model, field in self.images:
+            built = 0
+            queryset = model.objects.exclude(**{field: ''}).exclude(
+                **{f'{field}__isnull': True}
+            ).only('pk', field, get_variants_field(field))
+            for instance in queryset.iterator(chunk_size=500):
+                if needs_variants(instance, field):
+                    process_image(
+                        model, instance.pk, field,
+                        getattr(instance, field).name
+                    )
+                    built += 1
+            self.stdout.write(f'{model._meta.model_name}.{field}: {built}')
+        self.stdout.write(self.style.SUCCESS('Копии изображений построены'))
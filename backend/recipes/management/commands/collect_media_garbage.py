@@ -0,0 +1,141 @@
+import os
+import posixpath
+from datetime import timedelta
+
+from django.core.files.storage import default_storage
+from django.core.management import base
+from django.db.models import Q
+from django.utils import timezone
+
+from recipes.images import get_variants_field
+from recipes.models import Recipe
+from users.models import User
+
+QUARANTINE_SUFFIX = '.garbage'
+
+
+class Command(base.BaseCommand):
+    help = ('Удаление загруженных изображений и их копий, на которые '
+            'не ссылается ни один рецепт или пользователь.')
+
+    images = (
+        (Recipe, 'image'),
+        (User, 'avatar'),
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--min-age', type=int, default=60 * 60,
+            help=('Не удалять файлы моложе стольких секунд: они могут '
+                  'принадлежать еще не сохраненному объекту.')
+        )
+        parser.add_argument(
+            '--dry-run', action='store_true',
+            help='Только показать, что будет удалено.'
+        )
+
+    def get_referenced(self):
+        referenced = set()
+        for model, field in self.images:
+            for name, variants in model.objects.values_list(
+                field, get_variants_field(field)
+            ).iterator(chunk_size=2000):
+                if not name:
+                    continue
+                referenced.add(name)
+                # Копии замененного изображения больше не нужны.
+                if variants and variants.get('source') == name:
+                    for extension, files in variants.items():
+                        if extension != 'source':
+                            referenced.update(files.values())
+        return referenced
+
+    def is_referenced(self, model, field, name):
+        condition = Q(**{field: name})
+        condition |= Q(**{f'{get_variants_field(field)}__icontains': name})
+        return model.objects.filter(condition).exists()
+
+    def is_garbage(self, model, field, name, threshold, file_name=None):
+        """Файл name старше порога и не привязан к объектам.
+
+        file_name - имя, под которым файл лежит сейчас, если оно другое.
+        """
+        modified = default_storage.get_modified_time(file_name or name)
+        if modified > threshold:
+            return False
+        return not self.is_referenced(model, field, name)
+
+    def remove(self, model, field, name, threshold):
+        """Удаляет файл, если на него так и не появилось ссылок.
+
+        Файл сначала переименовывается: после этого
+        ContentHashStorage.save его не находит и записывает заново, а
+        не продлевает. Затем ссылки и время изменения проверяются еще
+        раз, и если файл успели привязать к объекту или загрузить
+        повторно до переименования, он возвращается на место.
+        """
+        quarantine = name + QUARANTINE_SUFFIX
+        path = default_storage.path(name)
+        try:
+            os.rename(path, default_storage.path(quarantine))
+        except FileNotFoundError:
+            return False
+        if not self.is_garbage(model, field, name, threshold, quarantine):
+            self.put_back(quarantine, name)
+            return False
+        default_storage.delete(quarantine)
+        return True
+
+    def put_back(self, quarantine, name):
+        # Пока файл был переименован, его могли загрузить заново: тогда
+        # остается новая копия с новым временем изменения.
+        if default_storage.exists(name):
+            default_storage.delete(quarantine)
+        else:
+            os.rename(
+                default_storage.path(quarantine), default_storage.path(name)
+            )
+
+    def restore(self, quarantine):
+        """Возвращает файл, оставшийся от прерванного запуска."""
+        name = quarantine[:-len(QUARANTINE_SUFFIX)]
+        self.put_back(quarantine, name)
+        return name
+
+    def walk(self, directory):
+        if not default_storage.exists(directory):
+            return
+        directories, files = default_storage.listdir(directory)
+        for name in files:
+            yield posixpath.join(directory, name)
+        for name in directories:
+            yield from self.walk(posixpath.join(directory, name))
+
+    def handle(self, *args, **options):
+        referenced = self.get_referenced()
+        threshold = timezone.now() - timedelta(seconds=options['min_age'])
+        removed = size = 0
+        for model, field in self.images:
+            upload_to = model._meta.get_field(field).upload_to.rstrip('/')
+            for name in self.walk(upload_to):
+                if name.endswith(QUARANTINE_SUFFIX):
+                    if options['dry_run']:
+                        continue
+                    name = self.restore(name)
+                if name in referenced:
+                    continue
+                # Список ссылок устарел, пока шел обход: файл могли
+                # привязать к объекту или загрузить заново.
+                if not self.is_garbage(model, field, name, threshold):
+                    continue
+                file_size = default_storage.size(name)
+                if options['dry_run']:
+                    self.stdout.write(name)
+                elif not self.remove(model, field, name, threshold):
+                    continue
+                size += file_size
+                removed += 1
+        self.stdout.write(self.style.SUCCESS(
+            f'{"Будет удалено" if options["dry_run"] else "Удалено"} '
+            f'файлов: {removed}, {size} байт'
+        ))
@@ -0,0 +1,81 @@
+import json
+import sys
+from collections import defaultdict
+
+from django.core.management import base
+
+from recipes.importers import batched
+from recipes.models import Recipe, RecipeIngredient, RecipeTag
+
+RECIPE_FIELDS = ('id', 'name', 'text', 'cooking_time', 'image',
+                 'author__username', 'pub_date')
+
+
+def group(rows):
+    grouped = defaultdict(list)
+    for recipe_id, *values in rows:
+        grouped[recipe_id].append(values)
+    return grouped
+
+
+class Command(base.BaseCommand):
+    help = ('Выгрузка рецептов в NDJSON: по рецепту с тегами, '
+            'ингредиентами, автором и путем к изображению в строке.')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--output', '-o',
+            help='Файл для выгрузки, по умолчанию стандартный вывод.'
+        )
+        parser.add_argument(
+            '--chunk-size', type=int, default=2000,
+            help='Число рецептов, читаемых из базы за раз.'
+        )
+
+    def dump_chunk(self, recipes, output):
+        # Теги и ингредиенты всей пачки читаются двумя запросами,
+        # строками, без создания объектов моделей.
+        ids = [recipe[0] for recipe in recipes]
+        tags = group(RecipeTag.objects.filter(recipe_id__in=ids).values_list(
+            'recipe_id', 'tag__slug'
+        ))
+        ingredients = group(RecipeIngredient.objects.filter(
+            recipe_id__in=ids
+        ).values_list(
+            'recipe_id', 'ingredient__name', 'ingredient__measurement_unit',
+            'amount'
+        ))
+        for pk, name, text, cooking_time, image, author, pub_date in recipes:
+            output.write(json.dumps({
+                'name': name,
+                'text': text,
+                'cooking_time': cooking_time,
+                'image': image,
+                'author': author,
+                'pub_date': pub_date.isoformat(),
+                'tags': [slug for slug, in tags[pk]],
+                'ingredients': [
+                    {'name': ingredient, 'measurement_unit': unit,
+                     'amount': amount}
+                    for ingredient, unit, amount in ingredients[pk]
+                ],
+            }, ensure_ascii=False))
+            output.write('\n')
+
+    def handle(self, *args, **options):
+        recipes = Recipe.objects.order_by('pk').values_list(*RECIPE_FIELDS)
+        output = sys.stdout
+        if options['output']:
+            output = open(options['output'], 'w', encoding='utf-8')
+        count = 0
+        try:
+            for chunk in batched(
+                recipes.iterator(chunk_size=options['chunk_size']),
+                options['chunk_size']
+            ):
+                self.dump_chunk(chunk, output)
+                count += len(chunk)
+        finally:
+            if options['output']:
+                output.close()
+        self.stderr.write(self.style.SUCCESS(f'Выгружено рецептов: {count}'))
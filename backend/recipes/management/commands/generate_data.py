@@ -0,0 +1,45 @@
+from django.core.management import base
+from django.db import IntegrityError, transaction
+
+from recipes.generators import SCALES, generate
+
+
+class Command(base.BaseCommand):
+    help = ('Заполнение пустой базы синтетическими пользователями, '
+            'рецептами, тегами, ингредиентами, избранным, корзинами '
+            'и подписками.')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--scale', choices=sorted(SCALES), default='small',
+            help='Набор объемов данных.'
+        )
+        parser.add_argument(
+            '--seed', type=int, default=0,
+            help='Зерно генератора, одинаковое зерно дает одинаковые данные.'
+        )
+        for name in SCALES['small']:
+            parser.add_argument(
+                f'--{name}', type=int,
+                help='Переопределяет объем из --scale.'
+            )
+
+    def handle(self, *args, **options):
+        counts = {
+            name: options[name] if options[name] is not None else value
+            for name, value in SCALES[options['scale']].items()
+        }
+        try:
+            with transaction.atomic():
+                created = generate(counts, options['seed'])
+        except IntegrityError as e:
+            raise base.CommandError(
+                f'Данные уже существуют, нужна пустая база: {e}'
+            )
+        except ValueError as e:
+            raise base.CommandError(e)
+        self.stdout.write(self.style.SUCCESS(
+            'Создано: ' + ', '.join(
+                f'{name} {count}' for name, count in created.items()
+            )
+        ))
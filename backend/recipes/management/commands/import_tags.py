@@ -1,26 +1,24 @@
-import json
-
-from django.core.management import base
+from django.core.exceptions import ValidationError
 
+from recipes.importers import CatalogImporter, ImportCommand
 from recipes.models import Tag
 
 
-class Command(base.BaseCommand):
-    help = 'Импорт тегов из JSON файла.'
-
-    def add_arguments(self, parser):
-        parser.add_argument(
-            'json_file_path', help='Путь к JSON файлу с тегами.'
-        )
+class TagImporter(CatalogImporter):
 
-    def handle(self, *args, **options):
+    def finish(self):
+        # Биты назначаются до фиксации: если их не хватает, импорт
+        # откатывается целиком.
         try:
-            file_path = options['json_file_path']
-            with open(file_path, 'r', encoding='utf-8') as file:
-                data = json.load(file)
-                Tag.objects.bulk_create(Tag(**item) for item in data)
-            self.stdout.write(self.style.SUCCESS(
-                f'Теги успешно импортированы из {file_path}'
-            ))
-        except Exception as e:
-            raise base.CommandError(f'Ошибка при импорте тегов: {e}')
+            Tag.objects.assign_bits()
+        except ValidationError as error:
+            raise ValueError(' '.join(error.messages))
+
+
+class Command(ImportCommand):
+    help = 'Импорт тегов из JSON, NDJSON или CSV файла.'
+
+    importer = TagImporter(
+        Tag, ('slug',), ('name',), other_unique_fields=('name',)
+    )
+    verbose_name_plural = 'тегов'
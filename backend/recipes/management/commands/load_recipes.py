@@ -0,0 +1,147 @@
+import time
+from collections import Counter
+from itertools import count
+
+from django.core.management import base
+from django.db import IntegrityError, transaction
+from django.db.models import F
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from recipes.importers import batched, read_ndjson
+from recipes.models import (Ingredient, Recipe, RecipeIngredient, RecipeTag,
+                            Tag, keep_pub_dates)
+from recipes.signals import catalog_changed
+from users.models import User
+
+
+class Command(base.BaseCommand):
+    help = ('Загрузка рецептов из NDJSON, выгруженного dump_recipes. '
+            'Авторы, теги и ингредиенты должны уже существовать, файлы '
+            'изображений копируются в хранилище отдельно.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('file_path', help='Путь к NDJSON файлу.')
+        parser.add_argument(
+            '--batch-size', type=int, default=1000,
+            help='Число рецептов, сохраняемых в одной транзакции.'
+        )
+
+    def handle(self, *args, **options):
+        self.tags = dict(Tag.objects.values_list('slug', 'id'))
+        self.tag_bits = dict(
+            Tag.objects.exclude(bit=None).values_list('slug', 'bit')
+        )
+        self.ingredients = {
+            (name, measurement_unit): pk
+            for pk, name, measurement_unit in Ingredient.objects.values_list(
+                'id', 'name', 'measurement_unit'
+            )
+        }
+        self.authors = {}
+        loaded = 0
+        started = time.perf_counter()
+        with open(options['file_path'], encoding='utf-8') as file:
+            lines = zip(count(1), read_ndjson(file))
+            try:
+                for batch in batched(lines, options['batch_size']):
+                    try:
+                        self.load_batch(batch)
+                    except (IntegrityError, KeyError, TypeError,
+                            ValueError) as e:
+                        raise base.CommandError(
+                            f'Ошибка в рецептах {batch[0][0]}-'
+                            f'{batch[-1][0]}: {e!r}. '
+                            f'Загружено рецептов: {loaded}'
+                        )
+                    loaded += len(batch)
+                    self.stdout.write(f'Загружено рецептов: {loaded}')
+            finally:
+                # Состав рецептов записан bulk_create без сигналов.
+                if loaded:
+                    catalog_changed.send(sender=RecipeIngredient)
+        elapsed = time.perf_counter() - started
+        self.stdout.write(self.style.SUCCESS(
+            f'Загружено рецептов: {loaded} за {elapsed:.1f} с '
+            f'({loaded / max(elapsed, 1e-6):.0f} рецептов/с). '
+            f'Копии изображений строит build_image_variants.'
+        ))
+
+    def resolve_authors(self, usernames):
+        missing = set(usernames) - self.authors.keys()
+        if missing:
+            self.authors.update(User.objects.filter(
+                username__in=missing
+            ).values_list('username', 'id'))
+
+    def parse_date(self, value):
+        if not value:
+            return timezone.now()
+        date = parse_datetime(value)
+        if date is None:
+            raise ValueError(f'неверная дата {value}')
+        return date
+
+    def lookup(self, mapping, key, kind, line):
+        try:
+            return mapping[key]
+        except KeyError:
+            raise ValueError(f'строка {line}: не найден {kind} {key}')
+
+    def tag_mask(self, slugs):
+        # Неизвестные теги отклоняет lookup при создании RecipeTag.
+        return sum(
+            1 << self.tag_bits[slug] for slug in set(slugs)
+            if slug in self.tag_bits
+        )
+
+    @transaction.atomic
+    def load_batch(self, batch):
+        self.resolve_authors(data['author'] for _, data in batch)
+        recipes = [
+            Recipe(
+                author_id=self.lookup(
+                    self.authors, data['author'], 'автор', line
+                ),
+                name=data['name'],
+                text=data['text'],
+                cooking_time=data['cooking_time'],
+                image=data['image'],
+                pub_date=self.parse_date(data.get('pub_date')),
+                tag_mask=self.tag_mask(data['tags']),
+            )
+            for line, data in batch
+        ]
+        # Без keep_pub_dates() auto_now_add заменил бы даты из выгрузки
+        # текущим временем.
+        with keep_pub_dates():
+            Recipe.objects.bulk_create(recipes)
+        RecipeTag.objects.bulk_create([
+            RecipeTag(
+                recipe_id=recipe.pk,
+                tag_id=self.lookup(self.tags, slug, 'тег', line)
+            )
+            for recipe, (line, data) in zip(recipes, batch)
+            # Повтор тега нарушил бы уникальность RecipeTag.
+            for slug in dict.fromkeys(data['tags'])
+        ])
+        RecipeIngredient.objects.bulk_create([
+            RecipeIngredient(
+                recipe_id=recipe.pk,
+                ingredient_id=self.lookup(
+                    self.ingredients,
+                    (item['name'], item['measurement_unit']),
+                    'ингредиент', line
+                ),
+                amount=item['amount']
+            )
+            for recipe, (line, data) in zip(recipes, batch)
+            for item in data['ingredients']
+        ])
+        # bulk_create не отправляет post_save, счетчики меняются здесь.
+        for author_id, added in Counter(
+            recipe.author_id for recipe in recipes
+        ).items():
+            User.objects.filter(pk=author_id).update(
+                recipes_count=F('recipes_count') + added
+            )
@@ -0,0 +1,64 @@
+from django.core.management import base
+from django.db import transaction
+from django.db.models import F, Sum
+
+from recipes.models import ShoppingCart, ShoppingListItem
+
+
+class Command(base.BaseCommand):
+    help = 'Пересчет списков покупок по корзинам пользователей.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--verify', action='store_true',
+            help='Только сравнить списки с корзинами, не изменяя их.'
+        )
+
+    def compute(self):
+        return {
+            (item['user_id'], item['ingredient_id']): item['amount']
+            for item in ShoppingCart.objects.values(
+                'user_id',
+                ingredient_id=F('recipe__ingredient_list__ingredient_id')
+            ).annotate(
+                amount=Sum('recipe__ingredient_list__amount')
+            ).filter(ingredient_id__isnull=False).order_by()
+        }
+
+    def handle(self, *args, **options):
+        expected = self.compute()
+        if options['verify']:
+            actual = {
+                (user_id, ingredient_id): amount
+                for user_id, ingredient_id, amount
+                in ShoppingListItem.objects.values_list(
+                    'user_id', 'ingredient_id', 'amount'
+                )
+            }
+            diff = {
+                key for key in expected.keys() | actual.keys()
+                if expected.get(key) != actual.get(key)
+            }
+            if diff:
+                raise base.CommandError(
+                    f'Расхождений в списках покупок: {len(diff)}'
+                )
+            self.stdout.write(self.style.SUCCESS(
+                f'Списки покупок совпадают с корзинами ({len(actual)} строк)'
+            ))
+            return
+        with transaction.atomic():
+            ShoppingListItem.objects.all().delete()
+            ShoppingListItem.objects.bulk_create(
+                (
+                    ShoppingListItem(
+                        user_id=user_id, ingredient_id=ingredient_id,
+                        amount=amount
+                    )
+                    for (user_id, ingredient_id), amount in expected.items()
+                ),
+                batch_size=1000
+            )
+        self.stdout.write(self.style.SUCCESS(
+            f'Списки покупок пересчитаны ({len(expected)} строк)'
+        ))
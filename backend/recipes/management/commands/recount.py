@@ -0,0 +1,51 @@
+from django.core.management import base
+from django.db import transaction
+from django.db.models import Count, F, OuterRef, Q, Subquery
+from django.db.models.functions import Coalesce
+
+from recipes.models import (Favorite, Recipe, ShoppingCart,
+                            expected_tag_mask)
+from users.models import Subscription, User
+
+
+def count_related(model, field):
+    return Coalesce(Subquery(
+        model.objects.filter(**{field: OuterRef('pk')}).order_by().values(
+            field
+        ).annotate(count=Count('pk')).values('count')
+    ), 0)
+
+
+class Command(base.BaseCommand):
+    help = ('Пересчет счетчиков избранного, корзин, рецептов и подписчиков '
+            'и масок тегов рецептов.')
+
+    counters = (
+        (Recipe, 'favorites_count', Favorite, 'recipe'),
+        (Recipe, 'cart_count', ShoppingCart, 'recipe'),
+        (User, 'recipes_count', Recipe, 'author'),
+        (User, 'subscribers_count', Subscription, 'author'),
+    )
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            for model, field, related_model, related_field in self.counters:
+                expected = count_related(related_model, related_field)
+                drifted = model.objects.annotate(
+                    expected=expected
+                ).filter(~Q(**{field: F('expected')}))
+                fixed = model.objects.filter(
+                    pk__in=drifted.values('pk')
+                ).update(**{field: expected})
+                self.stdout.write(
+                    f'{model._meta.model_name}.{field}: '
+                    f'исправлено {fixed}'
+                )
+            drifted = Recipe.objects.annotate(
+                expected=expected_tag_mask()
+            ).filter(~Q(tag_mask=F('expected')))
+            fixed = Recipe.objects.filter(
+                pk__in=drifted.values('pk')
+            ).update_tag_masks()
+            self.stdout.write(f'recipe.tag_mask: исправлено {fixed}')
+        self.stdout.write(self.style.SUCCESS('Счетчики пересчитаны'))
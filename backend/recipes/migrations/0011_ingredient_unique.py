@@ -0,0 +1,52 @@
+# Generated by Django 5.1.15 on 2026-10-18 04:02
+
+from django.db import migrations, models
+from django.db.models import Count, Min
+
+
+def merge_duplicates(apps, schema_editor):
+    """Сливает повторно импортированные ингредиенты в первый из них."""
+    Ingredient = apps.get_model('recipes', 'Ingredient')
+    related = (
+        (apps.get_model('recipes', 'RecipeIngredient'), 'recipe_id'),
+        (apps.get_model('recipes', 'ShoppingListItem'), 'user_id'),
+    )
+    groups = Ingredient.objects.values('name', 'measurement_unit').annotate(
+        count=Count('id'), keep=Min('id')
+    ).filter(count__gt=1).order_by()
+    for group in groups:
+        keep = group['keep']
+        duplicates = list(Ingredient.objects.filter(
+            name=group['name'], measurement_unit=group['measurement_unit']
+        ).exclude(id=keep).values_list('id', flat=True))
+        for model, owner in related:
+            for row in model.objects.filter(ingredient_id__in=duplicates):
+                kept = model.objects.filter(
+                    **{owner: getattr(row, owner)}, ingredient_id=keep
+                ).first()
+                if kept is None:
+                    row.ingredient_id = keep
+                    row.save(update_fields=['ingredient'])
+                else:
+                    kept.amount += row.amount
+                    kept.save(update_fields=['amount'])
+                    row.delete()
+        Ingredient.objects.filter(id__in=duplicates).delete()
+
+
+class Migration(migrations.Migration):
+    # Данные сливаются в отдельной транзакции: PostgreSQL не дает
+    # изменить таблицу с отложенными проверками внешних ключей.
+    atomic = False
+
+    dependencies = [
+        ('recipes', '0010_recipe_image_variants'),
+    ]
+
+    operations = [
+        migrations.RunPython(merge_duplicates, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='ingredient',
+            constraint=models.UniqueConstraint(fields=('name', 'measurement_unit'), name='ingredient_unique'),
+        ),
+    ]
@@ -0,0 +1,49 @@
+# Generated by Django 5.1.15 on 2026-10-18 03:44
+
+from django.db import migrations, models
+from django.db.models import F, OuterRef, Subquery, Sum, Value
+from django.db.models.functions import Cast, Coalesce
+
+MAX_TAGS = 63
+
+
+def fill_tag_masks(apps, schema_editor):
+    Tag = apps.get_model('recipes', 'Tag')
+    Recipe = apps.get_model('recipes', 'Recipe')
+    RecipeTag = apps.get_model('recipes', 'RecipeTag')
+    tags = list(Tag.objects.order_by('pk'))
+    if len(tags) > MAX_TAGS:
+        raise ValueError(f'Тегов больше {MAX_TAGS}, маска не поместится.')
+    for bit, tag in enumerate(tags):
+        tag.bit = bit
+    Tag.objects.bulk_update(tags, ['bit'])
+    bit = Cast(Value(1), models.BigIntegerField()).bitleftshift(
+        F('tag__bit')
+    )
+    masks = RecipeTag.objects.filter(recipe=OuterRef('pk')).order_by().values(
+        'recipe'
+    ).annotate(
+        mask=Cast(Sum(bit), models.BigIntegerField())
+    ).values('mask')
+    Recipe.objects.update(tag_mask=Coalesce(Subquery(masks), 0))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0011_ingredient_unique'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='recipe',
+            name='tag_mask',
+            field=models.BigIntegerField(default=0, editable=False, verbose_name='Маска тегов'),
+        ),
+        migrations.AddField(
+            model_name='tag',
+            name='bit',
+            field=models.PositiveSmallIntegerField(editable=False, null=True, unique=True, verbose_name='Бит в маске тегов рецепта'),
+        ),
+        migrations.RunPython(fill_tag_masks, migrations.RunPython.noop),
+    ]
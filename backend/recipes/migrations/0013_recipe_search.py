@@ -0,0 +1,89 @@
+# Generated by Django 5.1.15 on 2026-10-18 05:10
+
+from django.db import migrations
+
+# SQL зафиксирован в миграции, чтобы изменения recipes.search не меняли
+# уже примененную схему.
+POSTGRESQL_VECTOR = (
+    "setweight(to_tsvector('russian', coalesce({row}name, '')), 'A') || "
+    "setweight(to_tsvector('russian', coalesce({row}text, '')), 'B')"
+)
+POSTGRESQL_CREATE = (
+    'ALTER TABLE recipes_recipe ADD COLUMN IF NOT EXISTS '
+    'search_vector tsvector',
+    'CREATE OR REPLACE FUNCTION recipes_recipe_search_vector() '
+    'RETURNS trigger AS $$ BEGIN NEW.search_vector := '
+    f'{POSTGRESQL_VECTOR.format(row="NEW.")}; RETURN NEW; END $$ '
+    'LANGUAGE plpgsql',
+    'DROP TRIGGER IF EXISTS recipes_recipe_search_vector ON recipes_recipe',
+    'CREATE TRIGGER recipes_recipe_search_vector BEFORE INSERT OR UPDATE '
+    'OF name, text ON recipes_recipe FOR EACH ROW EXECUTE FUNCTION '
+    'recipes_recipe_search_vector()',
+    'UPDATE recipes_recipe SET search_vector = '
+    f'{POSTGRESQL_VECTOR.format(row="")}',
+    'CREATE INDEX IF NOT EXISTS recipe_search_vector_idx ON recipes_recipe '
+    'USING gin (search_vector)',
+)
+POSTGRESQL_DROP = (
+    'DROP INDEX IF EXISTS recipe_search_vector_idx',
+    'DROP TRIGGER IF EXISTS recipes_recipe_search_vector ON recipes_recipe',
+    'DROP FUNCTION IF EXISTS recipes_recipe_search_vector()',
+    'ALTER TABLE recipes_recipe DROP COLUMN IF EXISTS search_vector',
+)
+SQLITE_CREATE = (
+    'CREATE VIRTUAL TABLE IF NOT EXISTS recipes_recipe_fts USING '
+    "fts5(name, text, content='recipes_recipe', content_rowid='id', "
+    "tokenize='unicode61 remove_diacritics 2')",
+    'CREATE TRIGGER IF NOT EXISTS recipes_recipe_fts_insert '
+    'AFTER INSERT ON recipes_recipe BEGIN '
+    'INSERT INTO recipes_recipe_fts(rowid, name, text) '
+    'VALUES (new.id, new.name, new.text); END',
+    'CREATE TRIGGER IF NOT EXISTS recipes_recipe_fts_delete '
+    'AFTER DELETE ON recipes_recipe BEGIN '
+    'INSERT INTO recipes_recipe_fts(recipes_recipe_fts, rowid, name, text) '
+    "VALUES ('delete', old.id, old.name, old.text); END",
+    'CREATE TRIGGER IF NOT EXISTS recipes_recipe_fts_update '
+    'AFTER UPDATE OF name, text ON recipes_recipe BEGIN '
+    'INSERT INTO recipes_recipe_fts(recipes_recipe_fts, rowid, name, text) '
+    "VALUES ('delete', old.id, old.name, old.text); "
+    'INSERT INTO recipes_recipe_fts(rowid, name, text) '
+    'VALUES (new.id, new.name, new.text); END',
+    "INSERT INTO recipes_recipe_fts(recipes_recipe_fts) VALUES ('rebuild')",
+)
+SQLITE_DROP = (
+    'DROP TRIGGER IF EXISTS recipes_recipe_fts_insert',
+    'DROP TRIGGER IF EXISTS recipes_recipe_fts_delete',
+    'DROP TRIGGER IF EXISTS recipes_recipe_fts_update',
+    'DROP TABLE IF EXISTS recipes_recipe_fts',
+)
+STATEMENTS = {
+    'postgresql': (POSTGRESQL_CREATE, POSTGRESQL_DROP),
+    'sqlite': (SQLITE_CREATE, SQLITE_DROP),
+}
+
+
+def execute(schema_editor, forward):
+    statements = STATEMENTS.get(schema_editor.connection.vendor)
+    if statements is None:
+        return
+    for sql in statements[0 if forward else 1]:
+        schema_editor.execute(sql)
+
+
+def create_index(apps, schema_editor):
+    execute(schema_editor, forward=True)
+
+
+def drop_index(apps, schema_editor):
+    execute(schema_editor, forward=False)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0012_tag_mask'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_index, drop_index),
+    ]
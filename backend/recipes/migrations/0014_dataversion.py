@@ -0,0 +1,26 @@
+# Generated by Django 5.1.15 on 2026-10-18 04:36
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0013_recipe_search'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DataVersion',
+            fields=[
+                ('key', models.CharField(max_length=200, primary_key=True, serialize=False, verbose_name='Таблица')),
+                ('version', models.PositiveBigIntegerField(default=1, verbose_name='Версия')),
+                ('changed_at', models.DateTimeField(default=django.utils.timezone.now, verbose_name='Время изменения')),
+            ],
+            options={
+                'verbose_name': 'Версия данных',
+                'verbose_name_plural': 'Версии данных',
+            },
+        ),
+    ]
@@ -0,0 +1,25 @@
+# Generated by Django 5.1.15 on 2026-10-18 04:54
+
+import recipes.models
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0014_dataversion'),
+    ]
+
+    # Меняется только класс поля в Python, столбец остается прежним,
+    # поэтому SQLite не пересоздает таблицу рецептов.
+    operations = [
+        migrations.SeparateDatabaseAndState(
+            state_operations=[
+                migrations.AlterField(
+                    model_name='recipe',
+                    name='pub_date',
+                    field=recipes.models.PublicationDateField(auto_now_add=True, verbose_name='Дата публикации'),
+                ),
+            ],
+        ),
+    ]
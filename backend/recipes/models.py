@@ -1,11 +1,20 @@
-from django.db import models
+import threading
+from contextlib import contextmanager
+
+from django.core.exceptions import ValidationError
+from django.db import models, transaction
+from django.db.models.functions import Cast, Coalesce
+from django.utils import timezone
 from django.core.validators import MinValueValidator
 
-from users.models import User
+from users.models import Subscription, User
 from django.core.validators import MaxValueValidator
 
 
 MAX_LENGTH_CHAR_FIELD = 200
+# Биты 0-62 маски тегов рецепта, старший бит BigIntegerField - знак.
+MAX_TAGS = 63
+TOO_MANY_TAGS = f'Тегов не может быть больше {MAX_TAGS}.'
 
 
 class Ingredient(models.Model):
@@ -22,11 +31,39 @@ class Ingredient(models.Model):
         verbose_name = 'Ингредиент'
         verbose_name_plural = 'Ингредиенты'
         ordering = ('name',)
+        constraints = [
+            models.UniqueConstraint(
+                fields=['name', 'measurement_unit'],
+                name='ingredient_unique'
+            )
+        ]
 
     def __str__(self):
         return self.name
 
 
+class TagQuerySet(models.QuerySet):
+
+    def free_bits(self):
+        used = set(self.model.objects.exclude(bit=None).values_list(
+            'bit', flat=True
+        ))
+        return [bit for bit in range(MAX_TAGS) if bit not in used]
+
+    def assign_bits(self):
+        """Назначает биты тегам без бита, например после bulk_create."""
+        tags = list(self.filter(bit=None).order_by('pk'))
+        if not tags:
+            return 0
+        free = self.free_bits()
+        if len(free) < len(tags):
+            raise ValidationError(TOO_MANY_TAGS)
+        for tag, bit in zip(tags, free):
+            tag.bit = bit
+        self.model.objects.bulk_update(tags, ['bit'])
+        return len(tags)
+
+
 class Tag(models.Model):
     name = models.CharField(
         max_length=MAX_LENGTH_CHAR_FIELD,
@@ -38,6 +75,14 @@ class Tag(models.Model):
         unique=True,
         verbose_name='Уникальный слаг'
     )
+    bit = models.PositiveSmallIntegerField(
+        unique=True,
+        null=True,
+        editable=False,
+        verbose_name='Бит в маске тегов рецепта'
+    )
+
+    objects = TagQuerySet.as_manager()
 
     class Meta:
         verbose_name = 'Тег'
@@ -47,6 +92,108 @@ class Tag(models.Model):
     def __str__(self):
         return self.name
 
+    def clean(self):
+        if self.bit is None and not Tag.objects.free_bits():
+            raise ValidationError(TOO_MANY_TAGS)
+
+    def save(self, *args, **kwargs):
+        if self.bit is None:
+            free = Tag.objects.free_bits()
+            if not free:
+                raise ValidationError(TOO_MANY_TAGS)
+            self.bit = free[0]
+        super().save(*args, **kwargs)
+
+
+USER_FLAGS = ('is_favorited', 'is_in_shopping_cart', 'is_author_subscribed')
+
+
+def expected_tag_mask():
+    """Маска тегов рецепта, посчитанная по RecipeTag."""
+    bit = Cast(models.Value(1), models.BigIntegerField()).bitleftshift(
+        models.F('tag__bit')
+    )
+    # Биты тегов различны, поэтому сумма равна побитовому ИЛИ.
+    masks = RecipeTag.objects.filter(
+        recipe=models.OuterRef('pk')
+    ).order_by().values('recipe').annotate(
+        mask=Cast(models.Sum(bit), models.BigIntegerField())
+    ).values('mask')
+    return Coalesce(models.Subquery(masks), 0)
+
+
+class RecipeQuerySet(models.QuerySet):
+
+    def with_user_flags(self, user, flags=USER_FLAGS):
+        """Аннотирует избранное, корзину и подписку на автора."""
+        if user.is_anonymous:
+            return self.annotate(
+                **{flag: models.Value(False) for flag in flags}
+            )
+        subqueries = {
+            'is_favorited': Favorite.objects.filter(
+                user=user, recipe=models.OuterRef('pk')),
+            'is_in_shopping_cart': ShoppingCart.objects.filter(
+                user=user, recipe=models.OuterRef('pk')),
+            'is_author_subscribed': Subscription.objects.filter(
+                user=user, author=models.OuterRef('author')),
+        }
+        return self.annotate(
+            **{flag: models.Exists(subqueries[flag]) for flag in flags}
+        )
+
+    def with_any_tag(self, tags):
+        """Рецепты хотя бы с одним из тегов.
+
+        Теги с битом проверяются по маске без JOIN, теги, которым бит
+        еще не назначен, - подзапросом к RecipeTag.
+        """
+        mask = sum(1 << tag.bit for tag in tags if tag.bit is not None)
+        condition = models.Q(tag_match__gt=0)
+        without_bit = [tag.pk for tag in tags if tag.bit is None]
+        if without_bit:
+            condition |= models.Q(models.Exists(RecipeTag.objects.filter(
+                recipe=models.OuterRef('pk'), tag__in=without_bit
+            )))
+        return self.alias(
+            tag_match=models.F('tag_mask').bitand(mask)
+        ).filter(condition)
+
+    def update_tag_masks(self):
+        """Пересчитывает tag_mask по RecipeTag."""
+        return self.update(tag_mask=expected_tag_mask())
+
+
+_loaded_dates = threading.local()
+
+
+@contextmanager
+def keep_pub_dates():
+    """Блок, в котором новые рецепты сохраняются с заданной pub_date.
+
+    Его использует загрузка выгрузки, чтобы дата публикации попала в
+    тот же INSERT, а не записывалась следом отдельным UPDATE.
+    """
+    previous = getattr(_loaded_dates, 'kept', False)
+    _loaded_dates.kept = True
+    try:
+        yield
+    finally:
+        _loaded_dates.kept = previous
+
+
+class PublicationDateField(models.DateTimeField):
+    """auto_now_add, который внутри keep_pub_dates() оставляет дату,
+    уже заданную объекту."""
+
+    def pre_save(self, model_instance, add):
+        value = getattr(model_instance, self.attname)
+        if add and value is not None and getattr(
+            _loaded_dates, 'kept', False
+        ):
+            return value
+        return super().pre_save(model_instance, add)
+
 
 class Recipe(models.Model):
     author = models.ForeignKey(
@@ -75,6 +222,12 @@ class Recipe(models.Model):
         upload_to='recipes/',
         verbose_name='Изображение'
     )
+    image_variants = models.JSONField(
+        default=dict,
+        blank=True,
+        editable=False,
+        verbose_name='Уменьшенные копии изображения'
+    )
     cooking_time = models.PositiveIntegerField(
         verbose_name='Время приготовления (минут)',
         validators=[
@@ -82,20 +235,58 @@ class Recipe(models.Model):
             MaxValueValidator(1800)
         ]
     )
-    pub_date = models.DateTimeField(
+    pub_date = PublicationDateField(
         auto_now_add=True,
         verbose_name='Дата публикации'
     )
+    updated_at = models.DateTimeField(
+        auto_now=True,
+        verbose_name='Дата изменения'
+    )
+    favorites_count = models.PositiveIntegerField(
+        default=0,
+        editable=False,
+        verbose_name='Добавлений в избранное'
+    )
+    cart_count = models.PositiveIntegerField(
+        default=0,
+        editable=False,
+        verbose_name='Добавлений в корзину'
+    )
+    tag_mask = models.BigIntegerField(
+        default=0,
+        editable=False,
+        verbose_name='Маска тегов'
+    )
+
+    objects = RecipeQuerySet.as_manager()
 
     class Meta:
         verbose_name = 'Рецепт'
         verbose_name_plural = 'Рецепты'
         ordering = ('-pub_date',)
         default_related_name = 'recipes'
+        indexes = [
+            models.Index(
+                fields=['-pub_date', '-id'],
+                name='recipe_pub_date_id_idx'
+            ),
+        ]
 
     def __str__(self):
         return self.name
 
+    def update_tag_mask(self):
+        """Пересчитывает маску тегов в базе и у экземпляра, чтобы
+        следующий save() не записал старую."""
+        self.tag_mask = sum(
+            1 << bit
+            for bit in self.tags.exclude(bit=None).values_list(
+                'bit', flat=True
+            )
+        )
+        Recipe.objects.filter(pk=self.pk).update(tag_mask=self.tag_mask)
+
 
 class RecipeIngredient(models.Model):
     recipe = models.ForeignKey(
@@ -209,3 +400,108 @@ class ShoppingCart(models.Model):
 
     def __str__(self):
         return self.recipe
+
+
+class ShoppingListItemQuerySet(models.QuerySet):
+
+    def add_amounts(self, user_ids, amounts):
+        """Прибавляет количества ингредиентов к спискам покупок.
+
+        amounts - словарь {id ингредиента: изменение количества},
+        изменения могут быть отрицательными. Строки с нулевым
+        количеством удаляются.
+        """
+        amounts = {pk: amount for pk, amount in amounts.items() if amount}
+        if not amounts:
+            return
+        user_ids = list(user_ids)
+        if not user_ids:
+            return
+        with transaction.atomic():
+            # Недостающие строки вставляются с нулем, а прибавление
+            # делается одним UPDATE для всех: строка, вставленная
+            # параллельной транзакцией, не нарушит уникальность и не
+            # потеряет ни одного из изменений.
+            self.bulk_create(
+                (ShoppingListItem(user_id=user_id, ingredient_id=pk, amount=0)
+                 for user_id in user_ids
+                 for pk, amount in amounts.items() if amount > 0),
+                ignore_conflicts=True
+            )
+            self.filter(user__in=user_ids, ingredient__in=amounts).update(
+                amount=models.F('amount') + models.Case(
+                    *(models.When(ingredient_id=pk,
+                                  then=models.Value(amount))
+                      for pk, amount in amounts.items()),
+                    default=models.Value(0)
+                )
+            )
+            self.filter(user__in=user_ids, amount__lte=0).delete()
+
+
+class ShoppingListItem(models.Model):
+    """Сумма ингредиента по всем рецептам в корзине пользователя.
+
+    Поддерживается при изменении корзины и ингредиентов рецептов,
+    пересчитывается командой rebuild_shopping_lists.
+    """
+
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='shopping_list',
+        verbose_name='Пользователь'
+    )
+    ingredient = models.ForeignKey(
+        Ingredient,
+        on_delete=models.CASCADE,
+        related_name='shopping_list_items',
+        verbose_name='Ингредиент'
+    )
+    amount = models.IntegerField(verbose_name='Количество')
+
+    objects = ShoppingListItemQuerySet.as_manager()
+
+    class Meta:
+        verbose_name = 'Позиция списка покупок'
+        verbose_name_plural = 'Позиции списков покупок'
+        constraints = [
+            models.UniqueConstraint(
+                fields=['user', 'ingredient'],
+                name='shoppinglistitem_unique'
+            )
+        ]
+
+    def __str__(self):
+        return f'{self.user} - {self.ingredient}: {self.amount}'
+
+
+class DataVersion(models.Model):
+    """Версия таблицы и время ее последнего изменения.
+
+    По версиям процессы узнают, что справочники или состав рецептов
+    изменились: от них зависят ETag, снимки справочников, индексы в
+    памяти и ключи кэша представлений. Счетчик хранится в базе, а не в
+    кэше, чтобы увеличение было атомарным и запись не вытеснялась.
+    """
+
+    key = models.CharField(
+        max_length=MAX_LENGTH_CHAR_FIELD,
+        primary_key=True,
+        verbose_name='Таблица'
+    )
+    version = models.PositiveBigIntegerField(
+        default=1,
+        verbose_name='Версия'
+    )
+    changed_at = models.DateTimeField(
+        default=timezone.now,
+        verbose_name='Время изменения'
+    )
+
+    class Meta:
+        verbose_name = 'Версия данных'
+        verbose_name_plural = 'Версии данных'
+
+    def __str__(self):
+        return f'{self.key}: {self.version}'
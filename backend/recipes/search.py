@@ -0,0 +1,150 @@
+import re
+
+from django.db import connections
+from django.db.models import BooleanField, FloatField, Q, Value
+from django.db.models.expressions import RawSQL
+
+TABLE = 'recipes_recipe'
+SEARCH_CONFIG = 'russian'
+FTS_TABLE = 'recipes_recipe_fts'
+TOKEN = re.compile(r'\w+')
+
+# В PostgreSQL индекс - столбец tsvector, который заполняет триггер при
+# вставке и изменении name или text, поэтому он обновляется в той же
+# транзакции, в том числе при bulk_create и update(). Столбца нет в
+# модели, чтобы он не загружался вместе с рецептами.
+POSTGRESQL_VECTOR = (
+    f"setweight(to_tsvector('{SEARCH_CONFIG}', coalesce({{row}}name, '')), "
+    f"'A') || "
+    f"setweight(to_tsvector('{SEARCH_CONFIG}', coalesce({{row}}text, '')), "
+    f"'B')"
+)
+POSTGRESQL_CREATE = (
+    f'ALTER TABLE {TABLE} ADD COLUMN IF NOT EXISTS search_vector tsvector',
+    f'CREATE OR REPLACE FUNCTION {TABLE}_search_vector() RETURNS trigger '
+    f'AS $$ BEGIN NEW.search_vector := '
+    f'{POSTGRESQL_VECTOR.format(row="NEW.")}; RETURN NEW; END $$ '
+    f'LANGUAGE plpgsql',
+    f'DROP TRIGGER IF EXISTS {TABLE}_search_vector ON {TABLE}',
+    f'CREATE TRIGGER {TABLE}_search_vector BEFORE INSERT OR UPDATE OF '
+    f'name, text ON {TABLE} FOR EACH ROW EXECUTE FUNCTION '
+    f'{TABLE}_search_vector()',
+    f'UPDATE {TABLE} SET search_vector = '
+    f'{POSTGRESQL_VECTOR.format(row="")}',
+    f'CREATE INDEX IF NOT EXISTS recipe_search_vector_idx ON {TABLE} '
+    f'USING gin (search_vector)',
+)
+POSTGRESQL_DROP = (
+    'DROP INDEX IF EXISTS recipe_search_vector_idx',
+    f'DROP TRIGGER IF EXISTS {TABLE}_search_vector ON {TABLE}',
+    f'DROP FUNCTION IF EXISTS {TABLE}_search_vector()',
+    f'ALTER TABLE {TABLE} DROP COLUMN IF EXISTS search_vector',
+)
+
+# В SQLite (локальная разработка и тесты) - внешняя таблица FTS5 по
+# содержимому recipes_recipe, синхронизируемая триггерами. Стемминга
+# для русского в FTS5 нет, слова запроса ищутся как префиксы.
+SQLITE_TRIGGERS = {
+    f'{FTS_TABLE}_insert': (
+        f'AFTER INSERT ON {TABLE} BEGIN '
+        f'INSERT INTO {FTS_TABLE}(rowid, name, text) '
+        f'VALUES (new.id, new.name, new.text); END'
+    ),
+    f'{FTS_TABLE}_delete': (
+        f'AFTER DELETE ON {TABLE} BEGIN '
+        f'INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, name, text) '
+        f"VALUES ('delete', old.id, old.name, old.text); END"
+    ),
+    f'{FTS_TABLE}_update': (
+        f'AFTER UPDATE OF name, text ON {TABLE} BEGIN '
+        f'INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, name, text) '
+        f"VALUES ('delete', old.id, old.name, old.text); "
+        f'INSERT INTO {FTS_TABLE}(rowid, name, text) '
+        f'VALUES (new.id, new.name, new.text); END'
+    ),
+}
+SQLITE_WEIGHTS = '10.0, 1.0'
+
+
+def create_search_index(connection):
+    """Создает индекс поиска, если его нет.
+
+    В SQLite вызывается и после каждой миграции: пересоздание таблицы
+    recipes_recipe при изменении схемы удаляет ее триггеры.
+    """
+    with connection.cursor() as cursor:
+        if connection.vendor == 'postgresql':
+            for sql in POSTGRESQL_CREATE:
+                cursor.execute(sql)
+        elif connection.vendor == 'sqlite':
+            cursor.execute(
+                "SELECT name FROM sqlite_master WHERE type = 'trigger' "
+                "AND tbl_name = %s", [TABLE]
+            )
+            existing = {name for name, in cursor.fetchall()}
+            missing = SQLITE_TRIGGERS.keys() - existing
+            if not missing:
+                return
+            cursor.execute(
+                f'CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} USING '
+                f"fts5(name, text, content='{TABLE}', content_rowid='id', "
+                f"tokenize='unicode61 remove_diacritics 2')"
+            )
+            for name in missing:
+                cursor.execute(
+                    f'CREATE TRIGGER {name} {SQLITE_TRIGGERS[name]}'
+                )
+            cursor.execute(
+                f"INSERT INTO {FTS_TABLE}({FTS_TABLE}) VALUES ('rebuild')"
+            )
+
+
+def drop_search_index(connection):
+    with connection.cursor() as cursor:
+        if connection.vendor == 'postgresql':
+            for sql in POSTGRESQL_DROP:
+                cursor.execute(sql)
+        elif connection.vendor == 'sqlite':
+            for name in SQLITE_TRIGGERS:
+                cursor.execute(f'DROP TRIGGER IF EXISTS {name}')
+            cursor.execute(f'DROP TABLE IF EXISTS {FTS_TABLE}')
+
+
+def search_recipes(queryset, query):
+    """Рецепты, подходящие под запрос, с релевантностью search_rank.
+
+    Слова запроса объединяются по И. В базах без полнотекстового
+    индекса ищется подстрока в названии и описании без ранжирования.
+    """
+    vendor = connections[queryset.db].vendor
+    if vendor == 'postgresql':
+        tsquery = f"websearch_to_tsquery('{SEARCH_CONFIG}', %s)"
+        return queryset.annotate(search_rank=RawSQL(
+            f'ts_rank_cd({TABLE}.search_vector, {tsquery})', (query,),
+            output_field=FloatField()
+        )).filter(RawSQL(
+            f'{TABLE}.search_vector @@ {tsquery}', (query,),
+            output_field=BooleanField()
+        ))
+    if vendor == 'sqlite':
+        words = TOKEN.findall(query)
+        if not words:
+            return queryset.annotate(
+                search_rank=Value(0.0, output_field=FloatField())
+            ).none()
+        match = ' '.join(f'"{word}"*' for word in words)
+        # bm25() доступна только в запросе к самой таблице FTS5, поэтому
+        # она присоединяется к рецептам, а не проверяется подзапросом.
+        return queryset.extra(
+            select={'search_rank': f'-bm25({FTS_TABLE}, {SQLITE_WEIGHTS})'},
+            tables=[FTS_TABLE],
+            where=[f'{FTS_TABLE}.rowid = {TABLE}.id',
+                   f'{FTS_TABLE} MATCH %s'],
+            params=[match],
+        )
+    condition = Q()
+    for word in query.split():
+        condition &= Q(name__icontains=word) | Q(text__icontains=word)
+    return queryset.annotate(
+        search_rank=Value(0.0, output_field=FloatField())
+    ).filter(condition)
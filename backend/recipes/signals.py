@@ -0,0 +1,200 @@
+import threading
+from collections import Counter, defaultdict
+from contextlib import contextmanager
+
+from django.db import connections
+from django.db.migrations.recorder import MigrationRecorder
+from django.db.models import F, QuerySet
+from django.db.models.signals import (m2m_changed, post_delete,
+                                      post_migrate, post_save, pre_delete,
+                                      pre_save)
+from django.dispatch import Signal, receiver
+
+from users.models import User
+from .images import schedule_variants
+from .search import create_search_index
+from .models import (Favorite, Recipe, RecipeIngredient, RecipeTag,
+                     ShoppingCart, ShoppingListItem)
+
+# Отправляется после массового изменения справочника или состава
+# рецептов (sender - модель), которое не вызывает post_save, например
+# bulk_create при импорте.
+catalog_changed = Signal()
+
+SEARCH_MIGRATION = '0013_recipe_search'
+
+_relations = threading.local()
+
+
+@contextmanager
+def relations_handled():
+    """Блок, в котором обработчики строк RecipeTag и RecipeIngredient
+    ничего не делают.
+
+    Его использует код, который сам пересчитывает маску тегов и списки
+    покупок и завершает запись сохранением рецепта.
+    """
+    previous = getattr(_relations, 'handled', False)
+    _relations.handled = True
+    try:
+        yield
+    finally:
+        _relations.handled = previous
+
+
+def are_relations_handled():
+    return getattr(_relations, 'handled', False)
+
+
+def get_recipe_amounts(recipe_id, sign=1):
+    return {
+        ingredient_id: sign * amount
+        for ingredient_id, amount in RecipeIngredient.objects.filter(
+            recipe_id=recipe_id
+        ).values_list('ingredient_id', 'amount')
+    }
+
+
+@receiver(post_save, sender=ShoppingCart)
+def add_to_shopping_list(sender, instance, created, **kwargs):
+    if created:
+        ShoppingListItem.objects.add_amounts(
+            [instance.user_id], get_recipe_amounts(instance.recipe_id)
+        )
+
+
+# pre_delete отправляется до каскадного удаления, поэтому ингредиенты
+# удаляемого рецепта еще доступны.
+@receiver(pre_delete, sender=ShoppingCart)
+def remove_from_shopping_list(sender, instance, **kwargs):
+    ShoppingListItem.objects.add_amounts(
+        [instance.user_id], get_recipe_amounts(instance.recipe_id, -1)
+    )
+
+
+def add_to_cart_shopping_lists(recipe_id, amounts):
+    ShoppingListItem.objects.add_amounts(
+        ShoppingCart.objects.filter(recipe_id=recipe_id).values_list(
+            'user_id', flat=True
+        ),
+        amounts
+    )
+
+
+# Изменение отдельных строк состава (например, в админке) переносится
+# в списки покупок пользователей, у которых рецепт в корзине.
+@receiver(pre_save, sender=RecipeIngredient)
+def remember_recipe_amount(sender, instance, raw, **kwargs):
+    instance._previous_amount = None
+    if instance.pk is None or raw or are_relations_handled():
+        return
+    instance._previous_amount = RecipeIngredient.objects.filter(
+        pk=instance.pk
+    ).values_list('recipe_id', 'ingredient_id', 'amount').first()
+
+
+@receiver(post_save, sender=RecipeIngredient)
+def apply_recipe_amount(sender, instance, raw, **kwargs):
+    if raw or are_relations_handled():
+        return
+    changes = defaultdict(Counter)
+    changes[instance.recipe_id][instance.ingredient_id] += instance.amount
+    previous = getattr(instance, '_previous_amount', None)
+    if previous is not None:
+        recipe_id, ingredient_id, amount = previous
+        changes[recipe_id][ingredient_id] -= amount
+    for recipe_id, amounts in changes.items():
+        add_to_cart_shopping_lists(recipe_id, amounts)
+
+
+# При удалении рецепта или ингредиента строки удаляются каскадом, и
+# списки покупок уже поправлены удалением корзин или удалены сами.
+@receiver(post_delete, sender=RecipeIngredient)
+def subtract_recipe_amount(sender, instance, origin=None, **kwargs):
+    if isinstance(origin, QuerySet):
+        origin = origin.model
+    elif isinstance(origin, RecipeIngredient):
+        origin = RecipeIngredient
+    if are_relations_handled() or origin is not RecipeIngredient:
+        return
+    add_to_cart_shopping_lists(
+        instance.recipe_id, {instance.ingredient_id: -instance.amount}
+    )
+
+
+def change_counter(model, pk, field, delta):
+    model.objects.filter(pk=pk).update(**{field: F(field) + delta})
+
+
+@receiver(post_save, sender=Favorite)
+def increment_favorites_count(sender, instance, created, **kwargs):
+    if created:
+        change_counter(Recipe, instance.recipe_id, 'favorites_count', 1)
+
+
+@receiver(post_delete, sender=Favorite)
+def decrement_favorites_count(sender, instance, **kwargs):
+    change_counter(Recipe, instance.recipe_id, 'favorites_count', -1)
+
+
+@receiver(post_save, sender=ShoppingCart)
+def increment_cart_count(sender, instance, created, **kwargs):
+    if created:
+        change_counter(Recipe, instance.recipe_id, 'cart_count', 1)
+
+
+@receiver(post_delete, sender=ShoppingCart)
+def decrement_cart_count(sender, instance, **kwargs):
+    change_counter(Recipe, instance.recipe_id, 'cart_count', -1)
+
+
+@receiver(post_save, sender=Recipe)
+def increment_recipes_count(sender, instance, created, **kwargs):
+    if created:
+        change_counter(User, instance.author_id, 'recipes_count', 1)
+
+
+@receiver(post_delete, sender=Recipe)
+def decrement_recipes_count(sender, instance, **kwargs):
+    change_counter(User, instance.author_id, 'recipes_count', -1)
+
+
+@receiver(post_save, sender=Recipe)
+@receiver(post_save, sender=User)
+def schedule_image_variants(sender, instance, update_fields, **kwargs):
+    field = 'image' if sender is Recipe else 'avatar'
+    if update_fields is None or field in update_fields:
+        schedule_variants(instance, field)
+
+
+@receiver(post_save, sender=RecipeTag)
+@receiver(post_delete, sender=RecipeTag)
+def update_tag_mask(sender, instance, **kwargs):
+    if are_relations_handled():
+        return
+    Recipe.objects.filter(pk=instance.recipe_id).update_tag_masks()
+
+
+@receiver(m2m_changed, sender=RecipeTag)
+def update_tag_masks_m2m(sender, instance, action, reverse, pk_set,
+                         **kwargs):
+    if action not in ('post_add', 'post_remove', 'post_clear'):
+        return
+    if not reverse:
+        instance.update_tag_mask()
+    elif pk_set:
+        Recipe.objects.filter(pk__in=pk_set).update_tag_masks()
+    else:
+        # tag.recipes.clear(): бит тега еще стоит у бывших рецептов.
+        Recipe.objects.with_any_tag([instance]).update_tag_masks()
+
+
+@receiver(post_migrate)
+def restore_search_index(sender, using, **kwargs):
+    # Миграции SQLite, пересоздающие recipes_recipe, теряют триггеры.
+    connection = connections[using]
+    if sender.name != 'recipes' or connection.vendor != 'sqlite':
+        return
+    applied = MigrationRecorder(connection).applied_migrations()
+    if (sender.label, SEARCH_MIGRATION) in applied:
+        create_search_index(connection)
@@ -0,0 +1,44 @@
+import hashlib
+import os
+import posixpath
+
+from django.core.files.base import File
+from django.core.files.storage import FileSystemStorage
+
+HASH_CHUNK_SIZE = 64 * 1024
+
+
+class ContentHashStorage(FileSystemStorage):
+    """Хранилище, называющее файлы по SHA-256 содержимого.
+
+    recipes/<uuid>.png сохраняется как recipes/<sha256>.png. Если файл
+    с таким содержимым уже есть, он не перезаписывается. Содержимое
+    файла никогда не меняется, поэтому его URL можно кэшировать
+    навсегда. Один файл может принадлежать нескольким объектам, поэтому
+    удалять его можно только командой collect_media_garbage.
+    """
+
+    def save(self, name, content, max_length=None):
+        if name is None:
+            name = content.name
+        if not hasattr(content, 'chunks'):
+            content = File(content, name)
+        name = self.get_content_name(name, content)
+        try:
+            # Повторная загрузка обновляет время изменения, чтобы
+            # collect_media_garbage не удалил файл, пока объект с ним
+            # еще не сохранен.
+            os.utime(self.path(name))
+        except FileNotFoundError:
+            return super().save(name, content, max_length=max_length)
+        return name
+
+    def get_content_name(self, name, content):
+        digest = hashlib.sha256()
+        for chunk in content.chunks(HASH_CHUNK_SIZE):
+            digest.update(chunk)
+        if hasattr(content, 'seek'):
+            content.seek(0)
+        directory, filename = posixpath.split(name)
+        extension = posixpath.splitext(filename)[1].lower()
+        return posixpath.join(directory, digest.hexdigest() + extension)
@@ -3,7 +3,9 @@ from .models import User
 
 
 class UserAdmin(admin.ModelAdmin):
-    list_display = ('username', 'email', 'first_name', 'last_name')
+    list_display = ('username', 'email', 'first_name', 'last_name',
+                    'recipes_count', 'subscribers_count')
+    readonly_fields = ('recipes_count', 'subscribers_count')
     list_display_links = ('username',)
     search_fields = ('username', 'email')
     list_filter = ('username', 'email')
@@ -15,6 +15,12 @@ class User(AbstractUser):
         upload_to='users/avatars/', verbose_name='Аватар',
         null=True, default=''
     )
+    avatar_variants = models.JSONField(
+        default=dict,
+        blank=True,
+        editable=False,
+        verbose_name='Уменьшенные копии аватара'
+    )
     email = models.EmailField(
         max_length=256,
         unique=True,
@@ -32,6 +38,16 @@ class User(AbstractUser):
         max_length=MAX_LENGTH_CHAR_FIELD,
         verbose_name='Фамилия'
     )
+    recipes_count = models.PositiveIntegerField(
+        default=0,
+        editable=False,
+        verbose_name='Рецептов'
+    )
+    subscribers_count = models.PositiveIntegerField(
+        default=0,
+        editable=False,
+        verbose_name='Подписчиков'
+    )
 
     USERNAME_FIELD = 'email'
     REQUIRED_FIELDS = ['username', 'first_name', 'last_name']
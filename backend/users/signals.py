@@ -0,0 +1,20 @@
+from django.db.models import F
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from .models import Subscription, User
+
+
+@receiver(post_save, sender=Subscription)
+def increment_subscribers_count(sender, instance, created, **kwargs):
+    if created:
+        User.objects.filter(pk=instance.author_id).update(
+            subscribers_count=F('subscribers_count') + 1
+        )
+
+
+@receiver(post_delete, sender=Subscription)
+def decrement_subscribers_count(sender, instance, **kwargs):
+    User.objects.filter(pk=instance.author_id).update(
+        subscribers_count=F('subscribers_count') - 1
+    )